@@ -1,9 +1,15 @@
 
+from array import array
 from collections import namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from itertools import accumulate
+from re import compile as re_compile
 
-from typing import List, Optional, Union
+from typing import Iterable, List, Optional, Union
 
-from math import atan, cos, sin, radians, degrees
+from math import atan, cos, isfinite, sin, tan, radians, degrees
 
 Pt = namedtuple("Pt", "x y")
 ln = namedtuple("Ln", "pt1 pt2")
@@ -60,12 +66,109 @@ def removeDecsep(p_val):
 		ret = p_val
 	return ret
 
+def _makeRounder(p_places: Optional[int]):
+	if p_places is None:
+		return removeDecsep
+	def rd(p_val, _round=round, _places=p_places):
+		v = _round(p_val, _places)
+		r = int(v)
+		if r == v:
+			return r
+		return v
+	return rd
+
+class RoundContext(object):
+	"""Rounding of output numbers to 'places' decimal places, None for no rounding.
+	   'rd' is the rounding function, compiled for those places."""
+
+	__slots__ = ("places", "rd")
+
+	def __init__(self, places: Optional[int] = 4) -> None:
+		self.places = places
+		self.rd = _makeRounder(places)
+
+	def __repr__(self):
+		return f"RoundContext(places={self.places})"
+
+# ambient rounding context, per thread / async task, None: from GLOBAL_ENV
+ROUND_CONTEXT = ContextVar("rpSVG_round_context", default=None)
+_global_round_contexts = {}
+
+def getRoundContext() -> RoundContext:
+	ret = ROUND_CONTEXT.get()
+	if ret is None:
+		if GLOBAL_ENV["ROUND"]["flag"]:
+			places = GLOBAL_ENV["ROUND"]["places"]
+		else:
+			places = None
+		ret = _global_round_contexts.get(places)
+		if ret is None:
+			ret = _global_round_contexts[places] = RoundContext(places)
+	return ret
+
+@contextmanager
+def roundingContext(p_ctx: Optional[RoundContext]):
+	"""Make p_ctx the ambient rounding context (used by glRd) inside 'with' block.
+		None - keep current one"""
+	if p_ctx is None:
+		yield getRoundContext()
+		return
+	token = ROUND_CONTEXT.set(p_ctx)
+	try:
+		yield p_ctx
+	finally:
+		ROUND_CONTEXT.reset(token)
+
 def glRd(p_val):
+	ctx = ROUND_CONTEXT.get()
+	if not ctx is None:
+		return ctx.rd(p_val)
 	if GLOBAL_ENV["ROUND"]["flag"]:
 		return removeDecsep(round(p_val, GLOBAL_ENV["ROUND"]["places"]))
 	else:
 		return removeDecsep(p_val)
 	 
+def _numToText(p_val: float) -> str:
+	if isfinite(p_val):
+		r = int(p_val)
+		if r == p_val:
+			return str(r)
+	return repr(p_val)
+
+_numpy_mod = None
+
+def _numpy():
+	"numpy module, False if not available (optional dependency, vectorized fast paths)"
+	global _numpy_mod
+	if _numpy_mod is None:
+		try:
+			import numpy
+			_numpy_mod = numpy
+		except ImportError:
+			_numpy_mod = False
+	return _numpy_mod
+
+# integral values below this magnitude are exact as int64
+_NP_INT_LIMIT = 2.0 ** 53
+
+def _numsToText(p_vals) -> List[str]:
+	"""_numToText of all values in sequence or 'd' buffer. With numpy, integral values are found and
+	   formatted vectorized, others by repr (faster than numpy float to str conversion)"""
+	np = _numpy()
+	if not np or len(p_vals) == 0:
+		return list(map(_numToText, p_vals))
+	arr = np.asarray(p_vals, dtype=np.float64)
+	absarr = np.abs(arr)
+	isint = (np.floor(arr) == arr) & (absarr < _NP_INT_LIMIT)
+	# floats this large are integral, too large for int64 formatting
+	fmt = _numToText if ((absarr >= _NP_INT_LIMIT) & np.isfinite(arr)).any() else repr
+	if not isint.any():
+		return list(map(fmt, arr.tolist()))
+	ret = np.empty(len(arr), dtype=object)
+	ret[isint] = list(map(str, arr[isint].astype(np.int64).tolist()))
+	ret[~isint] = list(map(fmt, arr[~isint].tolist()))
+	return ret.tolist()
+
 def ptCoincidence(pa: Pt, pb: Pt, mindelta=MINDELTA):
 	return abs(pa.x - pb.x) < mindelta and abs(pa.y - pb.y)  < mindelta
 
@@ -87,33 +190,53 @@ def ptDyInt(pa: Pt, pb: Pt):
 def ptRemoveDecsep(p_x, p_y):
 	return Pt(removeDecsep(p_x), removeDecsep(p_y))
 
+# number (exponent notation accepted) followed by optional units
+NUMBER_UNIT_RE = re_compile(r"\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)\s*([^\d\s.,+-]\S*)?\s*$")
+NUMBER_LIST_SEP_RE = re_compile(r"[\s,]+")
+PARSE_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parseNumberAndUnit(p_text: str):
+	mo = NUMBER_UNIT_RE.match(p_text)
+	if mo is None:
+		raise ValueError(f"could not convert to number: '{p_text}'")
+	return removeDecsep(float(mo.group(1))), mo.group(2)
+
 def toNumberAndUnit(p_val):
-	base = str(p_val)
-	numchars = []
-	unitchars = []
-	for c in base:
-		if str.isdigit(c) or c in ('.', ',', '-'):
-			numchars.append(c)
-		else:
-			unitchars.append(c)
-	if len(unitchars) > 0:
-		un = ''.join(unitchars)
-	else:
-		un = None
-	return removeDecsep(float(''.join(numchars))), un
+	tp = type(p_val)
+	if tp is int or tp is float:
+		return removeDecsep(p_val), None
+	return _parseNumberAndUnit(str(p_val))
+
+def toNumbersAndUnits(p_vals: Union[str, Iterable]) -> List:
+	"""Batch variant of toNumberAndUnit, p_vals - list of values or 
+		string of whitespace or comma separated values"""
+	if isinstance(p_vals, str):
+		p_vals = [v for v in NUMBER_LIST_SEP_RE.split(p_vals) if len(v) > 0]
+	return [toNumberAndUnit(v) for v in p_vals]
 
 def fromNumberAndUnit(p_val, p_unit):
 	return f"{removeDecsep(p_val)}{p_unit}"
 
 def strictToNumber(p_val):
-	base = str(p_val)
-	numchars = []
-	for c in base:
-		if str.isdigit(c) or c in ('.', ',', '-'):
-			numchars.append(c)
-		else:
+	tp = type(p_val)
+	if tp is int or tp is float:
+		return removeDecsep(p_val)
+	try:
+		ret, un = _parseNumberAndUnit(str(p_val))
+	except ValueError:
+		if len(str(p_val).strip()) > 0:
 			raise ValueWithUnitsError(p_val)
-	return removeDecsep(float(''.join(numchars)))
+		raise
+	if not un is None:
+		raise ValueWithUnitsError(p_val)
+	return ret
+
+def strictToNumbers(p_vals: Union[str, Iterable]) -> List:
+	"Batch variant of strictToNumber, see toNumbersAndUnits"
+	if isinstance(p_vals, str):
+		p_vals = [v for v in NUMBER_LIST_SEP_RE.split(p_vals) if len(v) > 0]
+	return [strictToNumber(v) for v in p_vals]
 
 def add(a, b):
 	return strictToNumber(a) + strictToNumber(b)
@@ -121,17 +244,16 @@ def add(a, b):
 def subtr(a, b):
 	return strictToNumber(a) - strictToNumber(b)
 
-def getUnit(p_val):
-	base = str(p_val)
-	unitchars = []
-	for c in base:
-		if not str.isdigit(c) and not c in ('.', ',', '-'):
-			unitchars.append(c)
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _unitChars(p_text: str):
+	unitchars = [c for c in p_text if not str.isdigit(c) and not c in ('.', ',', '-')]
 	if len(unitchars) > 0:
-		un = ''.join(unitchars)
-	else:
-		un = None
-	return un
+		return ''.join(unitchars)
+	return None
+
+def getUnit(p_val):
+	"All characters of value text other than digits, '.', ',' and '-', None if there are none (not validated, see toNumberAndUnit)"
+	return _unitChars(str(p_val))
 
 # def fromNumberAndUnit(p_num, p_unit):
 # 	if p_unit is None:
@@ -160,6 +282,47 @@ def ptEnsureStrings(p_pt: Pt):
 		ret = ret._replace(y=v_y)
 	return ret
 
+BUFFER_COORD_FORMATS = ('d', 'f', 'b', 'h', 'i', 'l', 'q')
+
+def coordsFromBuffer(p_arr):
+	"""Get x and y coordinate lists from (N,2) array of points, taken from any buffer-protocol object
+	   (numpy array, array.array, ...) through a memoryview, without intermediate copy.
+	   Buffer must be C-contiguous, holding x,y pairs. Objects not supporting buffer protocol
+	   are taken as sequences of points."""
+	try:
+		mv = memoryview(p_arr)
+	except TypeError:
+		xs = []
+		ys = []
+		for pt in p_arr:
+			xs.append(strictToNumber(pt[0]))
+			ys.append(strictToNumber(pt[1]))
+		return xs, ys
+	fmt = mv.format.lstrip("@=<>!")
+	assert fmt in BUFFER_COORD_FORMATS, f"unsupported buffer format: {mv.format}"
+	if mv.ndim != 1 or mv.format != fmt:
+		mv = mv.cast('B').cast(fmt)
+	assert len(mv) % 2 == 0, "coordinates buffer must hold x,y pairs"
+	return mv[0::2].tolist(), mv[1::2].tolist()
+
+def coordArraysFromBuffer(p_arr):
+	"""numpy float64 x and y arrays (strided views of buffer if it holds float64 pairs), as 'coordsFromBuffer'.
+	   None if numpy is not available or object doesn't support buffer protocol."""
+	np = _numpy()
+	if not np:
+		return None
+	try:
+		mv = memoryview(p_arr)
+	except TypeError:
+		return None
+	fmt = mv.format.lstrip("@=<>!")
+	assert fmt in BUFFER_COORD_FORMATS, f"unsupported buffer format: {mv.format}"
+	if mv.ndim != 1 or mv.format != fmt:
+		mv = mv.cast('B').cast(fmt)
+	assert len(mv) % 2 == 0, "coordinates buffer must hold x,y pairs"
+	arr = np.asarray(mv).astype(np.float64, copy=False)
+	return arr[0::2], arr[1::2]
+
 def ptGetAngle(p_pt1: Pt, p_pt2: Pt):
 	ret = None
 	dx = float(p_pt2.x) - float(p_pt1.x)
@@ -306,15 +469,100 @@ class WrongValuePathCmd(RuntimeError):
 	def __str__(self):
 		return f"Path command '{self.classname}' accepts no '{self.attr}' value"
 
+class ValUnit(namedtuple("ValUnit", "num unit")):
+	"Typed numeric value with units, formatted to text only when needed"
+	__slots__ = ()
+	def __str__(self):
+		return f"{self.num}{self.unit}"
+
+def _valueToText(p_val):
+	if isinstance(p_val, str):
+		return p_val
+	return str(p_val)
+
 class _attrs_struct(object):
+	"""Field values are kept typed (numbers, ValUnit or str, as given) in '_vals' dict, and
+	   formatted to text only when read as attributes or written to XML.
+	   Numeric readers (getNum, getNumAndUnit) do no string parsing for numeric values, strings
+	   are parsed once and replaced by its typed equivalent, if formatting it back gives the same text."""
 	
 	_fields = None # Required -- list to be extended in subclasses
 	_subfields = [] # Optional -- list to be extended in subclasses
+	_fieldset = frozenset()
+
+	def __init_subclass__(cls, **kwargs):
+		super().__init_subclass__(**kwargs)
+		if cls._fields is None:
+			cls._fieldset = frozenset()
+		elif isinstance(cls._fields, str):
+			cls._fieldset = frozenset((cls._fields,))
+		else:
+			cls._fieldset = frozenset(cls._fields)
 	
 	def __init__(self, *args, defaults=None) -> None:
 		self._unusedattrs = []
 		self.setall(*args, defaults=defaults) 
 
+	def __setattr__(self, p_name, p_value):
+		if p_name in self._fieldset:
+			try:
+				self.__dict__["_vals"][p_name] = p_value
+			except KeyError:
+				self.__dict__["_vals"] = { p_name: p_value }
+		else:
+			object.__setattr__(self, p_name, p_value)
+
+	def __getattr__(self, p_name):
+		# called only if regular attribute lookup fails
+		if p_name in self._fieldset:
+			vals = self.__dict__.get("_vals")
+			if not vals is None and p_name in vals:
+				return _valueToText(vals[p_name])
+		raise AttributeError(p_name)
+
+	def __dir__(self):
+		ret = list(super().__dir__())
+		ret.extend(self.__dict__.get("_vals", {}).keys())
+		return ret
+
+	def _getvals(self) -> dict:
+		ret = self.__dict__.get("_vals")
+		if ret is None:
+			ret = self.__dict__["_vals"] = {}
+		return ret
+
+	def isSet(self, p_attr: str) -> bool:
+		return p_attr in self._getvals()
+
+	def getNumAndUnit(self, p_attr: str):
+		"Typed read of field value, returns tuple (number, unit or None)"
+		vals = self._getvals()
+		val = vals[p_attr]
+		tp = type(val)
+		if tp is int:
+			return val, None
+		elif tp is float:
+			return removeDecsep(val), None
+		elif tp is ValUnit:
+			return removeDecsep(val.num), val.unit
+		num, un = toNumberAndUnit(val)
+		if isinstance(val, str):
+			if un is None:
+				if str(num) == val:
+					vals[p_attr] = num
+			else:
+				typed = ValUnit(num, un)
+				if str(typed) == val:
+					vals[p_attr] = typed
+		return num, un
+
+	def getNum(self, p_attr: str):
+		"Strict typed read of field value, raises ValueWithUnitsError if value has units"
+		num, un = self.getNumAndUnit(p_attr)
+		if not un is None:
+			raise ValueWithUnitsError(_valueToText(self._getvals()[p_attr]))
+		return num
+
 	def getfields(self):
 		return ",".join(self._fields)
 
@@ -322,20 +570,21 @@ class _attrs_struct(object):
 		used_fldindexes = set()
 		lf = len(self._fields)
 		la = len(args)
+		vals = self._getvals()
 		for i, fld in enumerate(self._fields):
 			if i < la:
 				val = args[i]
 				if not val is None:
-					setattr(self, fld, str(val))
+					vals[fld] = val
 					used_fldindexes.add(i)
 			else:
 				revi = lf - i - 1
 				if not defaults is None:
 					if len(defaults) > revi:
-						val = str(defaults[revi])
+						val = defaults[revi]
 					else:
-						val = str(defaults[-1])
-					setattr(self, fld, val)
+						val = defaults[-1]
+					vals[fld] = val
 		if len(self._subfields) > 0:
 			if len(self._subfields) == la - lf:
 				for j, sfld in enumerate(self._subfields):
@@ -358,7 +607,7 @@ class _attrs_struct(object):
 		return self._unusedattrs
 
 	def has(self, p_attr: str):
-		return p_attr in self._fields
+		return p_attr in self._fieldset
 
 	def hasHREF(self):
 		ret = False
@@ -370,33 +619,35 @@ class _attrs_struct(object):
 
 	def get(self, p_attr: str):
 		ret = None
-		if self.has(p_attr) and hasattr(self, p_attr):
-			ret = getattr(self, p_attr)
+		if p_attr in self._fieldset:
+			vals = self._getvals()
+			if p_attr in vals:
+				ret = _valueToText(vals[p_attr])
 		return ret
 
 	def set(self, p_attr: str, p_value):
 		if self.has(p_attr):
-			setattr(self, p_attr, str(p_value))
+			self._getvals()[p_attr] = p_value
 		return self
 
 	def setHREF(self, p_value):
 		for f in self._fields:
 			if f.endswith("href"):
-				setattr(self, f, str(p_value))
+				self._getvals()[f] = str(p_value)
 				break
 		return self
 
 	def getNumeric(self, p_attr: str) -> float:
 		ret = None
-		if self.has(p_attr) and hasattr(self, p_attr):
-			ret, _u = toNumberAndUnit(getattr(self, p_attr))
+		if self.has(p_attr) and self.isSet(p_attr):
+			ret, _u = self.getNumAndUnit(p_attr)
 		return ret
 
 	def __repr__(self):
 		out = [self.__class__.__name__]
-		for x in self.__dict__.keys():
-			if x in self._fields:
-				out.append(f"{x}={getattr(self, x)}")
+		for x, val in self._getvals().items():
+			if x in self._fieldset:
+				out.append(f"{x}={_valueToText(val)}")
 		return ' '.join(out)
 
 	# def toJSON(self):
@@ -407,10 +658,18 @@ class _attrs_struct(object):
 	# 	return out
 
 	def sharedItems(self, o: object) -> dict:
-		return {f: getattr(self,f) for f in self._fields if f in dir(o) and hasattr(self,f) and getattr(self,f) == getattr(o,f)}
+		ret = {}
+		vals = self._getvals()
+		for f in self._fields:
+			if f in vals and hasattr(o, f):
+				txt = _valueToText(vals[f])
+				if txt == getattr(o, f):
+					ret[f] = txt
+		return ret
 
 	def equality(self, o: object) -> bool:
-		l = len([f for f in self._fields if hasattr(self, f) and not getattr(self, f) is None])
+		vals = self._getvals()
+		l = len([f for f in self._fields if f in vals and not vals[f] is None])
 		return len(self.sharedItems(o)) == l
 
 	def __eq__(self, o: object) -> bool:
@@ -421,28 +680,36 @@ class _attrs_struct(object):
 
 	def setXmlAttrs(self, xmlel) -> None:  
 		assert not xmlel is None
+		vals = self._getvals()
 		for f in self._fields:
-			if hasattr(self, f):
-				val = getattr(self, f)
+			if f in vals:
+				val = vals[f]
 				if not val is None:
-					assert not val == "None"
-					xmlel.set(f, str(val))
+					txt = _valueToText(val)
+					assert not txt == "None"
+					xmlel.set(f, txt)
 		return self
 
 	def getFromXmlAttrs(self, xmlel) -> None:  
 		assert not xmlel is None
+		vals = self._getvals()
 		for f in self._fields:
-			if f in xmlel.keys():
-				val = xmlel.get(f)
-				if not val is None:
-					setattr(self, f, xmlel.get(f))
+			val = xmlel.get(f)
+			if not val is None:
+				# keep typed value, if XML attrib has not been changed 
+				if not f in vals or _valueToText(vals[f]) != val:
+					vals[f] = val
 		return self
 
 	def cloneFrom(self, p_other):
-		for l in [self._fields, self._subfields]:
-			for fld in l:
-				if hasattr(p_other, fld):
-					setattr(self, fld, getattr(p_other, fld))
+		vals = self._getvals()
+		ovals = p_other._getvals()
+		for fld in self._fields:
+			if fld in ovals:
+				vals[fld] = ovals[fld]
+		for fld in self._subfields:
+			if hasattr(p_other, fld):
+				setattr(self, fld, getattr(p_other, fld))
 		return self
 
 class _withunits_struct(_attrs_struct):
@@ -472,22 +739,26 @@ class _withunits_struct(_attrs_struct):
 		if self._strictparsing:
 			assert self._units in ('px', 'pt', 'em', 'rem', '%'), f"invalid units: '{self._units}' not in 'px', 'pt', 'em', 'rem' or '%'"
 		if self._units in ('px', 'pt', 'em', 'rem', '%'):
+			vals = self._getvals()
 			for fi, f in enumerate(self._fields):
 				if fi >= self._maxattrnum_to_applyunits:
 					break
-				if not hasattr(self, f):
+				if not f in vals:
 					continue
-				val = getattr(self, f)
+				val = vals[f]
 				numval = None
-				try:
-					numval = int(val)
-				except ValueError:
+				if type(val) in (int, float):
+					numval = val
+				elif not type(val) is ValUnit:
 					try:
-						numval = float(val)
+						numval = int(val)
 					except ValueError:
-						pass
+						try:
+							numval = float(val)
+						except ValueError:
+							pass
 				if not numval is None and numval > 0:
-					setattr(self, f, f"{numval}{self._units}")
+					vals[f] = ValUnit(numval, self._units)
 		else:
 			self._unusedattrs.append(self._units)
 			self._units = None
@@ -500,17 +771,21 @@ class _withunits_struct(_attrs_struct):
 		self._apply_units()
 
 	def iterUnitsRemoved(self):
+		vals = self._getvals()
 		for f in self._fields:
-			if not hasattr(self, f):
+			if not f in vals:
 				continue
-			val = getattr(self, f)
+			val = _valueToText(vals[f])
 			if not self._units is None:
 				val = val.replace(self._units, '')
 			yield val
 
 	def iterUnitsRemovedNum(self):
-		for val in self.iterUnitsRemoved():
-			yield removeDecsep(float(val))
+		vals = self._getvals()
+		for f in self._fields:
+			if not f in vals:
+				continue
+			yield self.getNumAndUnit(f)[0]
 
 class _kwarg_attrs_struct(object):
 	
@@ -575,16 +850,16 @@ class Env(_attrs_struct):
 			self.maxx = maxx
 			self.maxy = maxy
 	def getWidth(self):
-		a = strictToNumber(self.maxx)
-		b = strictToNumber(self.minx)
+		a = self.getNum("maxx")
+		b = self.getNum("minx")
 		return a - b
 	def getHeight(self):
-		a = strictToNumber(self.maxy)
-		b = strictToNumber(self.miny)
+		a = self.getNum("maxy")
+		b = self.getNum("miny")
 		return a - b
 	def getMidPt(self) -> Pt:
-		a = strictToNumber(self.minx)
-		b = strictToNumber(self.miny)
+		a = self.getNum("minx")
+		b = self.getNum("miny")
 		return Pt(a + (self.getWidth() / 2.0),
 					b + (self.getHeight() / 2.0))
 	def getRectParams(self):
@@ -607,14 +882,14 @@ class Env(_attrs_struct):
 		self.maxy = removeDecsep(strictToNumber(cntPt.y) + dimy/2.0)
 		return self
 	def expandFromOther(self, other):
-		a = strictToNumber(self.minx)
-		b = strictToNumber(self.miny)
-		c = strictToNumber(self.maxx)
-		d = strictToNumber(self.maxy)
-		e = strictToNumber(other.minx)
-		f = strictToNumber(other.miny)
-		g = strictToNumber(other.maxx)
-		h = strictToNumber(other.maxy)
+		a = self.getNum("minx")
+		b = self.getNum("miny")
+		c = self.getNum("maxx")
+		d = self.getNum("maxy")
+		e = other.getNum("minx")
+		f = other.getNum("miny")
+		g = other.getNum("maxx")
+		h = other.getNum("maxy")
 		if e < a:
 			self.minx = e
 		if f < b:
@@ -625,10 +900,10 @@ class Env(_attrs_struct):
 			self.maxy = h
 		return self
 	def expandFromPoint(self, pt):
-		a = strictToNumber(self.minx)
-		b = strictToNumber(self.miny)
-		c = strictToNumber(self.maxx)
-		d = strictToNumber(self.maxy)
+		a = self.getNum("minx")
+		b = self.getNum("miny")
+		c = self.getNum("maxx")
+		d = self.getNum("maxy")
 		if pt.x < a:
 			self.minx = pt.x
 		if pt.y < b:
@@ -677,8 +952,12 @@ class transform_def(_attrs_struct):
 	def setvalue(self, p_field: str, p_value):
 		if p_field not in self._fields:
 			raise WrongValueTransformDef(self, p_field)
-		setattr(self, p_field, str(p_value))
+		setattr(self, p_field, p_value)
 		return self
+	def _getNumOr(self, p_field: str, p_default):
+		if self.isSet(p_field):
+			return self.getNum(p_field)
+		return p_default
 
 class Mat(transform_def):
 	_fields = ("a", "b", "c", "d", "e", "f")
@@ -686,6 +965,8 @@ class Mat(transform_def):
 	def __init__(self, *args) -> None:
 		super().__init__(*args)
 		self.validate()
+	def getMatrix(self):
+		return tuple(self.getNum(f) for f in self._fields)
 
 class Trans(transform_def):
 	_fields = ("tx", "ty")
@@ -694,9 +975,11 @@ class Trans(transform_def):
 	def __init__(self, *args) -> None:
 		super().__init__(*args)
 		self.validate()
+	def getMatrix(self):
+		return (1, 0, 0, 1, self.getNum("tx"), self._getNumOr("ty", 0))
 	def yinvert(self, p_yheight):
 		if hasattr(self, "ty"):
-			setattr(self, "ty", str(p_yheight - strictToNumber(getattr(self, "ty"))))
+			setattr(self, "ty", p_yheight - self.getNum("ty"))
 
 class Scale(transform_def):
 	_fields = ("sx", "sy")
@@ -705,6 +988,9 @@ class Scale(transform_def):
 	def __init__(self, *args) -> None:
 		super().__init__(*args)
 		self.validate()
+	def getMatrix(self):
+		sx = self.getNum("sx")
+		return (sx, 0, 0, self._getNumOr("sy", sx), 0, 0)
 
 class Rotate(transform_def):
 	_fields = ("rotate-angle", "cx", "cy")
@@ -713,9 +999,16 @@ class Rotate(transform_def):
 	def __init__(self, *args) -> None:
 		super().__init__(*args)
 		self.validate()
+	def getMatrix(self):
+		ang = radians(self.getNum("rotate-angle"))
+		cs = cos(ang)
+		sn = sin(ang)
+		cx = self._getNumOr("cx", 0)
+		cy = self._getNumOr("cy", 0)
+		return (cs, sn, -sn, cs, cx - cs * cx + sn * cy, cy - sn * cx - cs * cy)
 	def yinvert(self, p_yheight):
 		if hasattr(self, "cy"):
-			setattr(self, "cy", str(p_yheight - strictToNumber(getattr(self, "cy"))))
+			setattr(self, "cy", p_yheight - self.getNum("cy"))
 
 class SkewX(transform_def):
 	_fields = ("skew-angle",)
@@ -723,6 +1016,8 @@ class SkewX(transform_def):
 	def __init__(self, *args) -> None:
 		super().__init__(*args)
 		self.validate()
+	def getMatrix(self):
+		return (1, 0, tan(radians(self.getNum("skew-angle"))), 1, 0, 0)
 
 class SkewY(transform_def):
 	_fields = ("skew-angle",)
@@ -730,6 +1025,8 @@ class SkewY(transform_def):
 	def __init__(self, *args) -> None:
 		super().__init__(*args)
 		self.validate()
+	def getMatrix(self):
+		return (1, tan(radians(self.getNum("skew-angle"))), 0, 1, 0, 0)
 
 # Path commands
 
@@ -761,14 +1058,15 @@ class path_command(_attrs_struct):
 	def get(self, omitletter: Optional[bool] = False):
 		buf = []
 		first_is_positive = False
-		vals = [getattr(self, f) for f in self._fields]
-		for i, v in enumerate(vals):
+		vals = self._getvals()
+		for i, f in enumerate(self._fields):
+			v = _valueToText(vals[f])
 			if i == 0:
 				buf.append(v)
-				if float(v) >= 0:
+				if self.getNumAndUnit(f)[0] >= 0:
 					first_is_positive = True
 			else:
-				if float(v) >= 0:
+				if self.getNumAndUnit(f)[0] >= 0:
 					buf.append(' ')
 				buf.append(v)
 		if omitletter:
@@ -787,7 +1085,7 @@ class path_command(_attrs_struct):
 	def setvalue(self, p_field: str, p_value):
 		if p_field not in self._fields:
 			raise WrongValuePathCmd(self, p_field)
-		setattr(self, p_field, str(p_value))
+		setattr(self, p_field, p_value)
 		return self
 	# def yinvert(self, p_yheight):
 	# 	for f in self._y_valinverts:
@@ -815,7 +1113,7 @@ class pM(rel_path_command):
 		super().__init__(*args, relative=relative)
 	def yinvert(self, p_yheight):
 		if hasattr(self, "y"):
-			setattr(self, "y", str(p_yheight - strictToNumber(getattr(self, "y"))))
+			setattr(self, "y", p_yheight - self.getNum("y"))
 	
 class pL(rel_path_command):
 	"Line to"
@@ -825,7 +1123,7 @@ class pL(rel_path_command):
 		super().__init__(*args, relative=relative)
 	def yinvert(self, p_yheight):
 		if hasattr(self, "y"):
-			setattr(self, "y", str(p_yheight - strictToNumber(getattr(self, "y"))))
+			setattr(self, "y", p_yheight - self.getNum("y"))
 
 class pH(rel_path_command):
 	"Horizontal line to"
@@ -842,7 +1140,7 @@ class pV(rel_path_command):
 		super().__init__(*args, relative=relative)
 	def yinvert(self, p_yheight):
 		if hasattr(self, "y"):
-			setattr(self, "y", str(p_yheight - strictToNumber(getattr(self, "y"))))
+			setattr(self, "y", p_yheight - self.getNum("y"))
 
 class pC(rel_path_command):
 	"Cubic Bézier"
@@ -853,7 +1151,7 @@ class pC(rel_path_command):
 	def yinvert(self, p_yheight):
 		for fld in ("y1", "y2", "y"):
 			if hasattr(self, fld):
-				setattr(self, fld, str(p_yheight - strictToNumber(getattr(self, fld))))
+				setattr(self, fld, p_yheight - self.getNum(fld))
 
 class pS(rel_path_command):
 	"Shorthand cubic Bézier"
@@ -864,7 +1162,7 @@ class pS(rel_path_command):
 	def yinvert(self, p_yheight):
 		for fld in ("y2", "y"):
 			if hasattr(self, fld):
-				setattr(self, fld, str(p_yheight - strictToNumber(getattr(self, fld))))
+				setattr(self, fld, p_yheight - self.getNum(fld))
 
 class pQ(rel_path_command):
 	"Quadratic Bézier"
@@ -875,7 +1173,7 @@ class pQ(rel_path_command):
 	def yinvert(self, p_yheight):
 		for fld in ("y1", "y"):
 			if hasattr(self, fld):
-				setattr(self, fld, str(p_yheight - strictToNumber(getattr(self, fld))))
+				setattr(self, fld, p_yheight - self.getNum(fld))
 
 class pT(rel_path_command):
 	"Shorthand quadratic Bézier"
@@ -885,7 +1183,7 @@ class pT(rel_path_command):
 		super().__init__(*args, relative=relative)
 	def yinvert(self, p_yheight):
 		if hasattr(self, "y"):
-			setattr(self, "y", str(p_yheight - strictToNumber(getattr(self, "y"))))
+			setattr(self, "y", p_yheight - self.getNum("y"))
 
 class pA(rel_path_command):
 	"Eliptical arc"
@@ -895,7 +1193,7 @@ class pA(rel_path_command):
 		super().__init__(*args, relative=relative)
 	def yinvert(self, p_yheight):
 		if hasattr(self, "y"):
-			setattr(self, "y", str(p_yheight - strictToNumber(getattr(self, "y"))))
+			setattr(self, "y", p_yheight - self.getNum("y"))
 
 class pClose(path_command):
 	_fields = ()
@@ -903,3 +1201,185 @@ class pClose(path_command):
 	def __init__(self, *args) -> None:
 		super().__init__(*args)
 
+
+PATH_CMD_CLASSES = { cls._letter.upper(): cls for cls in (pM, pL, pH, pV, pC, pS, pQ, pT, pA, pClose) }
+PATH_CMD_NARGS = { lett: len(cls._fieldset) for lett, cls in PATH_CMD_CLASSES.items() }
+PATH_D_TOKEN_RE = re_compile(r"[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+# (previous, current) command letters for which current letter is implicit and can be omitted
+PATH_CMD_OMIT_PAIRS = frozenset([(ord(a), ord(b)) for a, b in (('m', 'l'), ('l', 'l'), ('M', 'L'), ('L', 'L'))] + \
+	[(ord(c), ord(c)) for c in "hHvVcCsSqQtTaAzZ"])
+PATH_CMD_NARGS_BYCODE = { ord(l): n for lett, n in PATH_CMD_NARGS.items() for l in (lett, lett.lower()) }
+
+_PATH_NARGS_TABLE = None
+
+def _pathNargsTable():
+	"numpy array of number of args by command letter code, -1 for non command codes"
+	global _PATH_NARGS_TABLE
+	if _PATH_NARGS_TABLE is None:
+		np = _numpy()
+		_PATH_NARGS_TABLE = np.full(256, -1, dtype=np.int64)
+		for code, n in PATH_CMD_NARGS_BYCODE.items():
+			_PATH_NARGS_TABLE[code] = n
+	return _PATH_NARGS_TABLE
+
+class PathCmdBuffer(object):
+	"""Compact storage for path commands: one letter per command (lowercase letter for relative commands)
+	   and all command arguments in a single contiguous float64 array."""
+
+	__slots__ = ("letters", "vals", "offsets")
+
+	def __init__(self) -> None:
+		self.letters = bytearray()
+		self.vals = array('d')
+		self.offsets = array('q') # start of each command args in 'vals'
+
+	def __len__(self):
+		return len(self.letters)
+
+	def _shiftOffsets(self, p_from: int, p_delta: int) -> None:
+		offs = self.offsets
+		for i in range(p_from, len(offs)):
+			offs[i] += p_delta
+
+	def append(self, p_letter: str, p_args) -> None:
+		assert len(p_args) == PATH_CMD_NARGS[p_letter.upper()], f"{p_letter}: wrong number of args, {len(p_args)}"
+		self.offsets.append(len(self.vals))
+		self.letters.append(ord(p_letter))
+		self.vals.extend(p_args)
+
+	def extend(self, p_letters: str, p_args) -> None:
+		"Bulk append of commands, p_args holding all commands arguments in sequence"
+		codes = p_letters.encode('ascii')
+		start = len(self.vals)
+		np = _numpy()
+		if np and len(codes) > 0:
+			nargs = _pathNargsTable()[np.frombuffer(codes, dtype=np.uint8)]
+			assert nargs.min() >= 0, f"invalid path command in '{p_letters}'"
+			assert len(p_args) == nargs.sum(), "wrong number of args"
+			offsets = np.empty(len(nargs), dtype=np.int64)
+			offsets[0] = start
+			np.cumsum(nargs[:-1], out=offsets[1:])
+			offsets[1:] += start
+			self.offsets.frombytes(offsets.tobytes())
+		else:
+			nargs = [PATH_CMD_NARGS[lett.upper()] for lett in p_letters]
+			assert len(p_args) == sum(nargs), "wrong number of args"
+			if len(nargs) > 0:
+				self.offsets.extend(accumulate([start] + nargs[:-1]))
+		self.letters.extend(codes)
+		self.vals.extend(p_args)
+
+	def insert(self, p_idx: int, p_letter: str, p_args) -> None:
+		assert len(p_args) == PATH_CMD_NARGS[p_letter.upper()], f"{p_letter}: wrong number of args, {len(p_args)}"
+		cnt = len(self.letters)
+		if p_idx < 0:
+			p_idx = max(0, cnt + p_idx)
+		if p_idx >= cnt:
+			self.append(p_letter, p_args)
+			return
+		start = self.offsets[p_idx]
+		self.vals[start:start] = array('d', p_args)
+		self.letters.insert(p_idx, ord(p_letter))
+		self.offsets.insert(p_idx, start)
+		self._shiftOffsets(p_idx+1, len(p_args))
+
+	def delete(self, p_idx: int) -> None:
+		if p_idx < 0:
+			p_idx = len(self.letters) + p_idx
+		start = self.offsets[p_idx]
+		n = PATH_CMD_NARGS[chr(self.letters[p_idx]).upper()]
+		del self.vals[start:start+n]
+		del self.letters[p_idx]
+		del self.offsets[p_idx]
+		self._shiftOffsets(p_idx, -n)
+
+	def clear(self) -> None:
+		del self.letters[:]
+		del self.vals[:]
+		del self.offsets[:]
+
+	@classmethod
+	def fromD(cls, p_d: str):
+		"Parse path 'd' attribute text into new buffer"
+		ret = cls()
+		lett = None
+		args = []
+		for tok in PATH_D_TOKEN_RE.findall(p_d):
+			if tok.isalpha():
+				if tok.upper() == 'Z':
+					ret.append(tok, ())
+				lett = tok
+				continue
+			assert not lett is None, f"path data must start with a command: {p_d}"
+			args.append(float(tok))
+			if len(args) == PATH_CMD_NARGS[lett.upper()]:
+				ret.append(lett, args)
+				args = []
+				# coordinates following a moveto are implicit linetos
+				if lett == 'M':
+					lett = 'L'
+				elif lett == 'm':
+					lett = 'l'
+		return ret
+
+	def getLetter(self, p_idx: int) -> str:
+		return chr(self.letters[p_idx])
+
+	def isRelative(self, p_idx: int) -> bool:
+		return chr(self.letters[p_idx]).islower()
+
+	def setRelative(self, p_idx: int, is_relative: bool) -> None:
+		lett = chr(self.letters[p_idx])
+		if lett.upper() == 'Z':
+			return
+		if is_relative:
+			self.letters[p_idx] = ord(lett.lower())
+		else:
+			self.letters[p_idx] = ord(lett.upper())
+
+	def getArgs(self, p_idx: int) -> List[float]:
+		if p_idx < 0:
+			p_idx = len(self.letters) + p_idx
+		start = self.offsets[p_idx]
+		return self.vals[start:start+PATH_CMD_NARGS[chr(self.letters[p_idx]).upper()]].tolist()
+
+	def getCmd(self, p_idx: int) -> path_command:
+		"Get path_command object equivalent of command at p_idx"
+		lett = self.getLetter(p_idx)
+		cls = PATH_CMD_CLASSES[lett.upper()]
+		if cls is pClose:
+			return pClose()
+		return cls(*self.getArgs(p_idx), relative=lett.islower())
+
+	def toD(self) -> str:
+		"""Build path 'd' attribute text. All values are formatted in one pass, 
+		   then letters repeated from previous command (implicit in SVG path syntax) are omitted."""
+		if len(self.letters) == 0:
+			return ""
+		assert chr(self.letters[0]).lower() == 'm', chr(self.letters[0])
+		vals = self.vals
+		txts = _numsToText(vals)
+		# value text, preceded by separator if needed (a minus sign already separates)
+		septxts = [t if v < 0 else ' ' + t for t, v in zip(txts, vals)]
+		nargs = PATH_CMD_NARGS_BYCODE
+		omits = PATH_CMD_OMIT_PAIRS
+		# initial moveto always written absolute, buffer left unchanged
+		prevcode = ord('M')
+		buf = ['M', txts[0]]
+		buf.extend(septxts[1:2])
+		app = buf.append
+		vi = 2
+		for code in self.letters[1:]:
+			n = nargs[code]
+			if (prevcode, code) in omits:
+				if n > 0:
+					app(septxts[vi])
+			else:
+				app(chr(code))
+				if n > 0:
+					app(txts[vi])
+			if n > 1:
+				buf.extend(septxts[vi+1:vi+n])
+			vi += n
+			prevcode = code
+		return ''.join(buf)
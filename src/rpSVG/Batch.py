@@ -0,0 +1,160 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+import signal
+from threading import current_thread, main_thread
+from typing import Callable, Iterable, Optional, Tuple
+
+from rpSVG.SVGLib import SVGContent
+from rpSVG._export import EXPORT_FORMATS, exportSVGBytes
+
+BATCH_FORMATS = EXPORT_FORMATS
+BATCH_CHUNK_SIZE = 8
+
+class BatchJobTimeout(RuntimeError):
+	def __init__(self, p_timeout) -> None:
+		super().__init__(p_timeout)
+		self.timeout = p_timeout
+	def __str__(self):
+		return f"batch job exceeded {self.timeout}s timeout"
+
+def _onJobTimeout(signum, frame):
+	raise BatchJobTimeout(_worker_state["timeout"])
+
+def _runJob(p_job: Tuple[Callable, object], p_formats: tuple, p_seropts: dict, p_convopts: dict) -> dict:
+	"Build job document and convert it to requested formats, returns format -> bytes dict"
+	func, data = p_job
+	doc = func(data)
+	if isinstance(doc, SVGContent):
+		svgbytes = doc.toBytes(**p_seropts)
+	else:
+		# job built bytes itself (ex: SVGTemplate.render)
+		svgbytes = doc
+	return exportSVGBytes(svgbytes, formats=p_formats, **p_convopts)
+
+def _runJobGuarded(p_job, p_formats, p_seropts, p_convopts, p_timeout):
+	"Returns (True, result) or (False, exception), timeout is enforced only where SIGALRM is available"
+	usealarm = not p_timeout is None and hasattr(signal, "setitimer") and current_thread() is main_thread()
+	if usealarm:
+		_worker_state["timeout"] = p_timeout
+		prevhandler = signal.signal(signal.SIGALRM, _onJobTimeout)
+		signal.setitimer(signal.ITIMER_REAL, p_timeout)
+	try:
+		ret = (True, _runJob(p_job, p_formats, p_seropts, p_convopts))
+	except Exception as e:
+		ret = (False, e)
+	finally:
+		if usealarm:
+			signal.setitimer(signal.ITIMER_REAL, 0)
+			signal.signal(signal.SIGALRM, prevhandler)
+	return ret
+
+# Process pool workers state
+
+_worker_state = {}
+
+def _initBatchWorker(p_formats: tuple, p_seropts: dict, p_convopts: dict, p_timeout, p_initializer, p_initargs) -> None:
+	# warm up: cairosvg (and cairo libs) imported once per worker, not on first job
+	if any(fmt != "svg" for fmt in p_formats):
+		import cairosvg.parser
+	_worker_state.update(formats=p_formats, seropts=p_seropts, convopts=p_convopts, timeout=p_timeout)
+	if not p_initializer is None:
+		p_initializer(*p_initargs)
+
+def _runBatchChunk(p_chunk: list) -> list:
+	st = _worker_state
+	return [(idx, _runJobGuarded(job, st["formats"], st["seropts"], st["convopts"], st["timeout"])) for idx, job in p_chunk]
+
+class BatchRenderer(object):
+	"""Renders many documents over a pool of worker processes.
+
+	   Jobs are (callable, data) tuples: callable(data), run in a worker, returns SVGContent (or SVG bytes).
+	   Both must be picklable (ex: module level functions). Each job result is a dict of format -> bytes,
+	   formats from BATCH_FORMATS, non 'svg' ones rendered by cairosvg (see _export.exportSVGBytes).
+
+	   workers - number of worker processes, if None or 1 jobs run in this process
+	   chunksize - jobs sent to a worker at once
+	   maxpending - backpressure: max chunks in flight or (ordered) completed but waiting for an earlier one,
+			job iterable is consumed only as they are yielded
+	   timeout - per job, in seconds (needs SIGALRM, POSIX only), failed jobs give BatchJobTimeout
+	   initializer, initargs - extra worker initialization, after lxml and cairosvg imports
+	   seropts - SVGContent.toBytes arguments, convopts - exportSVGBytes arguments (ex: dpi, scale, pngscales)"""
+
+	def __init__(self, formats=("svg",), workers: Optional[int] = None, chunksize: int = BATCH_CHUNK_SIZE,
+			maxpending: Optional[int] = None, timeout: Optional[float] = None,
+			initializer: Optional[Callable] = None, initargs: tuple = (),
+			seropts: Optional[dict] = None, convopts: Optional[dict] = None) -> None:
+		for fmt in formats:
+			assert fmt in BATCH_FORMATS, f"invalid format '{fmt}', not in {BATCH_FORMATS}"
+		assert chunksize > 0
+		self.formats = tuple(formats)
+		self.workers = workers
+		self.chunksize = chunksize
+		if maxpending is None and not workers is None:
+			maxpending = 2 * workers
+		assert maxpending is None or maxpending >= 1, "maxpending must be at least 1"
+		self.maxpending = maxpending
+		self.timeout = timeout
+		self.initializer = initializer
+		self.initargs = initargs
+		if seropts is None:
+			seropts = { "inc_declaration": True }
+		self.seropts = seropts
+		if convopts is None:
+			convopts = {}
+		self.convopts = convopts
+
+	def _chunks(self, p_jobs: Iterable):
+		numbered = enumerate(p_jobs)
+		while True:
+			chunk = list(islice(numbered, self.chunksize))
+			if len(chunk) == 0:
+				break
+			yield chunk
+
+	def _iterResults(self, p_jobs: Iterable, ordered=True):
+		"""Yields (index, (ok, result or exception)), in input order or as completed.
+		   Chunks in flight plus completed ones waiting for an earlier one (ordered) never exceed maxpending"""
+		if self.workers is None or self.workers <= 1:
+			if not self.initializer is None:
+				self.initializer(*self.initargs)
+			for idx, job in enumerate(p_jobs):
+				yield idx, _runJobGuarded(job, self.formats, self.seropts, self.convopts, self.timeout)
+			return
+		initargs = (self.formats, self.seropts, self.convopts, self.timeout, self.initializer, self.initargs)
+		with ProcessPoolExecutor(max_workers=self.workers, initializer=_initBatchWorker, initargs=initargs) as executor:
+			chunks = self._chunks(p_jobs)
+			pending = {}
+			# ordered: completed chunks results, by chunk number, waiting for earlier chunks
+			buffered = {}
+			nextchunk = 0
+			submitted = 0
+			exhausted = False
+			while True:
+				while not exhausted and len(pending) + len(buffered) < self.maxpending:
+					chunk = next(chunks, None)
+					if chunk is None:
+						exhausted = True
+					else:
+						pending[executor.submit(_runBatchChunk, chunk)] = submitted
+						submitted += 1
+				if len(pending) == 0:
+					break
+				done, _notdone = wait(pending.keys(), return_when=FIRST_COMPLETED)
+				for fut in done:
+					chunkno = pending.pop(fut)
+					if not ordered:
+						yield from fut.result()
+						continue
+					buffered[chunkno] = fut.result()
+					while nextchunk in buffered:
+						yield from buffered.pop(nextchunk)
+						nextchunk += 1
+
+	def run(self, p_jobs: Iterable, ordered=True, raise_errors=True):
+		"""Yields (index, result) for each job, index is job position in input.
+			ordered - results in input order, else as completed
+			raise_errors - job exceptions are raised here, else yielded as result"""
+		for idx, (ok, res) in self._iterResults(p_jobs, ordered=ordered):
+			if not ok and raise_errors:
+				raise res
+			yield idx, res
@@ -0,0 +1,764 @@
+"""Direct rendering of SVGContent to cairo surfaces (cairocffi), skipping SVG serialization and reparsing.
+
+   Document tree is walked once, drawing calls are issued straight to a PNG, PDF or SVG surface.
+   Element objects data is used where available (path commands of AnalyticalPath, transforms lists),
+   XML attributes otherwise (ex: content merged as XML).
+
+   Supported: rect (rx, ry), circle, ellipse, line, polyline, polygon, path (all commands), text and tspan
+   (x, y, dx, dy, text-anchor, font family, size, style and weight), g, use of symbols (viewBox, overflow) or
+   other elements, linear and radial gradients (units, gradientTransform, spreadMethod, href), transforms,
+   presentation attributes, 'style' attributes and document stylesheet rules with simple selectors
+   (type, class, id, universal and their combinations, comma separated lists), opacity, display, visibility.
+
+   Not supported: markers, patterns, clip paths, masks, filters, images, text on paths, nested svg.
+   Drawing follows cairosvg conventions (ex: default font size 12pt, sans-serif family), for
+   outputs matching its own.
+"""
+
+from io import BytesIO
+from math import acos, ceil, cos, pi, radians, sin, sqrt, tan
+from re import compile as re_compile
+from typing import Optional
+
+from rpSVG.Basics import PATH_CMD_NARGS, PathCmdBuffer, toNumberAndUnit, toNumbersAndUnits
+from rpSVG.Geometry import IDENTITY_MATRIX, vec2_affine_mult
+from rpSVG.SVGLib import HREF_ATTRS, AnalyticalPath, SVGContent
+from rpSVG.SVGStyleText import STYLE_ATTRIBS
+
+RENDER_FORMATS = ("png", "pdf", "svg")
+
+# not inherited by children, other style properties are
+NOT_INHERITED_PROPS = frozenset(("opacity", "display", "overflow", "clip", "clip-path", "mask", "filter",
+	"stop-color", "stop-opacity", "flood-color", "flood-opacity", "lighting-color", "enable-background"))
+DEFAULT_FONT_SIZE = "12pt"
+PT_PER_PX = 0.75
+TRANSFORM_RE = re_compile(r"(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)")
+SIMPLE_SELECTOR_RE = re_compile(r"^([A-Za-z][\w-]*|\*)?((?:[.#][\w-]+)*)$")
+SELECTOR_PART_RE = re_compile(r"([.#])([\w-]+)")
+URL_RE = re_compile(r"url\(\s*['\"]?#([^)'\"\s]+)['\"]?\s*\)")
+
+def _cairo():
+	import cairocffi
+	return cairocffi
+
+def _localName(p_tag: str) -> str:
+	if p_tag[0] == '{':
+		return p_tag.split('}', 1)[1]
+	return p_tag
+
+def parseTransform(p_text: Optional[str]):
+	"Affine matrix (a, b, c, d, e, f) of 'transform' attribute text"
+	ret = IDENTITY_MATRIX
+	if not p_text:
+		return ret
+	for name, argstxt in TRANSFORM_RE.findall(p_text):
+		args = [n for n, _un in toNumbersAndUnits(argstxt)]
+		if name == "matrix":
+			m = tuple(args[:6])
+		elif name == "translate":
+			m = (1, 0, 0, 1, args[0], args[1] if len(args) > 1 else 0)
+		elif name == "scale":
+			m = (args[0], 0, 0, args[1] if len(args) > 1 else args[0], 0, 0)
+		elif name == "rotate":
+			a = radians(args[0])
+			m = (cos(a), sin(a), -sin(a), cos(a), 0, 0)
+			if len(args) > 2:
+				cx, cy = args[1], args[2]
+				m = vec2_affine_mult(vec2_affine_mult((1, 0, 0, 1, cx, cy), m), (1, 0, 0, 1, -cx, -cy))
+		elif name == "skewX":
+			m = (1, 0, tan(radians(args[0])), 1, 0, 0)
+		else:
+			m = (1, tan(radians(args[0])), 0, 1, 0, 0)
+		ret = vec2_affine_mult(ret, m)
+	return ret
+
+def _parseSelector(p_text: str):
+	"(tag or None, classes, id or None, specificity) of simple selector, None if not supported"
+	mo = SIMPLE_SELECTOR_RE.match(p_text.strip())
+	if mo is None:
+		return None
+	tag = mo.group(1)
+	if tag == '*':
+		tag = None
+	classes = []
+	idval = None
+	for kind, name in SELECTOR_PART_RE.findall(mo.group(2)):
+		if kind == '.':
+			classes.append(name)
+		else:
+			idval = name
+	spec = (0 if idval is None else 1, len(classes), 0 if tag is None else 1)
+	return (tag, frozenset(classes), idval, spec)
+
+def _parseStyleAttr(p_text: str) -> dict:
+	ret = {}
+	for decl in p_text.split(';'):
+		if ':' in decl:
+			k, v = decl.split(':', 1)
+			ret[k.strip()] = v.strip()
+	return ret
+
+def _preserveAspectMatrix(p_viewbox, p_width: float, p_height: float, p_preserve: Optional[str]):
+	"Matrix mapping viewBox (minx, miny, w, h) to viewport (0, 0, p_width, p_height)"
+	minx, miny, vbw, vbh = p_viewbox
+	if vbw <= 0 or vbh <= 0:
+		return IDENTITY_MATRIX
+	sx = p_width / vbw
+	sy = p_height / vbh
+	parts = (p_preserve or "xMidYMid meet").split()
+	align = parts[0]
+	if align == "none":
+		return (sx, 0, 0, sy, -minx * sx, -miny * sy)
+	if len(parts) > 1 and parts[1] == "slice":
+		s = max(sx, sy)
+	else:
+		s = min(sx, sy)
+	tx = -minx * s
+	ty = -miny * s
+	if "xMid" in align:
+		tx += (p_width - vbw * s) / 2
+	elif "xMax" in align:
+		tx += p_width - vbw * s
+	if "YMid" in align:
+		ty += (p_height - vbh * s) / 2
+	elif "YMax" in align:
+		ty += p_height - vbh * s
+	return (s, 0, 0, s, tx, ty)
+
+def _arcTo(p_ctx, x0, y0, rx, ry, phi, largearc, sweep, x, y) -> None:
+	"SVG elliptical arc from current point (x0, y0), endpoint to center parameterization"
+	if x0 == x and y0 == y:
+		return
+	rx = abs(rx)
+	ry = abs(ry)
+	if rx == 0 or ry == 0:
+		p_ctx.line_to(x, y)
+		return
+	cphi = cos(radians(phi))
+	sphi = sin(radians(phi))
+	dx2 = (x0 - x) / 2
+	dy2 = (y0 - y) / 2
+	x1p = cphi * dx2 + sphi * dy2
+	y1p = -sphi * dx2 + cphi * dy2
+	lam = (x1p * x1p) / (rx * rx) + (y1p * y1p) / (ry * ry)
+	if lam > 1:
+		rx *= sqrt(lam)
+		ry *= sqrt(lam)
+	num = rx * rx * ry * ry - rx * rx * y1p * y1p - ry * ry * x1p * x1p
+	den = rx * rx * y1p * y1p + ry * ry * x1p * x1p
+	coef = sqrt(max(num, 0) / den) if den > 0 else 0
+	if bool(largearc) == bool(sweep):
+		coef = -coef
+	cxp = coef * rx * y1p / ry
+	cyp = -coef * ry * x1p / rx
+	cx = cphi * cxp - sphi * cyp + (x0 + x) / 2
+	cy = sphi * cxp + cphi * cyp + (y0 + y) / 2
+
+	def angle(ux, uy, vx, vy):
+		dot = ux * vx + uy * vy
+		ln = sqrt(ux * ux + uy * uy) * sqrt(vx * vx + vy * vy)
+		ret = acos(max(-1, min(1, dot / ln)))
+		if ux * vy - uy * vx < 0:
+			ret = -ret
+		return ret
+
+	ux = (x1p - cxp) / rx
+	uy = (y1p - cyp) / ry
+	vx = (-x1p - cxp) / rx
+	vy = (-y1p - cyp) / ry
+	theta1 = angle(1, 0, ux, uy)
+	dtheta = angle(ux, uy, vx, vy)
+	if not sweep and dtheta > 0:
+		dtheta -= 2 * pi
+	elif sweep and dtheta < 0:
+		dtheta += 2 * pi
+	mat = p_ctx.get_matrix()
+	p_ctx.translate(cx, cy)
+	p_ctx.rotate(radians(phi))
+	p_ctx.scale(rx, ry)
+	if sweep:
+		p_ctx.arc(0, 0, 1, theta1, theta1 + dtheta)
+	else:
+		p_ctx.arc_negative(0, 0, 1, theta1, theta1 + dtheta)
+	p_ctx.set_matrix(mat)
+
+def _ellipsePath(p_ctx, cx, cy, rx, ry) -> None:
+	mat = p_ctx.get_matrix()
+	p_ctx.new_sub_path()
+	p_ctx.translate(cx, cy)
+	p_ctx.scale(rx, ry)
+	p_ctx.arc(0, 0, 1, 0, 2 * pi)
+	p_ctx.close_path()
+	p_ctx.set_matrix(mat)
+
+def pathFromBuffer(p_ctx, p_buf: PathCmdBuffer) -> None:
+	"Add path commands in buffer to cairo context current path"
+	cx = cy = 0
+	sx = sy = 0
+	# last control point, for smooth curves
+	lcx = lcy = None
+	prevup = None
+	vals = p_buf.vals
+	offsets = p_buf.offsets
+	for idx, code in enumerate(p_buf.letters):
+		lett = chr(code)
+		up = lett.upper()
+		if up == 'Z':
+			p_ctx.close_path()
+			cx, cy = sx, sy
+			prevup = up
+			continue
+		off = offsets[idx]
+		a = vals[off:off+PATH_CMD_NARGS[up]]
+		if lett != up:
+			ox, oy = cx, cy
+		else:
+			ox = oy = 0
+		if up == 'M':
+			cx, cy = ox + a[0], oy + a[1]
+			p_ctx.move_to(cx, cy)
+			sx, sy = cx, cy
+		elif up == 'L':
+			cx, cy = ox + a[0], oy + a[1]
+			p_ctx.line_to(cx, cy)
+		elif up == 'H':
+			cx = ox + a[0]
+			p_ctx.line_to(cx, cy)
+		elif up == 'V':
+			cy = oy + a[0]
+			p_ctx.line_to(cx, cy)
+		elif up == 'C':
+			x1, y1, lcx, lcy = ox + a[0], oy + a[1], ox + a[2], oy + a[3]
+			cx, cy = ox + a[4], oy + a[5]
+			p_ctx.curve_to(x1, y1, lcx, lcy, cx, cy)
+		elif up == 'S':
+			if prevup in ('C', 'S'):
+				x1, y1 = 2 * cx - lcx, 2 * cy - lcy
+			else:
+				x1, y1 = cx, cy
+			lcx, lcy = ox + a[0], oy + a[1]
+			cx, cy = ox + a[2], oy + a[3]
+			p_ctx.curve_to(x1, y1, lcx, lcy, cx, cy)
+		elif up in ('Q', 'T'):
+			if up == 'Q':
+				qx, qy = ox + a[0], oy + a[1]
+				ex, ey = ox + a[2], oy + a[3]
+			else:
+				if prevup in ('Q', 'T'):
+					qx, qy = 2 * cx - lcx, 2 * cy - lcy
+				else:
+					qx, qy = cx, cy
+				ex, ey = ox + a[0], oy + a[1]
+			# quadratic to cubic
+			p_ctx.curve_to(cx + 2 * (qx - cx) / 3, cy + 2 * (qy - cy) / 3, ex + 2 * (qx - ex) / 3, ey + 2 * (qy - ey) / 3, ex, ey)
+			lcx, lcy = qx, qy
+			cx, cy = ex, ey
+		elif up == 'A':
+			x, y = ox + a[5], oy + a[6]
+			_arcTo(p_ctx, cx, cy, a[0], a[1], a[2], a[3], a[4], x, y)
+			cx, cy = x, y
+		prevup = up
+
+class CairoRenderer(object):
+	"""Draws SVGContent directly with cairo (cairocffi). See module doc for the supported subset.
+
+		CairoRenderer(sc).toPNG()
+
+	   scale - output size factor
+	   dpi - resolution for physical units (mm, cm, in, pt, pc) conversion, 96 as in cairosvg"""
+
+	def __init__(self, p_content: SVGContent, scale: float = 1, dpi: float = 96) -> None:
+		assert isinstance(p_content, SVGContent)
+		self._content = p_content
+		self.scale = scale
+		self.dpi = dpi
+		self._wrappers = None
+		self._ids = None
+		self._rules = None
+		self._vpsize = None
+
+	# Preparation
+
+	def _collectWrappers(self, p_elem) -> None:
+		for chld in getattr(p_elem, 'content', ()):
+			if chld.hasEl():
+				self._wrappers[chld.getEl()] = chld
+			self._collectWrappers(chld)
+
+	def _prepare(self) -> None:
+		content = self._content
+		content.onBeforeSerialize()
+		root = content.getEl()
+		self._wrappers = {}
+		self._collectWrappers(content)
+		self._ids = {}
+		for el in root.iter():
+			if isinstance(el.tag, str):
+				idval = el.get('id')
+				if not idval is None:
+					self._ids[idval] = el
+		self._rules = []
+		for order, rule in enumerate(content._styleel.stylerules.values()):
+			decls = rule.toDict()
+			for seltxt in rule.getSelector().split(','):
+				sel = _parseSelector(seltxt)
+				if not sel is None:
+					self._rules.append((sel[3], order, sel, decls))
+		self._rules.sort(key=lambda r: (r[0], r[1]))
+		w, h = self.getSize()
+		vbvals = content.getViewbox().getValues()
+		if len(vbvals) > 3:
+			self._vpsize = (vbvals[2], vbvals[3])
+		else:
+			self._vpsize = (w, h)
+
+	def getSize(self):
+		"Document size in px (before scale)"
+		strct = self._content.getStruct()
+		return tuple(self._unitsToPx(*strct.getNumAndUnit(f), 100) for f in ('width', 'height'))
+
+	def _unitsToPx(self, p_num: float, p_unit: Optional[str], p_ref: float, p_fontsize: float = 16) -> float:
+		if p_unit is None or p_unit == 'px':
+			return p_num
+		if p_unit == '%':
+			return p_num * p_ref / 100
+		if p_unit == 'em':
+			return p_num * p_fontsize
+		if p_unit == 'ex':
+			return p_num * p_fontsize / 2
+		perinch = { 'in': 1, 'cm': 2.54, 'mm': 25.4, 'pt': 72, 'pc': 6 }
+		if p_unit in perinch:
+			return p_num * self.dpi / perinch[p_unit]
+		return p_num
+
+	def _length(self, p_val, axis: str = 'x', default: float = 0, p_style: Optional[dict] = None) -> float:
+		if p_val is None or p_val == "":
+			return default
+		try:
+			num, un = toNumberAndUnit(p_val)
+		except ValueError:
+			return default
+		vpw, vph = self._vpsize
+		if axis == 'x':
+			ref = vpw
+		elif axis == 'y':
+			ref = vph
+		else:
+			ref = sqrt((vpw * vpw + vph * vph) / 2)
+		fontsize = 16
+		if not p_style is None and un in ('em', 'ex'):
+			fontsize = self._fontSize(p_style)
+		return self._unitsToPx(num, un, ref, fontsize)
+
+	def _fontSize(self, p_style: dict) -> float:
+		num, un = toNumberAndUnit(p_style.get('font-size', DEFAULT_FONT_SIZE))
+		return self._unitsToPx(num, un, 16)
+
+	# Styles
+
+	def _computedStyle(self, p_el, p_parentstyle: dict) -> dict:
+		ret = { k: v for k, v in p_parentstyle.items() if not k in NOT_INHERITED_PROPS }
+		for k, v in p_el.attrib.items():
+			if k in STYLE_ATTRIBS:
+				ret[k] = v
+		if len(self._rules) > 0:
+			tag = _localName(p_el.tag)
+			clsval = p_el.get('class')
+			classes = set() if clsval is None else set(clsval.split())
+			idval = p_el.get('id')
+			for _spec, _order, (stag, sclasses, sid, _sp), decls in self._rules:
+				if (stag is None or stag == tag) and (sid is None or sid == idval) and sclasses <= classes:
+					ret.update(decls)
+		styletxt = p_el.get('style')
+		if styletxt:
+			ret.update(_parseStyleAttr(styletxt))
+		for k, v in list(ret.items()):
+			if v == 'inherit':
+				if k in p_parentstyle:
+					ret[k] = p_parentstyle[k]
+				else:
+					del ret[k]
+		return ret
+
+	def _colorRGBA(self, p_value: str, p_opacity: float, p_style: dict):
+		from cairosvg.colors import color
+		if p_value == 'currentColor':
+			p_value = p_style.get('color', 'black')
+		return color(p_value, p_opacity)
+
+	def _gradientChain(self, p_el) -> list:
+		"Gradient element followed by gradients it references (href), for attributes and stops inheritance"
+		ret = []
+		el = p_el
+		while not el is None and not el in ret:
+			ret.append(el)
+			href = None
+			for attr in HREF_ATTRS:
+				href = el.get(attr)
+				if not href is None:
+					break
+			if href is None or not href.startswith('#'):
+				break
+			el = self._ids.get(href[1:])
+		return ret
+
+	def _gradientPattern(self, p_el, p_opacity: float, p_bbox):
+		cairo = _cairo()
+		chain = self._gradientChain(p_el)
+		def attr(p_name, p_default=None):
+			for el in chain:
+				val = el.get(p_name)
+				if not val is None:
+					return val
+			return p_default
+		bboxunits = attr('gradientUnits', 'objectBoundingBox') == 'objectBoundingBox'
+		if bboxunits:
+			minx, miny, maxx, maxy = p_bbox
+			if maxx - minx == 0 or maxy - miny == 0:
+				return None
+			def coord(p_name, p_default, p_axis):
+				num, un = toNumberAndUnit(attr(p_name, p_default))
+				if un == '%':
+					num /= 100
+				return num
+		else:
+			def coord(p_name, p_default, p_axis):
+				return self._length(attr(p_name, p_default), axis=p_axis)
+		tag = _localName(p_el.tag)
+		if tag == 'linearGradient':
+			pattern = cairo.LinearGradient(coord('x1', '0%', 'x'), coord('y1', '0%', 'y'), coord('x2', '100%', 'x'), coord('y2', '0%', 'y'))
+		else:
+			cx = coord('cx', '50%', 'x')
+			cy = coord('cy', '50%', 'y')
+			r = coord('r', '50%', 'o')
+			pattern = cairo.RadialGradient(coord('fx', attr('cx', '50%'), 'x'), coord('fy', attr('cy', '50%'), 'y'), 0, cx, cy, r)
+		stops = []
+		for el in chain:
+			stops = [s for s in el if isinstance(s.tag, str) and _localName(s.tag) == 'stop']
+			if len(stops) > 0:
+				break
+		lastoffset = 0
+		for stop in stops:
+			num, un = toNumberAndUnit(stop.get('offset', '0'))
+			if un == '%':
+				num /= 100
+			lastoffset = max(lastoffset, min(max(num, 0), 1))
+			stopstyle = self._computedStyle(stop, {})
+			opacity = float(stopstyle.get('stop-opacity', 1)) * p_opacity
+			pattern.add_color_stop_rgba(lastoffset, *self._colorRGBA(stopstyle.get('stop-color', 'black'), opacity, stopstyle))
+		spread = attr('spreadMethod', 'pad')
+		pattern.set_extend({ 'reflect': cairo.EXTEND_REFLECT, 'repeat': cairo.EXTEND_REPEAT }.get(spread, cairo.EXTEND_PAD))
+		mat = parseTransform(attr('gradientTransform'))
+		if bboxunits:
+			mat = vec2_affine_mult((maxx - minx, 0, 0, maxy - miny, minx, miny), mat)
+		if mat != IDENTITY_MATRIX:
+			cmat = cairo.Matrix(*mat)
+			cmat.invert()
+			pattern.set_matrix(cmat)
+		return pattern
+
+	def _setSource(self, p_ctx, p_value: str, p_opacity: float, p_style: dict, p_bbox) -> bool:
+		"Returns False if nothing is to be painted"
+		mo = URL_RE.match(p_value)
+		if not mo is None:
+			target = self._ids.get(mo.group(1))
+			if not target is None and _localName(target.tag) in ('linearGradient', 'radialGradient'):
+				pattern = self._gradientPattern(target, p_opacity, p_bbox)
+				if not pattern is None:
+					p_ctx.set_source(pattern)
+					return True
+			# fallback color, after url
+			p_value = p_value[mo.end():].strip()
+			if p_value == "":
+				return False
+		if p_value == 'none':
+			return False
+		p_ctx.set_source_rgba(*self._colorRGBA(p_value, p_opacity, p_style))
+		return True
+
+	def _paint(self, p_ctx, p_style: dict, p_opacity: float) -> None:
+		"Fill and stroke current path"
+		cairo = _cairo()
+		bbox = p_ctx.path_extents()
+		fill = p_style.get('fill', 'black')
+		if fill != 'none':
+			if p_style.get('fill-rule') == 'evenodd':
+				p_ctx.set_fill_rule(cairo.FILL_RULE_EVEN_ODD)
+			else:
+				p_ctx.set_fill_rule(cairo.FILL_RULE_WINDING)
+			if self._setSource(p_ctx, fill, float(p_style.get('fill-opacity', 1)) * p_opacity, p_style, bbox):
+				p_ctx.fill_preserve()
+		stroke = p_style.get('stroke', 'none')
+		width = self._length(p_style.get('stroke-width', '1'), axis='o', default=1, p_style=p_style)
+		if stroke != 'none' and width > 0:
+			p_ctx.set_line_width(width)
+			p_ctx.set_line_cap({ 'round': cairo.LINE_CAP_ROUND, 'square': cairo.LINE_CAP_SQUARE }.get(p_style.get('stroke-linecap'), cairo.LINE_CAP_BUTT))
+			p_ctx.set_line_join({ 'round': cairo.LINE_JOIN_ROUND, 'bevel': cairo.LINE_JOIN_BEVEL }.get(p_style.get('stroke-linejoin'), cairo.LINE_JOIN_MITER))
+			p_ctx.set_miter_limit(float(p_style.get('stroke-miterlimit', 4)))
+			dashes = p_style.get('stroke-dasharray', 'none')
+			if dashes != 'none':
+				dashlist = [self._length(d, axis='o') for d in dashes.replace(',', ' ').split()]
+				if sum(dashlist) > 0:
+					p_ctx.set_dash(dashlist, self._length(p_style.get('stroke-dashoffset', '0'), axis='o'))
+			else:
+				p_ctx.set_dash([])
+			if self._setSource(p_ctx, stroke, float(p_style.get('stroke-opacity', 1)) * p_opacity, p_style, bbox):
+				p_ctx.stroke_preserve()
+		p_ctx.new_path()
+
+	# Drawing
+
+	def _transform(self, p_ctx, p_el) -> None:
+		wrapper = self._wrappers.get(p_el)
+		if wrapper is None:
+			mat = parseTransform(p_el.get('transform'))
+		else:
+			mat = wrapper.getTransformMatrix()
+		if mat != IDENTITY_MATRIX:
+			p_ctx.transform(_cairo().Matrix(*mat))
+
+	def _shapePath(self, p_ctx, p_el, p_tag: str, p_style: dict) -> bool:
+		"Build shape path, returns False if there's nothing to draw"
+		ln = self._length
+		get = p_el.get
+		if p_tag == 'rect':
+			x, y = ln(get('x'), 'x'), ln(get('y'), 'y')
+			w, h = ln(get('width'), 'x'), ln(get('height'), 'y')
+			if w <= 0 or h <= 0:
+				return False
+			rx = get('rx')
+			ry = get('ry')
+			rx = ln(rx if not rx is None else ry, 'x')
+			ry = ln(ry if not ry is None else get('rx'), 'y')
+			rx = min(rx, w / 2)
+			ry = min(ry, h / 2)
+			if rx <= 0 or ry <= 0:
+				p_ctx.rectangle(x, y, w, h)
+			else:
+				p_ctx.move_to(x + rx, y)
+				p_ctx.line_to(x + w - rx, y)
+				_arcTo(p_ctx, x + w - rx, y, rx, ry, 0, 0, 1, x + w, y + ry)
+				p_ctx.line_to(x + w, y + h - ry)
+				_arcTo(p_ctx, x + w, y + h - ry, rx, ry, 0, 0, 1, x + w - rx, y + h)
+				p_ctx.line_to(x + rx, y + h)
+				_arcTo(p_ctx, x + rx, y + h, rx, ry, 0, 0, 1, x, y + h - ry)
+				p_ctx.line_to(x, y + ry)
+				_arcTo(p_ctx, x, y + ry, rx, ry, 0, 0, 1, x + rx, y)
+				p_ctx.close_path()
+		elif p_tag == 'circle':
+			r = ln(get('r'), 'o')
+			if r <= 0:
+				return False
+			_ellipsePath(p_ctx, ln(get('cx'), 'x'), ln(get('cy'), 'y'), r, r)
+		elif p_tag == 'ellipse':
+			rx, ry = ln(get('rx'), 'x'), ln(get('ry'), 'y')
+			if rx <= 0 or ry <= 0:
+				return False
+			_ellipsePath(p_ctx, ln(get('cx'), 'x'), ln(get('cy'), 'y'), rx, ry)
+		elif p_tag == 'line':
+			p_ctx.move_to(ln(get('x1'), 'x'), ln(get('y1'), 'y'))
+			p_ctx.line_to(ln(get('x2'), 'x'), ln(get('y2'), 'y'))
+		elif p_tag in ('polyline', 'polygon'):
+			nums = [n for n, _un in toNumbersAndUnits(get('points', ''))]
+			if len(nums) < 4:
+				return False
+			p_ctx.move_to(nums[0], nums[1])
+			for i in range(2, len(nums) - 1, 2):
+				p_ctx.line_to(nums[i], nums[i+1])
+			if p_tag == 'polygon':
+				p_ctx.close_path()
+		elif p_tag == 'path':
+			wrapper = self._wrappers.get(p_el)
+			if isinstance(wrapper, AnalyticalPath):
+				buf = wrapper.cmdbuf
+			else:
+				d = get('d')
+				if not d:
+					return False
+				buf = PathCmdBuffer.fromD(d)
+			if len(buf) == 0:
+				return False
+			pathFromBuffer(p_ctx, buf)
+		else:
+			return False
+		return True
+
+	def _selectFont(self, p_ctx, p_style: dict) -> None:
+		cairo = _cairo()
+		family = (p_style.get('font-family') or 'sans-serif').split(',')[0].strip('"\' ')
+		slant = { 'italic': cairo.FONT_SLANT_ITALIC, 'oblique': cairo.FONT_SLANT_OBLIQUE }.get(p_style.get('font-style'), cairo.FONT_SLANT_NORMAL)
+		weight = p_style.get('font-weight', 'normal')
+		if weight == 'bold' or weight == 'bolder' or (weight.isdigit() and int(weight) >= 550):
+			cweight = cairo.FONT_WEIGHT_BOLD
+		else:
+			cweight = cairo.FONT_WEIGHT_NORMAL
+		p_ctx.select_font_face(family, slant, cweight)
+		p_ctx.set_font_size(self._fontSize(p_style))
+
+	def _firstLength(self, p_val, p_axis: str, p_style: dict):
+		if p_val is None:
+			return None
+		parts = p_val.replace(',', ' ').split()
+		if len(parts) == 0:
+			return None
+		return self._length(parts[0], axis=p_axis, p_style=p_style)
+
+	def _textRun(self, p_ctx, p_text: Optional[str], p_style: dict, p_pos: list, p_opacity: float) -> None:
+		"Draw text run at current text position p_pos ([x, y], updated)"
+		if not p_text:
+			return
+		text = ' '.join(p_text.split())
+		if len(text) == 0:
+			return
+		if p_style.get('display') == 'none' or p_style.get('visibility', 'visible') == 'hidden':
+			return
+		self._selectFont(p_ctx, p_style)
+		xbearing, _ybearing, width, _height, xadvance, _yadvance = p_ctx.text_extents(text)
+		anchor = p_style.get('text-anchor')
+		xalign = 0
+		if anchor == 'middle':
+			xalign = -(width / 2 + xbearing)
+		elif anchor == 'end':
+			xalign = -(width + xbearing)
+		p_ctx.move_to(p_pos[0] + xalign, p_pos[1])
+		p_ctx.text_path(text)
+		self._paint(p_ctx, p_style, p_opacity)
+		p_pos[0] += xadvance + xalign
+
+	def _drawText(self, p_ctx, p_el, p_style: dict, p_pos: list, p_opacity: float) -> None:
+		x = self._firstLength(p_el.get('x'), 'x', p_style)
+		y = self._firstLength(p_el.get('y'), 'y', p_style)
+		if not x is None:
+			p_pos[0] = x
+		if not y is None:
+			p_pos[1] = y
+		p_pos[0] += self._firstLength(p_el.get('dx'), 'x', p_style) or 0
+		p_pos[1] += self._firstLength(p_el.get('dy'), 'y', p_style) or 0
+		self._textRun(p_ctx, p_el.text, p_style, p_pos, p_opacity)
+		for chld in p_el:
+			if not isinstance(chld.tag, str):
+				continue
+			if _localName(chld.tag) == 'tspan':
+				chldstyle = self._computedStyle(chld, p_style)
+				if chldstyle.get('display') != 'none':
+					self._drawText(p_ctx, chld, chldstyle, p_pos, p_opacity * float(chldstyle.get('opacity', 1)))
+			self._textRun(p_ctx, chld.tail, p_style, p_pos, p_opacity)
+
+	def _drawUse(self, p_ctx, p_el, p_style: dict, p_depth: int) -> None:
+		href = None
+		for attr in HREF_ATTRS:
+			href = p_el.get(attr)
+			if not href is None:
+				break
+		if href is None or not href.startswith('#'):
+			return
+		target = self._ids.get(href[1:])
+		if target is None:
+			return
+		ln = self._length
+		p_ctx.translate(ln(p_el.get('x'), 'x'), ln(p_el.get('y'), 'y'))
+		if _localName(target.tag) == 'symbol':
+			symstyle = self._computedStyle(target, p_style)
+			w = ln(p_el.get('width'), 'x', default=self._vpsize[0])
+			h = ln(p_el.get('height'), 'y', default=self._vpsize[1])
+			if symstyle.get('overflow', 'hidden') in ('hidden', 'scroll'):
+				p_ctx.rectangle(0, 0, w, h)
+				p_ctx.clip()
+			vbtxt = target.get('viewBox')
+			if vbtxt:
+				vb = [n for n, _un in toNumbersAndUnits(vbtxt)]
+				if len(vb) == 4:
+					p_ctx.transform(_cairo().Matrix(*_preserveAspectMatrix(vb, w, h, target.get('preserveAspectRatio'))))
+			self._drawChildren(p_ctx, target, symstyle, p_depth + 1)
+		else:
+			self._drawEl(p_ctx, target, p_style, p_depth + 1)
+
+	def _drawChildren(self, p_ctx, p_el, p_style: dict, p_depth: int) -> None:
+		for chld in p_el:
+			if isinstance(chld.tag, str):
+				self._drawEl(p_ctx, chld, p_style, p_depth)
+
+	def _drawEl(self, p_ctx, p_el, p_parentstyle: dict, p_depth: int = 0) -> None:
+		tag = _localName(p_el.tag)
+		if not tag in ('g', 'a', 'switch', 'rect', 'circle', 'ellipse', 'line', 'polyline', 'polygon', 'path', 'text', 'use'):
+			# defs, symbols, gradients, style, ... or not supported
+			return
+		if p_depth > 32:
+			# 'use' cycle
+			return
+		style = self._computedStyle(p_el, p_parentstyle)
+		if style.get('display') == 'none':
+			return
+		opacity = float(style.get('opacity', 1))
+		p_ctx.save()
+		self._transform(p_ctx, p_el)
+		grouped = opacity < 1 and tag in ('g', 'a', 'switch', 'use')
+		if grouped:
+			p_ctx.push_group()
+			shapeopacity = 1
+		else:
+			shapeopacity = opacity
+		if tag in ('g', 'a', 'switch'):
+			self._drawChildren(p_ctx, p_el, style, p_depth)
+		elif tag == 'use':
+			self._drawUse(p_ctx, p_el, style, p_depth)
+		elif tag == 'text':
+			self._drawText(p_ctx, p_el, style, [0, 0], shapeopacity)
+		elif style.get('visibility', 'visible') != 'hidden' and self._shapePath(p_ctx, p_el, tag, style):
+			self._paint(p_ctx, style, shapeopacity)
+		if grouped:
+			p_ctx.pop_group_to_source()
+			p_ctx.paint_with_alpha(opacity)
+		p_ctx.restore()
+
+	def draw(self, p_context) -> None:
+		"Draw document into cairocffi Context, in px units"
+		self._prepare()
+		root = self._content.getEl()
+		w, h = self.getSize()
+		p_context.save()
+		vbvals = self._content.getViewbox().getValues()
+		if len(vbvals) > 3:
+			p_context.transform(_cairo().Matrix(*_preserveAspectMatrix(vbvals, w, h, root.get('preserveAspectRatio'))))
+		self._drawChildren(p_context, root, self._computedStyle(root, {}), 0)
+		p_context.restore()
+
+	def _renderTo(self, p_format: str, p_output=None) -> Optional[bytes]:
+		assert p_format in RENDER_FORMATS, f"invalid format '{p_format}', not in {RENDER_FORMATS}"
+		cairo = _cairo()
+		w, h = self.getSize()
+		w *= self.scale
+		h *= self.scale
+		if p_output is None:
+			out = BytesIO()
+		else:
+			out = p_output
+		if p_format == 'png':
+			surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, int(ceil(w)), int(ceil(h)))
+			factor = self.scale
+		elif p_format == 'pdf':
+			surface = cairo.PDFSurface(out, w * PT_PER_PX, h * PT_PER_PX)
+			factor = self.scale * PT_PER_PX
+		else:
+			surface = cairo.SVGSurface(out, w * PT_PER_PX, h * PT_PER_PX)
+			factor = self.scale * PT_PER_PX
+		ctx = cairo.Context(surface)
+		ctx.scale(factor, factor)
+		self.draw(ctx)
+		if p_format == 'png':
+			surface.write_to_png(out)
+		surface.finish()
+		if p_output is None:
+			return out.getvalue()
+		return None
+
+	def toPNG(self, output=None) -> Optional[bytes]:
+		"PNG bytes, or written to output (file name or object) if given"
+		return self._renderTo('png', output)
+
+	def toPDF(self, output=None) -> Optional[bytes]:
+		return self._renderTo('pdf', output)
+
+	def toSVG(self, output=None) -> Optional[bytes]:
+		"cairo SVG surface output: shapes only, as drawn"
+		return self._renderTo('svg', output)
@@ -4,15 +4,29 @@ from rpSVG.Basics import Ln, Pt, Trans, fontSizeToVPUnits, glRd, strictToNumber,
 from rpSVG.Structs import Cir, Re
 from rpSVG.SVGLib import BaseSVGElem, Circle, Group, Rect, RectRC, TextParagraph, Use
 from rpSVG.Symbols import Cylinder, Diamond, Server
+from rpSVG.TextLayout import fitText, wrapText
+from rpSVG.TextMetrics import TextMetrics
 
 from typing import Optional, Union
 
 VERTICAL_ADJUST = 0.3
 
+_default_metrics = None
+
+def _defaultTextMetrics() -> TextMetrics:
+	global _default_metrics
+	if _default_metrics is None:
+		_default_metrics = TextMetrics()
+	return _default_metrics
+
 class TextBox(Group):
 
-	def __init__(self, *args, text: Optional[str] = None, paddingh=10, paddingv=10, vsep="1.2em", anchoring="lt", hjustify="left", vcenter_fontszpx=None) -> None:
-		"consumes rect args"
+	def __init__(self, *args, text: Optional[str] = None, paddingh=10, paddingv=10, vsep="1.2em", anchoring="lt", hjustify="left", vcenter_fontszpx=None,
+			wrap: Optional[str] = None, minfontsize=None, metrics: Optional[TextMetrics] = None) -> None:
+		"""consumes rect args
+			wrap - line breaking to box width, inside padding: 'greedy' or 'optimal' (see TextLayout)
+			minfontsize - if given, font size shrinks down to it, until text fits box (inside padding)
+			metrics - text measurement for wrap and shrink, font size is vcenter_fontszpx or metrics size"""
 		super().__init__()
 		self._FATTR_forceNonYInvertChildren = True
 		self._re = Re(*args)
@@ -25,6 +39,10 @@ class TextBox(Group):
 		self._shape = None
 		self._vcenter_fontszpx = vcenter_fontszpx
 		self._defselement = None
+		self._wrap = wrap
+		self._minfontsize = minfontsize
+		self._metrics = metrics
+		self._fontsize = None
 
 	def setBaseShape(self, p_shp: BaseSVGElem):
 		"""Setting a template shape which is goint to be adjusted 'onAfterParentAdding'.
@@ -49,17 +67,43 @@ class TextBox(Group):
 
 	def _getTextLines(self):
 		if not self.text is None and len(self.text) > 0:
-			textrows = self.text.split('\n')
+			if self._wrap is None and self._minfontsize is None:
+				textrows = self.text.split('\n')
+			else:
+				textrows = self._layoutText()
 		else:
 			textrows = []
 		return textrows
 
+	def _layoutText(self):
+		"Text lines wrapped and/or shrunk to fit box, inside padding, sets fitted font size"
+		metrics = self._metrics
+		if metrics is None:
+			metrics = _defaultTextMetrics()
+		if self._vcenter_fontszpx is None:
+			fontsize = metrics.size
+		else:
+			fontsize = fontSizeToVPUnits(fontsize=self._vcenter_fontszpx)
+		maxwidth = self._re.getNumeric("width") - 2 * self._padding[0]
+		if self._minfontsize is None:
+			self._fontsize = None
+			return list(wrapText(self.text, maxwidth, metrics, size=fontsize, method=self._wrap))
+		maxheight = self._re.getNumeric("height") - 2 * self._padding[1]
+		fontsize, lines = fitText(self.text, maxwidth, maxheight, metrics, size=fontsize, minsize=self._minfontsize,
+			vsep=self._vsep, method=self._wrap)
+		self._fontsize = glRd(fontsize)
+		return list(lines)
+
+	def getFontSize(self):
+		"Fitted font size, if shrinking to fit, else None"
+		return self._fontsize
+
 	def getParagraph(self):
 		return self._txpara
 
 	def getAnchor(self) -> Union[None, Pt]:
-		x, _u = toNumberAndUnit(self._re.get("x"))
-		y, _u = toNumberAndUnit(self._re.get("y"))
+		x, _u = self._re.getNumAndUnit("x")
+		y, _u = self._re.getNumAndUnit("y")
 		return Pt(x, y)
 
 	def _adjustTextVertical(self, l=None):
@@ -69,10 +113,14 @@ class TextBox(Group):
 			_l = len(self._getTextLines())
 
 		if _l > 0 and not self._vcenter_fontszpx is None and not self._txpara is None:			
+			if self._fontsize is None:
+				fontsz = self._vcenter_fontszpx
+			else:
+				fontsz = self._fontsize
 			boxheight = self._re.getNumeric("height")
 			hbh = boxheight / 2
-			lineheight = fontSizeToVPUnits(fontsize=self._vcenter_fontszpx, possibleEmModifier=self._vsep)
-			fontheight = fontSizeToVPUnits(fontsize=self._vcenter_fontszpx)
+			lineheight = fontSizeToVPUnits(fontsize=fontsz, possibleEmModifier=self._vsep)
+			fontheight = fontSizeToVPUnits(fontsize=fontsz)
 			head = lineheight - fontheight
 			hfh = fontheight / 2
 			offsetodd = hfh + head
@@ -91,8 +139,11 @@ class TextBox(Group):
 	def setText(self, p_text: str):
 		self.text = p_text
 		if not self._txpara is None:
-			self._txpara.setText(self._getTextLines())
-			self._adjustTextVertical()
+			textrows = self._getTextLines()
+			if not self._minfontsize is None:
+				self._txpara.setFontSize(self._fontsize)
+			self._txpara.setText(textrows)
+			self._adjustTextVertical(l=len(textrows))
 		return self
 
 	def refresh(self):
@@ -212,7 +263,7 @@ class TextBox(Group):
 		self._adjustTextVertical(l=len(textrows))
 
 		if self._txpara is None:
-			self._txpara = self.addChild(TextParagraph(tx, ty, textrows, vsep=self._vsep, justify=self._hjustify), noyinvert=True)
+			self._txpara = self.addChild(TextParagraph(tx, ty, textrows, vsep=self._vsep, justify=self._hjustify, fontsize=self._fontsize), noyinvert=True)
 
 	def onAfterParentAdding(self, defselement=None):	
 		self._defselement = defselement
@@ -1,7 +1,8 @@
 
+from heapq import heapify, heappop, heappush
 from math import sqrt, cos, sin, sqrt, radians
-from typing import List, Optional, Union
-from rpSVG.Basics import Elp, Ln, MINDELTA, NANODELTA, Pt, lineEquationParams, ptAdd, ptMult, ptSub
+from typing import List, Optional, Set, Union
+from rpSVG.Basics import Elp, Ln, MINDELTA, NANODELTA, Pt, _numpy, lineEquationParams, ptAdd, ptMult, ptSub
 
 def Ptg(x, y):
 	return Pt(float(x), float(y))
@@ -244,3 +245,339 @@ def ellipticalArcCenterAndRadii(p_p0: Pt, p_p1: Pt, p_rx, p_ry, largearcflag=0,
 
 
 
+
+def _isArray(p_xs) -> bool:
+	np = _numpy()
+	return bool(np) and isinstance(p_xs, np.ndarray)
+
+def _simplifyMarks(n: int, keep) -> bytearray:
+	"First, last and 'keep' vertices marked"
+	ret = bytearray(n)
+	ret[0] = 1
+	ret[-1] = 1
+	if not keep is None:
+		for i in keep:
+			if 0 <= i < n:
+				ret[i] = 1
+	return ret
+
+def _farthestInSpan(p_xs, p_ys, first: int, last: int) -> tuple:
+	"(squared distance, index) of vertex farthest from segment first-last, among those in between"
+	ax = p_xs[first]
+	ay = p_ys[first]
+	dx = p_xs[last] - ax
+	dy = p_ys[last] - ay
+	seglen2 = dx * dx + dy * dy
+	maxdist2 = -1
+	maxidx = None
+	for i in range(first+1, last):
+		px = p_xs[i] - ax
+		py = p_ys[i] - ay
+		if seglen2 > 0:
+			t = (px * dx + py * dy) / seglen2
+			if t < 0:
+				t = 0
+			elif t > 1:
+				t = 1
+			px = px - t * dx
+			py = py - t * dy
+		dist2 = px * px + py * py
+		if dist2 > maxdist2:
+			maxdist2 = dist2
+			maxidx = i
+	return maxdist2, maxidx
+
+# spans shorter than this are searched point by point, numpy call overhead exceeding gain
+_DP_ARR_MINSPAN = 32
+
+def _polylineSimplifyDPArr(p_xs, p_ys, p_tolerance: float, keep=None) -> List[int]:
+	"polylineSimplifyDP on numpy arrays, distances of vertices of long spans computed vectorized"
+	np = _numpy()
+	n = len(p_xs)
+	tol2 = p_tolerance * p_tolerance
+	marked = _simplifyMarks(n, keep)
+	anchors = [i for i in range(n) if marked[i]]
+	stack = list(zip(anchors[:-1], anchors[1:]))
+	xs = p_xs.tolist()
+	ys = p_ys.tolist()
+	while stack:
+		first, last = stack.pop()
+		if last - first < 2:
+			continue
+		if last - first < _DP_ARR_MINSPAN:
+			maxdist2, maxidx = _farthestInSpan(xs, ys, first, last)
+			if maxdist2 > tol2:
+				marked[maxidx] = 1
+				stack.append((first, maxidx))
+				stack.append((maxidx, last))
+			continue
+		ax = p_xs[first]
+		ay = p_ys[first]
+		dx = p_xs[last] - ax
+		dy = p_ys[last] - ay
+		seglen2 = dx * dx + dy * dy
+		px = p_xs[first+1:last] - ax
+		py = p_ys[first+1:last] - ay
+		if seglen2 > 0:
+			t = np.clip((px * dx + py * dy) / seglen2, 0, 1)
+			px = px - t * dx
+			py = py - t * dy
+		dist2 = px * px + py * py
+		# first of equal maxima, as list version
+		rel = int(np.argmax(dist2))
+		if dist2[rel] > tol2:
+			maxidx = first + 1 + rel
+			marked[maxidx] = 1
+			stack.append((first, maxidx))
+			stack.append((maxidx, last))
+	return [i for i in range(n) if marked[i]]
+
+def polylineSimplifyDP(p_xs: List[float], p_ys: List[float], p_tolerance: float, keep=None) -> List[int]:
+	"""Douglas-Peucker polyline simplification, iterative. Returns indexes of kept vertices.
+		p_xs, p_ys - lists, or numpy arrays (vectorized)
+		p_tolerance - max distance of removed vertices to simplified line
+		keep - optional collection of vertex indexes never to be removed (ex: vertices shared with adjacent rings)
+	"""
+	n = len(p_xs)
+	if n < 3:
+		return list(range(n))
+	if _isArray(p_xs):
+		return _polylineSimplifyDPArr(p_xs, p_ys, p_tolerance, keep=keep)
+	tol2 = p_tolerance * p_tolerance
+	marked = _simplifyMarks(n, keep)
+	# kept vertices split polyline in independently simplified spans
+	anchors = [i for i in range(n) if marked[i]]
+	stack = list(zip(anchors[:-1], anchors[1:]))
+	while stack:
+		first, last = stack.pop()
+		if last - first < 2:
+			continue
+		maxdist2, maxidx = _farthestInSpan(p_xs, p_ys, first, last)
+		if maxdist2 > tol2:
+			marked[maxidx] = 1
+			stack.append((first, maxidx))
+			stack.append((maxidx, last))
+	return [i for i in range(n) if marked[i]]
+
+def _triangleAreasArr(p_xs, p_ys):
+	"Triangle areas of each inner vertex with its neighbours, numpy arrays"
+	np = _numpy()
+	xi = p_xs[1:-1]
+	yi = p_ys[1:-1]
+	return np.abs((p_xs[:-2] - xi) * (p_ys[2:] - yi) - (p_xs[2:] - xi) * (p_ys[:-2] - yi)) / 2.0
+
+def polylineSimplifyVW(p_xs: List[float], p_ys: List[float], p_tolerance: float, keep=None) -> List[int]:
+	"""Visvalingam-Whyatt polyline simplification. Returns indexes of kept vertices.
+		p_xs, p_ys - lists, or numpy arrays (initial areas vectorized, vertices under tolerance only in heap)
+		p_tolerance - vertices whose effective triangle area is under p_tolerance squared are removed
+		keep - optional collection of vertex indexes never to be removed (ex: vertices shared with adjacent rings)
+	"""
+	n = len(p_xs)
+	if n < 3:
+		return list(range(n))
+	minarea = p_tolerance * p_tolerance
+	kept = _simplifyMarks(n, keep)
+	if _isArray(p_xs):
+		inner = _triangleAreasArr(p_xs, p_ys)
+		areas = [0.0] + inner.tolist() + [0.0]
+		# vertices at or over tolerance would never be popped before loop end, they only enter heap once a neighbour is removed
+		heap = [(areas[i], i) for i in (_numpy().flatnonzero(inner < minarea) + 1).tolist() if not kept[i]]
+		p_xs = p_xs.tolist()
+		p_ys = p_ys.tolist()
+	else:
+		areas = None
+	prv = list(range(-1, n-1))
+	nxt = list(range(1, n+1))
+	def area(i):
+		a = prv[i]
+		b = nxt[i]
+		xi = p_xs[i]
+		yi = p_ys[i]
+		return abs((p_xs[a] - xi) * (p_ys[b] - yi) - (p_xs[b] - xi) * (p_ys[a] - yi)) / 2.0
+	if areas is None:
+		areas = [0.0] * n
+		heap = []
+		for i in range(1, n-1):
+			if not kept[i]:
+				areas[i] = area(i)
+				heap.append((areas[i], i))
+	heapify(heap)
+	removed = bytearray(n)
+	while heap:
+		a, i = heappop(heap)
+		if removed[i] or a != areas[i]:
+			# stale entry
+			continue
+		if a >= minarea:
+			break
+		removed[i] = 1
+		p = prv[i]
+		q = nxt[i]
+		nxt[p] = q
+		prv[q] = p
+		for j in (p, q):
+			if not kept[j]:
+				# effective area never lower than that of already removed vertex
+				areas[j] = max(area(j), a)
+				heappush(heap, (areas[j], j))
+	return [i for i in range(n) if not removed[i]]
+
+SIMPLIFY_METHODS = {
+	"dp": polylineSimplifyDP,
+	"vw": polylineSimplifyVW
+}
+
+def polylineSimplify(p_xs: List[float], p_ys: List[float], p_tolerance: float, method="dp", keep=None) -> List[int]:
+	"method: 'dp' (Douglas-Peucker) or 'vw' (Visvalingam-Whyatt)"
+	assert method in SIMPLIFY_METHODS, f"unknown simplification method: {method}"
+	return SIMPLIFY_METHODS[method](p_xs, p_ys, p_tolerance, keep=keep)
+
+def sharedVertices(p_rings: List[List[Pt]]) -> List[Set[int]]:
+	"""For each ring (list of points), indexes of vertices also present in some other ring.
+		To be passed as 'keep' argument to simplification, preserving topology between adjacent rings."""
+	owners = {}
+	for ri, ring in enumerate(p_rings):
+		for pt in ring:
+			key = (pt[0], pt[1])
+			rset = owners.get(key)
+			if rset is None:
+				owners[key] = { ri }
+			else:
+				rset.add(ri)
+	ret = []
+	for ring in p_rings:
+		ret.append(set(i for i, pt in enumerate(ring) if len(owners[(pt[0], pt[1])]) > 1))
+	return ret
+
+IDENTITY_MATRIX = (1, 0, 0, 1, 0, 0)
+
+def vec2_affine_mult(p_m1, p_m2):
+	"Product of affine matrices (a, b, c, d, e, f), p_m2 applied first"
+	a1, b1, c1, d1, e1, f1 = p_m1
+	a2, b2, c2, d2, e2, f2 = p_m2
+	return (a1 * a2 + c1 * b2, b1 * a2 + d1 * b2,
+		a1 * c2 + c1 * d2, b1 * c2 + d1 * d2,
+		a1 * e2 + c1 * f2 + e1, b1 * e2 + d1 * f2 + f1)
+
+def vec2_affine_bounds(p_m, p_bounds):
+	"Axis aligned bounds (minx, miny, maxx, maxy) of transformed bounds"
+	if p_m == IDENTITY_MATRIX:
+		return p_bounds
+	a, b, c, d, e, f = p_m
+	minx, miny, maxx, maxy = p_bounds
+	xs = []
+	ys = []
+	for x, y in ((minx, miny), (maxx, miny), (maxx, maxy), (minx, maxy)):
+		xs.append(a * x + c * y + e)
+		ys.append(b * x + d * y + f)
+	return (min(xs), min(ys), max(xs), max(ys))
+
+def _clipEdge(p_pts, p_inside, p_intersect):
+	ret = []
+	l = len(p_pts)
+	for i in range(l):
+		cur = p_pts[i]
+		prev = p_pts[i-1]
+		if p_inside(cur):
+			if not p_inside(prev):
+				ret.append(p_intersect(prev, cur))
+			ret.append(cur)
+		elif p_inside(prev):
+			ret.append(p_intersect(prev, cur))
+	return ret
+
+def polygonClipRect(p_xs: List[float], p_ys: List[float], p_bounds):
+	"""Sutherland-Hodgman clipping of polygon ring to rectangle p_bounds (minx, miny, maxx, maxy).
+		Returns clipped ring as x and y lists, empty if ring is outside rectangle."""
+	minx, miny, maxx, maxy = p_bounds
+	def xcut(p_x):
+		def cut(a, b):
+			t = (p_x - a[0]) / (b[0] - a[0])
+			return (p_x, a[1] + t * (b[1] - a[1]))
+		return cut
+	def ycut(p_y):
+		def cut(a, b):
+			t = (p_y - a[1]) / (b[1] - a[1])
+			return (a[0] + t * (b[0] - a[0]), p_y)
+		return cut
+	pts = list(zip(p_xs, p_ys))
+	for inside, intersect in ((lambda p: p[0] >= minx, xcut(minx)), (lambda p: p[0] <= maxx, xcut(maxx)),
+			(lambda p: p[1] >= miny, ycut(miny)), (lambda p: p[1] <= maxy, ycut(maxy))):
+		if len(pts) == 0:
+			break
+		pts = _clipEdge(pts, inside, intersect)
+	return [p[0] for p in pts], [p[1] for p in pts]
+
+def segmentClipRect(x0: float, y0: float, x1: float, y1: float, p_bounds):
+	"""Liang-Barsky clipping of segment to rectangle p_bounds (minx, miny, maxx, maxy).
+		Returns (t0, t1) parameters of clipped segment, None if segment is outside rectangle."""
+	minx, miny, maxx, maxy = p_bounds
+	dx = x1 - x0
+	dy = y1 - y0
+	t0 = 0.0
+	t1 = 1.0
+	for p, q in ((-dx, x0 - minx), (dx, maxx - x0), (-dy, y0 - miny), (dy, maxy - y0)):
+		if p == 0:
+			if q < 0:
+				return None
+		else:
+			r = q / p
+			if p < 0:
+				if r > t1:
+					return None
+				if r > t0:
+					t0 = r
+			else:
+				if r < t0:
+					return None
+				if r < t1:
+					t1 = r
+	return t0, t1
+
+def polylineClipRect(p_xs: List[float], p_ys: List[float], p_bounds):
+	"""Clipping of polyline to rectangle p_bounds (minx, miny, maxx, maxy).
+		Returns list of polyline parts inside rectangle, each as tuple of x and y lists."""
+	ret = []
+	cur = None
+	for i in range(1, len(p_xs)):
+		x0, y0, x1, y1 = p_xs[i-1], p_ys[i-1], p_xs[i], p_ys[i]
+		clipped = segmentClipRect(x0, y0, x1, y1, p_bounds)
+		if clipped is None:
+			cur = None
+			continue
+		t0, t1 = clipped
+		if cur is None or t0 > 0:
+			cur = ([x0 + t0 * (x1 - x0)], [y0 + t0 * (y1 - y0)])
+			ret.append(cur)
+		cur[0].append(x0 + t1 * (x1 - x0))
+		cur[1].append(y0 + t1 * (y1 - y0))
+		if t1 < 1:
+			cur = None
+	return ret
+
+def segmentDistance(p_x: float, p_y: float, x0: float, y0: float, x1: float, y1: float) -> float:
+	"Distance from point to segment"
+	dx = x1 - x0
+	dy = y1 - y0
+	len2 = dx * dx + dy * dy
+	if len2 == 0:
+		t = 0
+	else:
+		t = max(0, min(1, ((p_x - x0) * dx + (p_y - y0) * dy) / len2))
+	ex = x0 + t * dx - p_x
+	ey = y0 + t * dy - p_y
+	return sqrt(ex * ex + ey * ey)
+
+def polygonWinding(p_xs: List[float], p_ys: List[float], p_x: float, p_y: float) -> int:
+	"Winding number of implicitly closed ring around point, 0 if outside"
+	ret = 0
+	l = len(p_xs)
+	for i in range(l):
+		x0, y0 = p_xs[i-1], p_ys[i-1]
+		x1, y1 = p_xs[i], p_ys[i]
+		if y0 <= p_y:
+			if y1 > p_y and (x1 - x0) * (p_y - y0) - (p_x - x0) * (y1 - y0) > 0:
+				ret += 1
+		elif y1 <= p_y and (x1 - x0) * (p_y - y0) - (p_x - x0) * (y1 - y0) < 0:
+			ret -= 1
+	return ret
@@ -0,0 +1,107 @@
+"""Multi-page PDF assembly, in memory, one page at a time.
+
+   Each page is drawn by cairosvg into a cairo recording surface, replayed into the page of a single
+   cairo PDF surface and discarded (see https://github.com/Kozea/CairoSVG/issues/200). Pages may have
+   different sizes. Memory use is bounded by one page, plus the PDF output if kept in memory.
+"""
+
+from io import BytesIO
+from typing import Iterable, Optional
+
+from rpSVG.Batch import BatchRenderer
+from rpSVG.SVGLib import SVGContent
+
+_recording_surface_class = None
+
+def _recordingSurfaceClass():
+	"cairosvg PDF surface drawing to a cairo recording surface, created on first use (cairo libs imported)"
+	global _recording_surface_class
+	if _recording_surface_class is None:
+		import cairocffi
+		from cairosvg.surface import PDFSurface
+
+		class RecordingPDFSurface(PDFSurface):
+			surface_class = cairocffi.RecordingSurface
+
+			def _create_surface(self, width, height):
+				cairo_surface = cairocffi.RecordingSurface(cairocffi.CONTENT_COLOR_ALPHA, (0, 0, width, height))
+				return cairo_surface, width, height
+
+		_recording_surface_class = RecordingPDFSurface
+	return _recording_surface_class
+
+class MultipagePDFWriter(object):
+	"""Appends pages, SVGContent, SVG bytes or cairosvg Tree, to one PDF:
+
+		with MultipagePDFWriter(fileobj) as wr:
+			for sc in docs:
+				wr.addPage(sc)
+
+	   output - file name or object
+	   dpi - as in cairosvg svg2pdf, 96 gives 0.75 pt per px"""
+
+	def __init__(self, output, dpi: float = 96, unsafe=False) -> None:
+		import cairocffi
+		self._surface = cairocffi.PDFSurface(output, 1, 1)
+		self._context = cairocffi.Context(self._surface)
+		self.dpi = dpi
+		self.unsafe = unsafe
+		self._pagecount = 0
+
+	def addPage(self, p_page):
+		"Page from SVGContent, SVG bytes or cairosvg parsed Tree (ex: Tree(url=...))"
+		from cairosvg.parser import Tree
+		assert not self._surface is None, "PDF already closed"
+		if isinstance(p_page, SVGContent):
+			p_page = p_page.toBytes(inc_declaration=True, pretty_print=False)
+		if not isinstance(p_page, Tree):
+			p_page = Tree(bytestring=p_page, unsafe=self.unsafe)
+		recorded = _recordingSurfaceClass()(p_page, None, self.dpi)
+		# page size set before any drawing on it
+		self._surface.set_size(recorded.width, recorded.height)
+		self._context.set_source_surface(recorded.cairo, 0, 0)
+		self._context.paint()
+		self._surface.show_page()
+		# release recorded drawing
+		self._context.set_source_rgb(0, 0, 0)
+		recorded.finish()
+		self._pagecount += 1
+		return self
+
+	def getPageCount(self) -> int:
+		return self._pagecount
+
+	def close(self) -> None:
+		if not self._surface is None:
+			self._surface.finish()
+			self._surface = None
+			self._context = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+def writeMultipagePDF(p_pages: Iterable, output=None, dpi: float = 96, workers: Optional[int] = None, chunksize: int = 1,
+		maxpending: Optional[int] = None, unsafe=False) -> Optional[bytes]:
+	"""One PDF from pages iterable, consumed one page at a time. Returns PDF bytes if output is None.
+		p_pages - SVGContent objects, SVG bytes or cairosvg Trees, or, if workers given, (callable, data) jobs building them
+			in worker processes (see Batch.BatchRenderer), pages are appended in order by this process
+		maxpending - with workers, max page chunks in flight (bounds memory, defaults to 2 * workers)"""
+	if output is None:
+		out = BytesIO()
+	else:
+		out = output
+	if workers is None:
+		pages = p_pages
+	else:
+		renderer = BatchRenderer(formats=("svg",), workers=workers, chunksize=chunksize, maxpending=maxpending,
+			seropts={ "inc_declaration": True, "pretty_print": False })
+		pages = (res["svg"] for _idx, res in renderer.run(p_pages))
+	with MultipagePDFWriter(out, dpi=dpi, unsafe=unsafe) as wr:
+		for page in pages:
+			wr.addPage(page)
+	if output is None:
+		return out.getvalue()
+	return None
@@ -0,0 +1,146 @@
+"""Id keyed diff and patch of SVG documents, for live updates of already sent documents.
+
+   Elements are keyed by id ("#Rec3"). Elements without id are keyed by their parent key plus tag and
+   ordinal among siblings with same tag, also without id ("#G2/tspan[0]", root is ""). Comments are ignored.
+
+   A patch is a list of JSON serializable ops (lists), to be applied in order:
+
+	["remove", key]
+	["reorder", parentkey, [childkey, ...]]  -- new order of parent children (kept ones)
+	["insert", parentkey, index, xmltext, tail]  -- index among parent element children, tail text (or None)
+	["attr", key, name, value]  -- value None removes attribute
+	["text", key, text]
+	["tail", key, text]
+
+   All keys refer to elements of the original document: ops can be resolved against it up front.
+"""
+
+from copy import deepcopy
+from typing import Dict, List, Union
+
+from lxml import etree
+
+from rpSVG.SVGLib import SVGContent
+
+def snapshot(p_content: SVGContent):
+	"Detached lxml copy of content tree, as it would be serialized"
+	p_content.onBeforeSerialize()
+	p_content.render()
+	return deepcopy(p_content.getEl())
+
+def _toRoot(p_doc):
+	if isinstance(p_doc, SVGContent):
+		return snapshot(p_doc)
+	return p_doc
+
+def indexTree(p_root) -> Dict[str, tuple]:
+	"key -> (element, parent key, children keys)"
+	ret = {}
+	stack = [(p_root, "", None)]
+	while len(stack) > 0:
+		el, key, parentkey = stack.pop()
+		childkeys = []
+		counts = {}
+		for chld in el:
+			if not isinstance(chld.tag, str):
+				continue
+			idval = chld.get('id')
+			if idval is None:
+				name = etree.QName(chld).localname
+				n = counts.get(name, 0)
+				counts[name] = n + 1
+				ckey = f"{key}/{name}[{n}]"
+			else:
+				ckey = f"#{idval}"
+			childkeys.append(ckey)
+			stack.append((chld, ckey, key))
+		ret[key] = (el, parentkey, childkeys)
+	return ret
+
+def diff(p_old: Union[SVGContent, etree._Element], p_new: Union[SVGContent, etree._Element]) -> List[list]:
+	"Patch turning old document (SVGContent or lxml root, as from 'snapshot') into new one"
+	old = indexTree(_toRoot(p_old))
+	new = indexTree(_toRoot(p_new))
+
+	kept = { "": True }
+	def isKept(p_key):
+		ret = kept.get(p_key)
+		if ret is None:
+			oentry = old[p_key]
+			nentry = new.get(p_key)
+			ret = not nentry is None and nentry[1] == oentry[1] and nentry[0].tag == oentry[0].tag and isKept(oentry[1])
+			kept[p_key] = ret
+		return ret
+
+	removes = []
+	for key, (_el, parentkey, _childkeys) in old.items():
+		if not parentkey is None and not isKept(key) and isKept(parentkey):
+			removes.append(["remove", key])
+
+	reorders = []
+	inserts = []
+	sets = []
+	for key, (el, parentkey, childkeys) in new.items():
+		if not key in old or not isKept(key):
+			continue
+		oldel, _opk, oldchildkeys = old[key]
+		oldorder = [k for k in oldchildkeys if k in old and isKept(k)]
+		neworder = [k for k in childkeys if k in old and isKept(k)]
+		if oldorder != neworder:
+			reorders.append(["reorder", key, neworder])
+		for idx, ckey in enumerate(childkeys):
+			if not ckey in old or not isKept(ckey):
+				newel = new[ckey][0]
+				inserts.append(["insert", key, idx, etree.tostring(newel, encoding='unicode', with_tail=False), newel.tail])
+		oldattrs = oldel.attrib
+		for name, val in el.attrib.items():
+			if oldattrs.get(name) != val:
+				sets.append(["attr", key, name, val])
+		for name in oldattrs.keys():
+			if not name in el.attrib:
+				sets.append(["attr", key, name, None])
+		if (oldel.text or "") != (el.text or ""):
+			sets.append(["text", key, el.text])
+		if not parentkey is None and (oldel.tail or "") != (el.tail or ""):
+			sets.append(["tail", key, el.tail])
+
+	return removes + reorders + inserts + sets
+
+def _elementChildren(p_el) -> list:
+	return [chld for chld in p_el if isinstance(chld.tag, str)]
+
+def applyPatch(p_root, p_patch: List[list]):
+	"Apply patch (as from 'diff') to lxml tree, in place. Returns root."
+	index = { key: entry[0] for key, entry in indexTree(p_root).items() }
+	for op in p_patch:
+		kind = op[0]
+		if kind == "remove":
+			el = index[op[1]]
+			el.getparent().remove(el)
+		elif kind == "reorder":
+			parent = index[op[1]]
+			for ckey in op[2]:
+				parent.append(index[ckey])
+		elif kind == "insert":
+			parent = index[op[1]]
+			newel = etree.fromstring(op[3], parser=etree.XMLParser(strip_cdata=False))
+			if len(op) > 4:
+				newel.tail = op[4]
+			chlds = _elementChildren(parent)
+			if op[2] < len(chlds):
+				parent.insert(parent.index(chlds[op[2]]), newel)
+			else:
+				parent.append(newel)
+		elif kind == "attr":
+			el = index[op[1]]
+			if op[3] is None:
+				el.attrib.pop(op[2], None)
+			else:
+				el.set(op[2], op[3])
+		elif kind == "text":
+			index[op[1]].text = op[2]
+		elif kind == "tail":
+			index[op[1]].tail = op[2]
+		else:
+			raise ValueError(f"unknown patch op: {kind}")
+	return p_root
@@ -2,18 +2,26 @@
 #import cairo
 #import rsvg
 
+from array import array
+from contextlib import ExitStack
+from copy import deepcopy
+from hashlib import blake2b
 from io import StringIO
+from re import compile as re_compile
 from ssl import ALERT_DESCRIPTION_ACCESS_DENIED
 from typing import Optional, List, Union
 from warnings import warn
 
 from lxml import etree
 
-from rpSVG.SVGStyleText import CSSSty, Sty
-from rpSVG.Basics import Ln, MINDELTA, Pt, Trans, XLINK_NAMESPACE, _withunits_struct, glRd, \
-	pClose, pH, pL, pM, pV, strictToNumber, toNumberAndUnit, transform_def, path_command, \
+from rpSVG.SVGStyleText import STYLE_ATTRIBS, CSSSty, Sty, minifiedCSS
+from rpSVG.Basics import Env, Ln, MINDELTA, Pt, RoundContext, Trans, XLINK_NAMESPACE, _withunits_struct, getRoundContext, glRd, roundingContext, \
+	PathCmdBuffer, _numToText, _numsToText, _numpy, coordArraysFromBuffer, coordsFromBuffer, strictToNumber, toNumbersAndUnits, toNumberAndUnit, transform_def, path_command, \
 	ptCoincidence, removeDecsep, ptEnsureStrings
+from rpSVG.Geometry import IDENTITY_MATRIX, polygonClipRect, polylineClipRect, polylineSimplify, vec2_affine_bounds, vec2_affine_mult
+from rpSVG.SpatialIndex import SpatialIndex, boundsContain, boundsIntersect, pathBounds, structBounds, toBounds
 from rpSVG.Structs import Cir, Elli, GraSt, Img, Li, LiGra, Mrk, MrkProps, Patt, Pl, Pth, RaGra, Re, ReRC, Symb, Tx, TxPth, TxRf, Us, VBox
+from rpSVG._export import exportSVGBytes, writeOutputs
 
 SVG_NAMESPACE = "http://www.w3.org/2000/svg"
 
@@ -26,6 +34,15 @@ SVG_ROOT = """<svg
 	 xmlns:xlink="{1}" />
 	 """.format(SVG_NAMESPACE, XLINK_NAMESPACE)
 
+# parsed once, copied for each new document
+_SVG_ROOT_EL = None
+
+def _newRootTree():
+	global _SVG_ROOT_EL
+	if _SVG_ROOT_EL is None:
+		_SVG_ROOT_EL = etree.parse(StringIO(SVG_ROOT)).getroot()
+	return etree.ElementTree(deepcopy(_SVG_ROOT_EL))
+
 DECLARATION_ROOT = """<?xml version="1.0" standalone="no"?>
 {0}""".format(SVG_ROOT)
 
@@ -49,6 +66,17 @@ class TagOutOfDirectUserManipulation(RuntimeError):
 	def __str__(self):
 		return f"Tag '{self.tag}' not to be manipulated by user."
 
+def _structHashValue(p_struct, p_field: str) -> str:
+	"Struct field value as hashed: numbers rounded as in output, other values as text"
+	try:
+		num, un = p_struct.getNumAndUnit(p_field)
+	except (TypeError, ValueError):
+		return p_struct.get(p_field)
+	ret = str(glRd(num))
+	if not un is None:
+		ret += un
+	return ret
+
 class BaseSVGElem(object):
 
 	NO_XML_EL = "XML Element not created yet. Must add this to SVGContainer to auto create it."
@@ -63,7 +91,12 @@ class BaseSVGElem(object):
 		self.el = None
 		self._pendingXMLDependentOps = []
 		self._yinvertdelta = None
+		self._unitsperpixel = None
+		self._spatialindex = None
+		self._parentelem = None
 		self._parentadded = False
+		self._structhash = None
+		self._roundctx = None
 		self.setStruct(struct)
 
 	def clone(self):
@@ -92,7 +125,9 @@ class BaseSVGElem(object):
 				meth, args, kwargs = op
 				if args is None:
 					if kwargs is None:
-						meth()
+						# struct attribs were just written above
+						if not meth == self._updateStructAttrs:
+							meth()
 					else:
 						meth(**kwargs)
 				else:
@@ -116,6 +151,7 @@ class BaseSVGElem(object):
 		assert isinstance(p_text, str)
 		assert self.hasEl(), self.NO_XML_EL
 		self.getEl().text = p_text
+		self._structChanged()
 
 	def setText(self, p_text: str):
 		self.dispatchXMLDependentOp(self._setText, args=(p_text,))
@@ -131,6 +167,7 @@ class BaseSVGElem(object):
 	def clearText(self):
 		if self.hasEl():
 			self.getEl().text = ""
+			self._structChanged()
 
 	def clearChildren(self):
 		for child in list(self.getEl()):
@@ -148,6 +185,7 @@ class BaseSVGElem(object):
 	def _setDirectAttr(self, p_attr: str, p_value):
 		assert self.hasEl(), self.NO_XML_EL
 		self.getEl().set(p_attr, p_value)
+		self._structChanged()
 		return self
 
 	def dispatchXMLDependentOp(self, method, args=None, kwargs=None):
@@ -163,6 +201,9 @@ class BaseSVGElem(object):
 				else:
 					method(*args, **kwargs)
 		else:
+			# argument-less ops just sync current state to XML, no need to queue them twice
+			if args is None and kwargs is None and (method, args, kwargs) in self._pendingXMLDependentOps:
+				return
 			self._pendingXMLDependentOps.append((method, args, kwargs))
 
 	def __repr__(self):
@@ -214,6 +255,8 @@ class BaseSVGElem(object):
 	def updateStructAttrs(self):
 		if not self._struct is None:
 			self.dispatchXMLDependentOp(self._updateStructAttrs)
+			self._spatialChanged()
+			self._structChanged()
 		return self
 
 	def setStruct(self, struct: _withunits_struct):
@@ -266,6 +309,7 @@ class BaseSVGElem(object):
 	def updateStyleAttrs(self):
 		if not self._style is None:
 			self.dispatchXMLDependentOp(self._updateStyleAttrs)
+			self._structChanged()
 		return self
 
 	def setStyle(self, style: Sty):
@@ -297,6 +341,8 @@ class BaseSVGElem(object):
 	def updateTransformAttr(self):
 		if len(self._transforms) > 0:
 			self.dispatchXMLDependentOp(self._updateTransformAttr)
+			self._spatialChanged()
+			self._structChanged()
 		return self
 
 	def getTransformN(self, p_n: int):
@@ -328,6 +374,14 @@ class BaseSVGElem(object):
 
 	def delEl(self):
 		self.getEl().getparent().remove(self.getEl())
+		self._spatialRemove()
+		self._structChanged()
+		self.el = None
+
+	def releaseEl(self):
+		"Drop reference to XML element, already detached from tree (ex: after being streamed out)"
+		if not self._spatialindex is None:
+			self._spatialindex.remove(self)
 		self.el = None
 
 	def _setId(self, idval):
@@ -342,17 +396,35 @@ class BaseSVGElem(object):
 
 	def getId(self):
 		assert self.hasEl(), self.NO_XML_EL
-		assert "id" in self.getEl().keys()
-		return self.getEl().get('id')
+		ret = self.getEl().get('id')
+		assert not ret is None
+		return ret
 
 	def hasId(self) -> bool:
 		assert self.hasEl(), self.NO_XML_EL
-		return "id" in self.getEl().keys()
+		return not self.getEl().get('id') is None
+
+	def _docRoundContext(self) -> Optional[RoundContext]:
+		"Rounding context set on owning document, if any"
+		elem = self
+		while not elem is None:
+			if not elem._roundctx is None:
+				return elem._roundctx
+			elem = elem._parentelem
+		return None
+
+	def getRoundContext(self) -> RoundContext:
+		"Rounding context of owning document or, if not set there, the ambient one (see Basics.roundingContext)"
+		ret = self._docRoundContext()
+		if ret is None:
+			ret = getRoundContext()
+		return ret
 
 	def _setClass(self, clsval):
 		assert isinstance(clsval, str)
 		assert self.hasEl(), self.NO_XML_EL
 		self.getEl().set('class', clsval)
+		self._structChanged()
 
 	def setClass(self, clsval):
 		self.dispatchXMLDependentOp(self._setClass, args=(clsval,))
@@ -360,18 +432,21 @@ class BaseSVGElem(object):
 
 	def getClass(self):
 		assert self.hasEl(), self.NO_XML_EL
-		assert "class" in self.getEl().keys()
-		return self.getEl().get('class')
+		ret = self.getEl().get('class')
+		assert not ret is None
+		return ret
 
 	def hasClass(self) -> bool:
 		assert self.hasEl(), self.NO_XML_EL
-		return "class" in self.getEl().keys()
+		return not self.getEl().get('class') is None
 
 	def getTag(self):
 		return self.tag
 
 	def clearTransforms(self):
 		del self._transforms[:]
+		self._spatialChanged()
+		self._structChanged()
 
 	def addTransform(self, tr: transform_def):
 		if not self._yinvertdelta is None and hasattr(tr, "yinvert"):
@@ -380,8 +455,115 @@ class BaseSVGElem(object):
 		trtxt = self._getTransform() 
 		if len(trtxt) > 0:
 			self.getEl().set('transform', trtxt)
+		self._spatialChanged()
+		self._structChanged()
 		return tr
 
+	def getTransformMatrix(self):
+		"Affine matrix (a, b, c, d, e, f) of this element transforms list"
+		ret = IDENTITY_MATRIX
+		for tr in self._transforms:
+			ret = vec2_affine_mult(ret, tr.getMatrix())
+		return ret
+
+	def getCTM(self):
+		"Affine matrix from this element user space to document user space"
+		ret = self.getTransformMatrix()
+		if not self._parentelem is None:
+			ret = vec2_affine_mult(self._parentelem.getCTM(), ret)
+		return ret
+
+	def _localBounds(self):
+		"Bounds in own user space, before own transforms"
+		if self._struct is None:
+			return None
+		return structBounds(self.getStruct())
+
+	def getBounds(self):
+		"Numeric bounds (minx, miny, maxx, maxy) in parent user space, None if not computable"
+		bounds = self._localBounds()
+		if bounds is None:
+			return None
+		return vec2_affine_bounds(self.getTransformMatrix(), bounds)
+
+	def getDocBounds(self):
+		"Numeric bounds (minx, miny, maxx, maxy) in document user space, None if not computable"
+		bounds = self._localBounds()
+		if bounds is None:
+			return None
+		return vec2_affine_bounds(self.getCTM(), bounds)
+
+	def getEnvelope(self) -> Optional[Env]:
+		"Envelope in document user space"
+		bounds = self.getDocBounds()
+		if bounds is None:
+			return None
+		return Env(*bounds)
+
+	def setSpatialIndex(self, p_index):
+		self._spatialindex = p_index
+		self._spatialChanged()
+		return self
+
+	def _spatialChanged(self):
+		if not self._spatialindex is None:
+			self._spatialindex.markDirty(self)
+
+	def _spatialRemove(self):
+		if not self._spatialindex is None:
+			self._spatialindex.remove(self)
+
+	def _structChanged(self):
+		"Invalidate cached structural hash of this element and its ancestors"
+		elem = self
+		# up to root: an ancestor may have been hashed while an intermediate one was not cached
+		while not elem is None:
+			elem._structhash = None
+			elem = elem._parentelem
+
+	def _feedStructuralHash(self, p_hash, transforms=True) -> None:
+		"To be extended, feed hashed contents to blake2b object"
+		parts = [self.tag]
+		if transforms:
+			parts.append(self._getTransform())
+		skip = set(('id', 'transform'))
+		if not self._struct is None:
+			strct = self.getStruct()
+			for fld in strct._fields:
+				skip.add(fld)
+				if strct.isSet(fld):
+					parts.append(f"{fld}={_structHashValue(strct, fld)}")
+		if not self._style is None:
+			skip.update(self._style.getStyleAttrs())
+			parts.append(repr(self._style.getKey()))
+		if self.hasEl():
+			el = self.getEl()
+			for k, v in sorted(el.items()):
+				if not k in skip:
+					parts.append(f"{k}={v}")
+			if el.text:
+				parts.append(f"text={el.text}")
+		p_hash.update('\x00'.join(parts).encode('utf-8'))
+
+	def getStructuralHash(self, transforms=True) -> bytes:
+		"""Digest of element structure: tag, struct values (numbers at output precision), style, transforms,
+		   other attributes except 'id', text and, for containers, children hashes.
+		   Cached, invalidated on changes made through this API (not on direct XML manipulation).
+			transforms - False: own transforms not hashed (not cached)"""
+		if not transforms:
+			h = blake2b(digest_size=16)
+			self._feedStructuralHash(h, transforms=False)
+			return h.digest()
+		ret = self._structhash
+		if ret is None:
+			h = blake2b(digest_size=16)
+			self._feedStructuralHash(h)
+			ret = self._structhash = h.digest()
+		return ret
+
+	def isStructurallyEqual(self, o: object) -> bool:
+		return self.getStructuralHash() == o.getStructuralHash()
+
 	def yinvert(self, p_height: Union[float, int]):
 		self._yinvertdelta = p_height
 		if self.hasStruct():
@@ -397,6 +579,23 @@ class BaseSVGElem(object):
 		# else:
 		#  	return self
 
+	def setUnitsPerPixel(self, p_upp: Optional[float]):
+		"""Size of one output pixel in user units, used to convert pixel tolerances (ex: simplification).
+		   If not set, value is taken from parent element (root content derives it from rect and viewbox)."""
+		self._unitsperpixel = p_upp
+		return self
+
+	def getUnitsPerPixel(self) -> float:
+		if not self._unitsperpixel is None:
+			return self._unitsperpixel
+		if not self._parentelem is None:
+			return self._parentelem.getUnitsPerPixel()
+		return 1
+
+	def onBeforeSerialize(self):
+		"To be extended, sync lazily built state to XML before serialization"
+		pass
+
 	def onAfterParentAdding(self, defselement=None):
 		"""To be extended, actions to run after being added to parent. 
 		   Extending classes must check self._parentadded state and return immediately if this is True"""
@@ -445,12 +644,20 @@ class GenericSVGElem(BaseSVGElem):
 
 		p_child.setEl(newel)
 		p_child._parenttag = _parent.tag
+		if isinstance(_parent, BaseSVGElem):
+			p_child._parentelem = _parent
+		else:
+			p_child._parentelem = self
 		self.content.append(p_child)
+		self._structChanged()
 
 		if not self._noyinvert:
 			if not self._yinvertdelta is None and hasattr(p_child, 'yinvert'):
 				p_child.yinvert(self._yinvertdelta)
 
+		if not self._spatialindex is None:
+			p_child.setSpatialIndex(self._spatialindex)
+
 		do_gen_id = False
 		if hasattr(self, 'genNextId'):
 			if getattr(p_child, '_FATTR_forceIdAutoGeneration', False):
@@ -462,9 +669,9 @@ class GenericSVGElem(BaseSVGElem):
 
 		gotid = False
 		if do_gen_id and not p_child.hasId():
-			idval = self.genNextId()
+			idval = self.genNextId(p_child.idprefix)
 			if not idval is None:
-				p_child.setId(p_child.idprefix + str(idval))
+				p_child.setId(idval)
 				gotid = True
 
 		for filter in DBG_FILTER_ADDCHILD:
@@ -474,6 +681,65 @@ class GenericSVGElem(BaseSVGElem):
 
 		return p_child
 
+	def replaceChild(self, p_old: BaseSVGElem, p_new: BaseSVGElem, keepold=False, noyinvert=False) -> BaseSVGElem:
+		"""Add p_new in place of child p_old.
+			keepold - p_old XML element is detached, not deleted, to be re-added elsewhere"""
+		idx = next(i for i, chld in enumerate(self.content) if chld is p_old)
+		ret = self.addChild(p_new, noyinvert=noyinvert)
+		oldel = p_old.getEl()
+		parentel = oldel.getparent()
+		parentel.insert(parentel.index(oldel), ret.getEl())
+		del self.content[-1]
+		self.content[idx] = ret
+		if keepold:
+			parentel.remove(oldel)
+			p_old._spatialRemove()
+			p_old.setSpatialIndex(None)
+			self._structChanged()
+		else:
+			p_old.delEl()
+		return ret
+
+	def adoptChild(self, p_child: BaseSVGElem) -> BaseSVGElem:
+		"Append (already built) element, detached from previous parent"
+		assert p_child.hasEl() and p_child.getEl().getparent() is None
+		self.getEl().append(p_child.getEl())
+		p_child._parenttag = self.tag
+		p_child._parentelem = self
+		self.content.append(p_child)
+		if not self._spatialindex is None:
+			p_child.setSpatialIndex(self._spatialindex)
+		self._structChanged()
+		return p_child
+
+	def releaseEl(self):
+		for chld in self.content:
+			chld.releaseEl()
+		del self.content[:]
+		super().releaseEl()
+
+	def onBeforeSerialize(self):
+		for chld in self.content:
+			chld.onBeforeSerialize()
+
+	def setSpatialIndex(self, p_index):
+		self._spatialindex = p_index
+		for chld in self.content:
+			chld.setSpatialIndex(p_index)
+		self._spatialChanged()
+		return self
+
+	def _spatialRemove(self):
+		for chld in self.content:
+			chld._spatialRemove()
+		super()._spatialRemove()
+
+	def _feedStructuralHash(self, p_hash, transforms=True) -> None:
+		super()._feedStructuralHash(p_hash, transforms=transforms)
+		for chld in self.content:
+			if chld.hasEl():
+				p_hash.update(chld.getStructuralHash())
+
 	def addChildTag(self, p_tag: str):
 		assert self.hasEl()
 		newel = etree.SubElement(self.getEl(), p_tag)
@@ -497,6 +763,8 @@ class GenericSVGElem(BaseSVGElem):
 
 class SVGContainer(GenericSVGElem):
 
+	_FATTR_spatialIndexable = False
+
 	def __init__(self, tag: str, struct: Optional[_withunits_struct] = None, viewbox: Optional[VBox] = None) -> None:
 		super().__init__(tag, struct=struct)
 		self._defs = None
@@ -533,14 +801,23 @@ class SVGContainer(GenericSVGElem):
 
 		ret._parenttag = self.tag
 
-		ret.onAfterParentAdding(defselement=self._defs)
+		self._childParentAdded(ret)
 
 		return ret
 
-	def genNextId(self):
+	def _childParentAdded(self, p_child: BaseSVGElem) -> None:
+		"Runs child onAfterParentAdding, under document rounding context if set"
+		ctx = self._docRoundContext()
+		if ctx is None:
+			p_child.onAfterParentAdding(defselement=self._defs)
+		else:
+			with roundingContext(ctx):
+				p_child.onAfterParentAdding(defselement=self._defs)
+
+	def genNextId(self, p_prefix: str):
 		ret = None
 		if not self.genIDMethod is None:
-			ret = self.genIDMethod()
+			ret = self.genIDMethod(p_prefix)
 		return ret
 
 	def _setViewbox(self, p_viewbox: VBox):
@@ -564,12 +841,24 @@ class SVGContainer(GenericSVGElem):
 		vb.getFromXmlAttrs(self.getEl())
 		return vb
 
+	def _localBounds(self):
+		ret = None
+		for chld in self.content:
+			bounds = chld.getBounds()
+			if bounds is None:
+				continue
+			if ret is None:
+				ret = bounds
+			else:
+				ret = (min(ret[0], bounds[0]), min(ret[1], bounds[1]), max(ret[2], bounds[2]), max(ret[3], bounds[3]))
+		return ret
+
 class SVGRoot(SVGContainer):
 
 	def __init__(self, rect: Re, tree = None, viewbox: Optional[VBox] = None) -> None:
 		super().__init__("svg", struct=rect, viewbox=viewbox)
 		if tree is None:
-			self.tree = etree.parse(StringIO(SVG_ROOT))
+			self.tree = _newRootTree()
 		elif hasattr(tree, 'getroot'):
 			self.tree = tree
 		else:
@@ -600,13 +889,18 @@ class SVGRoot(SVGContainer):
 class SVGContent(SVGRoot):
 
 	forbidden_user_tags = ["defs", "style"]
-	def __init__(self, rect: Re, viewbox: Optional[VBox] = None, yinvert=False) -> None:
+	def __init__(self, rect: Re, viewbox: Optional[VBox] = None, yinvert=False, rounding: Optional[RoundContext] = None) -> None:
+		"""rounding - document rounding context, if None ambient one is used (see Basics.roundingContext)"""
 		super().__init__(rect, viewbox=viewbox)
+		self._roundctx = rounding
 		self._id_serial = 0
+		self._idnamespace = ""
 		self._defs = super().addChild(Defs())
-		self._defs.setGenIdMethod(self.nextIDSerial)
+		self._defs.setGenIdMethod(self.nextId)
 		self._styleel = self._defs.addChild(Style())
 		self._yinvert = yinvert
+		self._streamwriter = None
+		self._stylededup = None
 
 	def _calcYInvertDelta(self):
 		vb = self.getViewbox()
@@ -618,13 +912,51 @@ class SVGContent(SVGRoot):
 			height = vbvals[3]
 		else:
 			strct = self.getStruct()
-			if hasattr(strct, 'height'):
-				height = strictToNumber(getattr(strct, 'height'))
-			if hasattr(strct, 'y'):
-				miny = strictToNumber(getattr(strct, 'y'))
+			if strct.isSet('height'):
+				height = strct.getNum('height')
+			if strct.isSet('y'):
+				miny = strct.getNum('y')
 		assert not miny is None and not height is None
 		return 2 * miny + height
 
+	def _calcUnitsPerPixel(self):
+		"User units per output pixel, from rect and viewbox (transforms are not accounted)"
+		vbvals = self.getViewbox().getValues()
+		if len(vbvals) < 4:
+			return 1
+		strct = self.getStruct()
+		ratios = []
+		for fld, vbval in (('width', vbvals[2]), ('height', vbvals[3])):
+			if strct.isSet(fld):
+				num, un = strct.getNumAndUnit(fld)
+				if un in (None, 'px') and num > 0:
+					ratios.append(vbval / num)
+		if len(ratios) == 0:
+			return 1
+		# aspect ratio preserved by default ('meet'), the larger ratio rules
+		return max(ratios)
+
+	def getUnitsPerPixel(self) -> float:
+		if not self._unitsperpixel is None:
+			return self._unitsperpixel
+		return self._calcUnitsPerPixel()
+
+	def enableSpatialIndex(self, cellsize: Optional[float] = None) -> SpatialIndex:
+		"""Start maintaining a spatial index over (non-defs) content, for queries, hit-testing and culling.
+			cellsize - grid cell size in user units, defaults to 1/64 of viewbox (or rect) larger dimension"""
+		if cellsize is None:
+			vbvals = self.getViewbox().getValues()
+			if len(vbvals) > 3:
+				dims = vbvals[2:4]
+			else:
+				dims = [n for n, _un in (self.getStruct().getNumAndUnit(f) for f in ('width', 'height'))]
+			cellsize = max(max(dims) / 64.0, MINDELTA)
+		self.setSpatialIndex(SpatialIndex(cellsize))
+		return self._spatialindex
+
+	def getSpatialIndex(self) -> Optional[SpatialIndex]:
+		return self._spatialindex
+
 	def getYInvertFlag(self):
 		return self._yinvert
 
@@ -636,6 +968,30 @@ class SVGContent(SVGRoot):
 		self._id_serial = self._id_serial + 1
 		return ret
 
+	def nextId(self, p_prefix: str) -> str:
+		"Generated id: namespace + prefix + serial"
+		return f"{self._idnamespace}{p_prefix}{self.nextIDSerial()}"
+
+	def setIdNamespace(self, p_namespace: str):
+		"Prefix of generated ids, keeps ids of separately built contents (ex: shards) from colliding"
+		self._idnamespace = p_namespace
+		return self
+
+	def getIdNamespace(self) -> str:
+		return self._idnamespace
+
+	def setRoundContext(self, p_ctx: Optional[RoundContext]):
+		self._roundctx = p_ctx
+		return self
+
+	def rounding(self):
+		"""Context manager making document rounding context the ambient one, for elements (and their
+		   structs and path commands) created inside 'with' block:
+
+			with sc.rounding():
+				sc.addChild(Rect(...))"""
+		return roundingContext(self._roundctx)
+
 	def addChild(self, p_child: BaseSVGElem, todefs: Optional[bool] = False, nsmap=None, noyinvert=False) -> BaseSVGElem:
 		gotid = False
 
@@ -646,10 +1002,13 @@ class SVGContent(SVGRoot):
 			assert not self._defs is None
 			ret = self._defs.addChild(p_child, nsmap=nsmap, noyinvert=noyinvert)
 		else:
+			# Streaming: previous top-level children are finished, write them out
+			if self.isStreaming():
+				self._streamwriter.flush()
 			ret = super().addChild(p_child, nsmap=nsmap, noyinvert=noyinvert)
 
 		if isinstance(ret, SVGContainer):
-			ret.setGenIdMethod(self.nextIDSerial)
+			ret.setGenIdMethod(self.nextId)
 
 		do_gen_id = False
 		if hasattr(self, 'genNextId'):
@@ -661,7 +1020,7 @@ class SVGContent(SVGRoot):
 					do_gen_id = True
 
 		if do_gen_id and not ret.hasId():
-			ret.setId(p_child.idprefix + str(self.nextIDSerial()))
+			ret.setId(self.nextId(p_child.idprefix))
 			gotid = True
 
 		ret._parenttag = self.tag
@@ -676,7 +1035,7 @@ class SVGContent(SVGRoot):
 				if filter["childtag"] == ret.tag:
 					print(f"SVGContent.addChild {self.tag} > {ret.tag}, gotid here:{gotid}, this has genNextId:{hasattr(self, 'genNextId')}")
 
-		ret.onAfterParentAdding(defselement=self._defs)
+		self._childParentAdded(ret)
 
 		return ret
 
@@ -686,6 +1045,107 @@ class SVGContent(SVGRoot):
 	def delStyleRule(self, selector: str) -> bool:
 		return self._styleel.delRule(selector)
 
+	def setStyleMinify(self, p_minify: bool = True):
+		self._styleel.setMinify(p_minify)
+		return self
+
+	def _instanceKey(self, p_elem, p_tags, p_refs: set, p_cssselectors: str):
+		"Instancing candidate key and translation (key, tx, ty), None if not a candidate"
+		if not p_elem.tag in p_tags:
+			return None
+		tx = ty = 0
+		for tr in p_elem.getTransformsList():
+			if not isinstance(tr, Trans):
+				return None
+			_a, _b, _c, _d, e, f = tr.getMatrix()
+			tx += e
+			ty += f
+		for el in p_elem.getEl().iter():
+			if not isinstance(el.tag, str):
+				continue
+			idval = el.get('id')
+			if not idval is None and (idval in p_refs or f"#{idval}" in p_cssselectors):
+				return None
+		return (p_elem.getStructuralHash(transforms=False), tx, ty)
+
+	def instanceRepeated(self, threshold: int = 2, tags=None) -> int:
+		"""Optimization pass: elements out of defs, structurally identical (see getStructuralHash) except
+		   for translate transforms and repeated at least 'threshold' times, are replaced by 'use' elements
+		   of a common Symbol, added to defs. Outermost repeated elements are instanced first.
+		   Id of replaced element is passed to its 'use'. Elements with ids referenced in document
+		   (hrefs, url(), CSS selectors) somewhere in their subtree are left unchanged. Nothing is done
+		   if style rules have descendant, child or sibling combinators or structural pseudo-classes.
+		   Returns number of replaced elements.
+			tags - candidate element tags, defaults to INSTANCEABLE_TAGS"""
+		assert threshold > 1
+		if tags is None:
+			tags = INSTANCEABLE_TAGS
+		assert not self.isStreaming()
+		if _hasPositionalSelectors(self._styleel.stylerules.keys()):
+			return 0
+		self.onBeforeSerialize()
+		rd = self.getRoundContext().rd
+		refs = set()
+		_collectIdRefs(self.getEl(), refs)
+		cssselectors = ' '.join(self._styleel.stylerules.keys())
+
+		cands = {}
+		counts = {}
+		def collect(p_parent):
+			for chld in p_parent.content:
+				if not chld.hasEl() or chld.tag in NONRENDERED_TAGS or not isinstance(chld, GenericSVGElem):
+					continue
+				entry = self._instanceKey(chld, tags, refs, cssselectors)
+				if not entry is None and not chld._localBounds() is None:
+					cands[chld] = entry
+					counts[entry[0]] = counts.get(entry[0], 0) + 1
+				collect(chld)
+		collect(self)
+
+		# outermost first, instances inside selected ones are not counted
+		selected = []
+		def select(p_parent):
+			for chld in p_parent.content:
+				entry = cands.get(chld)
+				if not entry is None and counts[entry[0]] >= threshold:
+					selected.append((p_parent, chld, entry))
+				elif isinstance(chld, GenericSVGElem):
+					select(chld)
+		select(self)
+		selcounts = {}
+		for _par, _chld, (key, _tx, _ty) in selected:
+			selcounts[key] = selcounts.get(key, 0) + 1
+
+		symbols = {}
+		ret = 0
+		for parent, chld, (key, tx, ty) in selected:
+			if selcounts[key] < threshold:
+				continue
+			sym = symbols.get(key)
+			first = sym is None
+			if first:
+				minx, miny, maxx, maxy = chld._localBounds()
+				# non null viewbox, scale 1:1 on every 'use'
+				sym = symbols[key] = (self.addChild(Symbol(), noyinvert=True), rd(minx), rd(miny), rd(max(maxx - minx, 1)), rd(max(maxy - miny, 1)))
+				sym[0].setViewbox(VBox(*sym[1:]))
+				sym[0].dispatchXMLDependentOp(sym[0]._setDirectAttr, args=("overflow", "visible"))
+			symel, minx, miny, w, h = sym
+			idval = chld.getEl().get('id')
+			use = Use(tx + minx, ty + miny, w, h, symel.getSel())
+			if not idval is None:
+				use.setId(idval)
+			use = parent.replaceChild(chld, use, keepold=first, noyinvert=True)
+			# parent may have y-inverted it
+			use.setStruct(Us(tx + minx, ty + miny, w, h, symel.getSel()))
+			if first:
+				chldel = chld.getEl()
+				chldel.attrib.pop('id', None)
+				chldel.attrib.pop('transform', None)
+				chld.clearTransforms()
+				symel.adoptChild(chld)
+			ret += 1
+		return ret
+
 	def setBackground(self, sty: Sty):
 		vb = self.getViewbox()
 		if vb.isEmpty():
@@ -696,27 +1156,453 @@ class SVGContent(SVGRoot):
 			vals = vb.getValues()
 		self.addChild(Rect(*vals)).setStyle(sty)
 
+	def setStyleDedup(self, threshold: Optional[int] = 2, classprefix: str = "sty"):
+		"""Opt-in: on serialization, identical inline style attribute sets repeated on at least
+		   'threshold' elements are replaced by a generated class (classprefix + serial) and its CSS rule.
+		   Document is left unchanged. None disables.
+
+		   Generated rules come first in stylesheet, so user class rules of same specificity still win.
+		   Presentation attributes lose to any CSS rule, class rules don't: user rules with type (ex: 'circle')
+		   or universal selectors will no longer override deduplicated styles."""
+		assert threshold is None or threshold > 0
+		if threshold is None:
+			self._stylededup = None
+		else:
+			self._stylededup = (threshold, classprefix)
+		return self
+
+	def _dedupStyles(self, p_root):
+		"Move repeated inline styles of elements under p_root (detached copy of document tree) to generated class rules, returns rules"
+		threshold, classprefix = self._stylededup
+		groups = {}
+		for el in p_root.iter():
+			if not isinstance(el.tag, str):
+				continue
+			sig = tuple(sorted((k, v) for k, v in el.attrib.items() if k in STYLE_ATTRIBS))
+			if len(sig) > 0:
+				groups.setdefault(sig, []).append(el)
+		rules = []
+		for sig, els in groups.items():
+			if len(els) < threshold:
+				continue
+			clsname = f"{classprefix}{len(rules)}"
+			rule = CSSSty(selector=f".{clsname}").addFromDict(dict(sig))
+			if not any(k == 'fill' for k, _v in sig):
+				# added by default on Sty creation
+				delattr(rule, 'fill')
+			rules.append(rule)
+			for el in els:
+				for k, _v in sig:
+					del el.attrib[k]
+				prevcls = el.get("class")
+				if prevcls is None:
+					el.set("class", clsname)
+				else:
+					el.set("class", f"{prevcls} {clsname}")
+		return rules
+
+	def _dedupedCopy(self):
+		"Detached copy of document tree, repeated inline styles moved to generated rules of its stylesheet (see setStyleDedup)"
+		ret = deepcopy(self.getEl())
+		rules = self._dedupStyles(ret)
+		if len(rules) == 0:
+			return ret
+		styleel = self._styleel.getEl()
+		# style element is out of tree while there are no own rules: added to copy of its defs
+		attached = not styleel.getparent() is None
+		target = styleel if attached else self._styleel._detachedfrom
+		for el, elcopy in zip(self.getEl().iter(), ret.iter()):
+			if el is target:
+				break
+		if attached:
+			outstyle = elcopy
+		else:
+			outstyle = deepcopy(styleel)
+			outstyle.tail = None
+			if outstyle.get("type") is None:
+				outstyle.set("type", "text/css")
+			elcopy.insert(0, outstyle)
+		outstyle.text = etree.CDATA(self._styleel.cssTextWith(rules, depth=-1))
+		return ret
+
 	def render(self):
 		return self._styleel.render(depth=-1)
 
 	def toBytes(self, inc_declaration=False, inc_doctype=False, pretty_print=True):
-		parelem = None
-		if not self.render():
-			parelem = self._styleel.removeEl()
-
+		with self.rounding():
+			self.onBeforeSerialize()
+		self.render()
+		if self._stylededup is None:
+			rootel = self.getEl()
+		else:
+			rootel = self._dedupedCopy()
 		if inc_doctype:
-			ret = etree.tostring(self.getEl(), doctype=DOCTYPE_STR, xml_declaration=inc_declaration, pretty_print=pretty_print, encoding='utf-8')
+			ret = etree.tostring(rootel, doctype=DOCTYPE_STR, xml_declaration=inc_declaration, pretty_print=pretty_print, encoding='utf-8')
 		else:
-			ret = etree.tostring(self.getEl(), xml_declaration=inc_declaration, pretty_print=pretty_print, encoding='utf-8')	
-
-		if not parelem is None:
-			self._styleel.readdElToParent(parelem)
+			ret = etree.tostring(rootel, xml_declaration=inc_declaration, pretty_print=pretty_print, encoding='utf-8')	
 
 		return ret
 
 	def toString(self, inc_declaration=False, inc_doctype=False, pretty_print=True):
 		return self.toBytes(inc_declaration=inc_declaration, inc_doctype=inc_doctype, pretty_print=pretty_print).decode('utf-8')
 
+	def export(self, formats=("svg", "png", "pdf"), pngscales=(), write_to: Optional[dict] = None, inc_declaration=True, inc_doctype=False, pretty_print=True, **convopts) -> dict:
+		"""Serialize once, render to several formats with cairosvg (see _export.exportSVGBytes).
+		   Returns output key -> bytes, keys are formats ('svg', 'png', 'pdf', 'ps') plus 'png@<scale>x' for each pngscales item.
+			write_to - output key -> file name or object, outputs are written in parallel
+			convopts - dpi, scale and other cairosvg surface arguments (ex: background_color)"""
+		svgbytes = self.toBytes(inc_declaration=inc_declaration, inc_doctype=inc_doctype, pretty_print=pretty_print)
+		ret = exportSVGBytes(svgbytes, formats=formats, pngscales=pngscales, **convopts)
+		if not write_to is None:
+			writeOutputs(ret, write_to)
+		return ret
+
+	def toBytesCulled(self, p_window: Union[Env, tuple], margin: float = 0, clip=False, inc_declaration=False, inc_doctype=False, pretty_print=True):
+		"""Serialize only window (Env or (minx, miny, maxx, maxy)) of this content, without changing it. See SVGCuller.
+			margin - in user units, added to window for culling and clipping"""
+		rootel = SVGCuller(self).cull(p_window, margin=margin, clip=clip)
+		if inc_doctype:
+			ret = etree.tostring(rootel, doctype=DOCTYPE_STR, xml_declaration=inc_declaration, pretty_print=pretty_print, encoding='utf-8')
+		else:
+			ret = etree.tostring(rootel, xml_declaration=inc_declaration, pretty_print=pretty_print, encoding='utf-8')	
+		return ret
+
+	def streamTo(self, p_output, inc_declaration=False, inc_doctype=False, pretty_print=True):
+		"""Switch to streaming mode, returns SVGStreamWriter to be used as context manager:
+
+			with sc.streamTo(fileobj):
+				sc.addChild(...)
+
+		   p_output - file name or any object with a 'write' method (file, socket.makefile('wb'), ...)"""
+		assert not self.isStreaming(), "already streaming"
+		self._streamwriter = SVGStreamWriter(self, p_output, inc_declaration=inc_declaration, inc_doctype=inc_doctype, pretty_print=pretty_print)
+		return self._streamwriter
+
+	def isStreaming(self) -> bool:
+		return not self._streamwriter is None
+
+class SVGStreamWriter(object):
+	"""Incremental serializer for SVGContent, based on lxml.etree.xmlfile.
+
+	   Root start tag is written when opened. Each top-level child is considered finished when next
+	   top-level child is added to SVGContent (or on flush / close), it is then written and both
+	   its XML element and wrapper object are dropped from the document. Memory stays bounded by the
+	   largest open top-level element (ex: Group).
+
+	   Defs and style rules are written as 'preamble' on first flush. Defs children and style rules added
+	   after that are written on later flushes, in new 'defs' elements. Defs are not dropped, as they
+	   can be referenced (ex: Symbol by Use) by elements still to be added.
+	"""
+
+	def __init__(self, p_content: SVGContent, p_output, inc_declaration=False, inc_doctype=False, pretty_print=True) -> None:
+		self._content = p_content
+		self._output = p_output
+		self._inc_declaration = inc_declaration
+		self._inc_doctype = inc_doctype
+		self._pretty_print = pretty_print
+		self._stack = None
+		self._xf = None
+		self._writtendefs = set()
+		self._writtenrules = {}
+
+	def isOpen(self) -> bool:
+		return not self._xf is None
+
+	def open(self):
+		assert not self.isOpen(), "stream writer already open"
+		rootel = self._content.getEl()
+		self._stack = ExitStack()
+		self._xf = self._stack.enter_context(etree.xmlfile(self._output, encoding='utf-8'))
+		if self._inc_declaration:
+			self._xf.write_declaration()
+		if self._inc_doctype:
+			self._xf.write_doctype(DOCTYPE_STR)
+		self._stack.enter_context(self._xf.element(rootel.tag, dict(rootel.attrib), nsmap=rootel.nsmap))
+		if self._pretty_print:
+			self._xf.write("\n")
+		return self
+
+	def _writeDefs(self):
+		stylerules = self._content._styleel.stylerules
+		defsel = self._content._defs.getEl()
+		styleel = self._content._styleel.getEl() if self._content._styleel.hasEl() else None
+
+		cssbuf = []
+		for selector, sty in stylerules.items():
+			csstxt = sty.toCSSString()
+			if self._writtenrules.get(selector) != csstxt:
+				cssbuf.append(csstxt)
+				self._writtenrules[selector] = csstxt
+
+		newdefs = [chld for chld in defsel if not chld is styleel and not chld in self._writtendefs]
+
+		if len(cssbuf) > 0 or len(newdefs) > 0:
+			outdefs = etree.Element("defs")
+			if len(cssbuf) > 0:
+				outstyle = etree.SubElement(outdefs, "style")
+				outstyle.set("type", "text/css")
+				outstyle.text = etree.CDATA('\n'.join(cssbuf))
+			for chld in newdefs:
+				outdefs.append(deepcopy(chld))
+				self._writtendefs.add(chld)
+			self._xf.write(outdefs, pretty_print=self._pretty_print)
+
+	def flush(self):
+		"Write and drop all finished top-level children"
+		assert self.isOpen(), "stream writer not open"
+		self._content.onBeforeSerialize()
+		self._writeDefs()
+		rootel = self._content.getEl()
+		defsel = self._content._defs.getEl()
+		for node in list(rootel):
+			if node is defsel:
+				continue
+			rootel.remove(node)
+			self._xf.write(node, pretty_print=self._pretty_print)
+		kept = []
+		for chld in self._content.content:
+			if chld.hasEl() and chld.getEl().getparent() is None:
+				chld.releaseEl()
+			else:
+				kept.append(chld)
+		self._content.content = kept
+		self._xf.flush()
+		return self
+
+	def _closeStack(self):
+		self._stack.close()
+		self._xf = None
+		self._stack = None
+		self._content._streamwriter = None
+
+	def close(self):
+		if self.isOpen():
+			try:
+				self.flush()
+			finally:
+				self._closeStack()
+
+	def __enter__(self):
+		return self.open()
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		if exc_type is None:
+			self.close()
+		elif self.isOpen():
+			self._closeStack()
+
+# referencing attribute values: url(#id) and '#id' hrefs
+IDREF_RE = re_compile(r"url\(\s*['\"]?#([^)'\"\s]+)")
+HREF_ATTRS = (f"{{{XLINK_NAMESPACE}}}href", "href")
+# not rendered by themselves, kept by culling wherever they are placed
+# repeated elements replaced by 'use', by SVGContent.instanceRepeated
+INSTANCEABLE_TAGS = frozenset(("g", "path", "polyline", "polygon", "rect", "circle", "ellipse", "line", "image", "text"))
+# selectors depending on element position in tree (combinators, structural pseudo-classes), no longer
+# matching instanced elements, moved to defs: attribute selectors contents are ignored
+CSS_ATTRSEL_RE = re_compile(r"\[[^\]]*\]")
+CSS_POSITIONAL_RE = re_compile(r"\S\s+[^\s>+~]|[>+~]|:(first|last|only|nth)-|:empty|:root")
+
+def _hasPositionalSelectors(p_selectors) -> bool:
+	for selector in p_selectors:
+		for sel in CSS_ATTRSEL_RE.sub("[]", selector).split(','):
+			if not CSS_POSITIONAL_RE.search(sel.strip()) is None:
+				return True
+	return False
+NONRENDERED_TAGS = frozenset(("defs", "symbol", "marker", "pattern", "linearGradient", "radialGradient", "clipPath", "mask", "filter", "style", "title", "desc"))
+
+def _copyEl(p_el, p_parent):
+	"Deep copy of element, appended to parent"
+	ret = deepcopy(p_el)
+	p_parent.append(ret)
+	return ret
+
+def _collectIdRefs(p_el, p_refs: set) -> None:
+	for el in p_el.iter():
+		for attr, val in el.attrib.items():
+			if attr in HREF_ATTRS:
+				if val.startswith('#'):
+					p_refs.add(val[1:])
+			elif 'url(' in val:
+				p_refs.update(IDREF_RE.findall(val))
+		if el.tag == f"{{{SVG_NAMESPACE}}}style" and not el.text is None:
+			p_refs.update(IDREF_RE.findall(el.text))
+
+class SVGCuller(object):
+	"""Serialization of windows of SVGContent, document is not changed.
+
+	   On creation, a 'plan' is computed: role and bounds of elements (see BaseSVGElem.getDocBounds, or spatial
+	   index if enabled). Many windows can then be culled using the same plan, as long as document is not changed.
+	   Plan can be transferred along with document bytes (see getPlanList, fromSerialized) to cull in other processes.
+
+	   Elements whose bounds are outside the window plus margin are omitted, containers left empty by culling too.
+	   Elements with unknown bounds are kept. Bounds are geometric: margin should account for stroke widths, 
+	   markers and text extents. Optionally, polylines and polygons crossing window limits are clipped and 
+	   simplified (only if free of markers and rotation or skew transforms). Defs children not referenced by
+	   the output are dropped. Output viewBox is the window (margin not included)."""
+
+	def __init__(self, p_content: Optional[SVGContent] = None) -> None:
+		self._root = None
+		self._plan = {}
+		if not p_content is None:
+			p_content.onBeforeSerialize()
+			p_content.render()
+			self._root = p_content.getEl()
+			self._index = p_content.getSpatialIndex()
+			self._plan[p_content._defs.getEl()] = ('defs',)
+			self._plan[p_content._styleel.getEl()] = ('style', len(p_content._styleel.stylerules) > 0)
+			self._planChildren(p_content)
+
+	@classmethod
+	def fromSerialized(cls, p_bytes: bytes, p_planlist: list):
+		"Culler over document bytes (as from SVGContent.toBytes) and plan list (as from getPlanList)"
+		ret = cls()
+		ret._root = etree.fromstring(p_bytes, parser=etree.XMLParser(strip_cdata=False))
+		ret._plan = { el: entry for el, entry in zip(ret._root.iter(), p_planlist) if not entry is None }
+		return ret
+
+	def getPlanList(self) -> list:
+		"Plan entries, in document order of elements"
+		return [self._plan.get(el) for el in self._root.iter()]
+
+	def serialize(self):
+		"Document bytes and plan list, to recreate this culler with 'fromSerialized' (ex: in another process)"
+		return etree.tostring(self._root, encoding='utf-8'), self.getPlanList()
+
+	def _planChildren(self, p_elem) -> None:
+		for chld in p_elem.content:
+			if not chld.hasEl() or chld.tag in NONRENDERED_TAGS:
+				continue
+			if isinstance(chld, SVGContainer) and len(chld.content) > 0:
+				self._plan[chld.getEl()] = ('container',)
+				self._planChildren(chld)
+			else:
+				bounds = None
+				if not self._index is None and chld._spatialindex is self._index:
+					bounds = self._index.getBounds(chld)
+				if bounds is None:
+					bounds = chld.getDocBounds()
+				ptsinfo = None
+				if isinstance(chld, _pointsElement) and not chld.hasMarkerProps():
+					a, b, c, d, e, f = chld.getCTM()
+					if b == 0 and c == 0 and a != 0 and d != 0:
+						ptsinfo = (isinstance(chld, Polygon), (a, d, e, f))
+				self._plan[chld.getEl()] = ('leaf', bounds, ptsinfo)
+
+	def _fixPoints(self, p_ptsinfo, p_outel, p_parent, p_clip, p_bounds, p_simplify, p_simplify_method) -> None:
+		"Clip and/or simplify polyline or polygon copy"
+		ispolygon, (a, d, e, f) = p_ptsinfo
+		win = self._window
+		clip = p_clip and not boundsContain(win, p_bounds)
+		if not clip and p_simplify is None:
+			return
+		nums = [num for num, _un in toNumbersAndUnits(p_outel.get('points'))]
+		parts = [(nums[0::2], nums[1::2])]
+		if clip:
+			# window in element user space
+			xs = sorted(((win[0] - e) / a, (win[2] - e) / a))
+			ys = sorted(((win[1] - f) / d, (win[3] - f) / d))
+			if ispolygon:
+				parts = [polygonClipRect(parts[0][0], parts[0][1], (xs[0], ys[0], xs[1], ys[1]))]
+			else:
+				parts = polylineClipRect(parts[0][0], parts[0][1], (xs[0], ys[0], xs[1], ys[1]))
+			parts = [part for part in parts if len(part[0]) > 0]
+		if not p_simplify is None:
+			tol = p_simplify / max(abs(a), abs(d))
+			simplified = []
+			for pxs, pys in parts:
+				idxs = polylineSimplify(pxs, pys, tol, method=p_simplify_method)
+				simplified.append(([pxs[i] for i in idxs], [pys[i] for i in idxs]))
+			parts = simplified
+		if len(parts) == 0:
+			p_parent.remove(p_outel)
+			return
+		idx = p_parent.index(p_outel)
+		for pi, (pxs, pys) in enumerate(parts):
+			if pi == 0:
+				outel = p_outel
+			else:
+				outel = deepcopy(p_outel)
+				if 'id' in outel.attrib:
+					del outel.attrib['id']
+				p_parent.insert(idx + pi, outel)
+			outel.set('points', " ".join(map("{0},{1}".format, map(_numToText, pxs), map(_numToText, pys))))
+
+	def _cullChildren(self, p_el, p_outparent, **kwargs) -> bool:
+		"Copies visible children, returns False if all children were culled"
+		culled = 0
+		for chldel in p_el:
+			entry = self._plan.get(chldel)
+			if entry is None:
+				_copyEl(chldel, p_outparent)
+			elif entry[0] == 'defs':
+				# filled later, when references are known
+				self._defsel = chldel
+				self._defsout = etree.SubElement(p_outparent, chldel.tag, dict(chldel.attrib))
+			elif entry[0] == 'container':
+				outel = etree.SubElement(p_outparent, chldel.tag, dict(chldel.attrib))
+				outel.text = chldel.text
+				if not self._cullChildren(chldel, outel, **kwargs):
+					p_outparent.remove(outel)
+					culled += 1
+			else:
+				_kind, bounds, ptsinfo = entry
+				if not bounds is None and not boundsIntersect(bounds, self._window):
+					culled += 1
+					continue
+				outel = _copyEl(chldel, p_outparent)
+				if not bounds is None and not ptsinfo is None:
+					self._fixPoints(ptsinfo, outel, p_outparent, kwargs["clip"], bounds, kwargs["simplify"], kwargs["simplify_method"])
+		return culled == 0 or len(p_outparent) > 0
+
+	def _fillDefs(self, p_outroot) -> None:
+		byid = {}
+		for chldel in self._defsel:
+			if isinstance(chldel.tag, str) and not chldel.get('id') is None:
+				byid[chldel.get('id')] = chldel
+		refs = set()
+		_collectIdRefs(p_outroot, refs)
+		kept = set()
+		pending = [ref for ref in refs if ref in byid]
+		while pending:
+			ref = pending.pop()
+			if ref in kept:
+				continue
+			kept.add(ref)
+			newrefs = set()
+			_collectIdRefs(byid[ref], newrefs)
+			pending.extend(r for r in newrefs if r in byid and not r in kept)
+		for chldel in self._defsel:
+			entry = self._plan.get(chldel)
+			if not entry is None and entry[0] == 'style':
+				if entry[1]:
+					_copyEl(chldel, self._defsout)
+			elif isinstance(chldel.tag, str) and chldel.get('id') in kept:
+				_copyEl(chldel, self._defsout)
+		if len(self._defsout) == 0:
+			p_outroot.remove(self._defsout)
+
+	def cull(self, p_window: Union[Env, tuple], margin: float = 0, clip=False, simplify: Optional[float] = None, simplify_method="dp", empty_as_none=False):
+		"""Returns lxml root element of culled document.
+			p_window - Env or (minx, miny, maxx, maxy)
+			margin - in user units, added to window for culling and clipping
+			simplify - optional simplification tolerance for polylines and polygons, in user units
+			empty_as_none - return None if no rendered element is left"""
+		viewbox = toBounds(p_window)
+		minx, miny, maxx, maxy = viewbox
+		self._window = (minx - margin, miny - margin, maxx + margin, maxy + margin)
+		rootel = self._root
+		outroot = etree.Element(rootel.tag, dict(rootel.attrib), nsmap=rootel.nsmap)
+		VBox(*[removeDecsep(v) for v in (minx, miny, maxx - minx, maxy - miny)]).setXmlAttrs(outroot)
+		self._defsout = None
+		self._cullChildren(rootel, outroot, clip=clip, simplify=simplify, simplify_method=simplify_method)
+		if not self._defsout is None:
+			if empty_as_none and len(outroot) == 1:
+				return None
+			self._fillDefs(outroot)
+		elif empty_as_none and len(outroot) == 0:
+			return None
+		return outroot
+
 class Group(SVGContainer):
 	def __init__(self) -> None:
 		super().__init__('g')
@@ -724,6 +1610,12 @@ class Group(SVGContainer):
 class Defs(SVGContainer):
 	def __init__(self) -> None:
 		super().__init__('defs')
+	def _localBounds(self):
+		# not rendered
+		return None
+	def setSpatialIndex(self, p_index):
+		# not rendered, content not indexed
+		return self
 
 class Marker(SVGContainer):
 	def __init__(self, *args) -> None:
@@ -739,10 +1631,11 @@ class Symbol(SVGContainer):
 
 	def getUseTuple(self, use_x, use_y):
 		x, y , w, h = self.use_dims
+		rd = self.getRoundContext().rd
 		if self._yinverting:
-			ret = (glRd(x+use_x), glRd(use_y-y), glRd(w), glRd(h))
+			ret = (rd(x+use_x), rd(use_y-y), rd(w), rd(h))
 		else:
-			ret = (glRd(x+use_x), glRd(y+use_y), glRd(w), glRd(h))
+			ret = (rd(x+use_x), rd(y+use_y), rd(w), rd(h))
 		return ret
 
 class Use(BaseSVGElem):
@@ -761,23 +1654,32 @@ class Title(BaseSVGElem):
 		self.dispatchXMLDependentOp(self.setText, args=(p_titletext,))
 
 class Style(BaseSVGElem):
+	"""Document stylesheet. CSS text is cached, rebuilt only after rules are added, deleted or changed.
+	   XML element is kept out of the tree while there are no rules to render."""
 
 	def __init__(self) -> None:
 		self._FATTR_forceToDefs = True
 		self._FATTR_doIdAutoGeneration = False
 		super().__init__('style')
 		self.stylerules = {}
+		self._minify = False
+		self._dirty = True
+		self._renderedkeys = None
+		self._csstext = None
+		self._detachedfrom = None
 
 	def addRule(self, p_child: CSSSty) -> str:
 		assert isinstance(p_child, CSSSty)
 		ret = p_child.getSelector()
 		self.stylerules[ret] =p_child
+		self._dirty = True
 		return ret
 
 	def delRule(self, selector: str) -> bool:
 		ret = False
 		if selector in self.stylerules.keys():
 			del self.stylerules[selector]
+			self._dirty = True
 			ret = True
 		return ret
 
@@ -787,17 +1689,60 @@ class Style(BaseSVGElem):
 			ret = self.stylerules[selector]
 		return ret
 
+	def setMinify(self, p_minify: bool = True):
+		"Compact CSS output, selectors of rules with identical declarations are merged"
+		if p_minify != self._minify:
+			self._minify = p_minify
+			self._dirty = True
+		return self
+
+	def getMinify(self) -> bool:
+		return self._minify
+
+	def _rulesCSSText(self, p_rules: List[CSSSty], depth=-1) -> str:
+		if self._minify:
+			return minifiedCSS(p_rules)
+		outbuf = []
+		for sty in p_rules:
+			sty.toCSSRule(outbuf, depth=depth)
+		return '\n'.join(outbuf)
+
+	def cssTextWith(self, p_prerules: List[CSSSty], depth=-1) -> str:
+		"CSS of extra rules followed by own rules, neither cached nor written to element"
+		return self._rulesCSSText(p_prerules + list(self.stylerules.values()), depth=depth)
+
+	def getCSSText(self, depth=-1) -> str:
+		"Rendered CSS of own rules, cached"
+		rules = list(self.stylerules.values())
+		# rules changed in place are detected by their content keys
+		keys = (depth, tuple(sty.getKey() for sty in rules))
+		if self._dirty or keys != self._renderedkeys:
+			self._csstext = self._rulesCSSText(rules, depth=depth)
+			self._renderedkeys = keys
+			self._dirty = False
+			if self.hasEl():
+				self.getEl().text = etree.CDATA(self._csstext)
+		return self._csstext
+
+	def _setAttached(self, p_attached: bool) -> None:
+		if p_attached:
+			if not self._detachedfrom is None:
+				self._detachedfrom.insert(0, self.getEl())
+				self._detachedfrom = None
+		elif self._detachedfrom is None:
+			self._detachedfrom = self.removeEl()
+
 	def render(self, depth=-1) -> bool:
 		ret = False
 		if len(self.stylerules) > 0:
-			outbuf = []
 			assert self.hasEl()
-			self.getEl().set("type", "text/css")
-			for _selector, sty in self.stylerules.items():
-				sty.toCSSRule(outbuf, depth=depth)
-			out = '\n'.join(outbuf)
-			self.getEl().text = etree.CDATA(out)
+			if self.getEl().get("type") is None:
+				self.getEl().set("type", "text/css")
+			self._setAttached(True)
+			self.getCSSText(depth=depth)
 			ret = True 
+		else:
+			self._setAttached(False)
 		return ret
 
 class Rect(GenericSVGElem):
@@ -810,10 +1755,10 @@ class Rect(GenericSVGElem):
 
 	def getContour(self, forceanchor=None):
 		"ccw from lower right"
-		x, _u = toNumberAndUnit(self._re.get("x"))
-		y, _u = toNumberAndUnit(self._re.get("y"))
-		w, _u = toNumberAndUnit(self._re.get("width"))
-		h, _u = toNumberAndUnit(self._re.get("height"))
+		x, _u = self._re.getNumAndUnit("x")
+		y, _u = self._re.getNumAndUnit("y")
+		w, _u = self._re.getNumAndUnit("width")
+		h, _u = self._re.getNumAndUnit("height")
 		hw = w/2
 		hh = h/2
 
@@ -886,8 +1831,8 @@ class RectRC(GenericSVGElem):
 		strct = self.getStruct()
 		x = p_anchorpt.x
 		y = p_anchorpt.y
-		w, _u = toNumberAndUnit(strct.get("width"))
-		h, _u = toNumberAndUnit(strct.get("height"))
+		w, _u = strct.getNumAndUnit("width")
+		h, _u = strct.getNumAndUnit("height")
 		hw = w/2
 		hh = h/2
 
@@ -981,6 +1926,10 @@ class MarkeableSVGElem(GenericSVGElem):
 	def getMrkProps(self) -> Union[None, MrkProps]:
 		return self._markerprops
 
+	def _simplifyIdxs(self, p_xs: List[float], p_ys: List[float], p_simplify: float, method="dp", keep=None) -> List[int]:
+		"Indexes of vertices kept after simplification (lists or numpy arrays), tolerance p_simplify given in output pixels"
+		return polylineSimplify(p_xs, p_ys, p_simplify * self.getUnitsPerPixel(), method=method, keep=keep)
+
 class Line(MarkeableSVGElem):
 	def __init__(self, *args, marker_props: Optional[MrkProps] = None) -> None:
 		super().__init__("line", struct=Li(*args), marker_props=marker_props)
@@ -989,63 +1938,161 @@ class Path(MarkeableSVGElem):
 	def __init__(self, *args, marker_props: Optional[MrkProps] = None) -> None:
 		super().__init__("path", struct=Pth(*args), marker_props=marker_props)
 
+def _polylineCmdsArr(p_xs, p_ys, p_places: Optional[int]):
+	"""Vectorized (numpy) 'addPolylineArray' encoding, returns (letters, values array).
+	   Same command choice as the point by point loop."""
+	np = _numpy()
+	l = len(p_xs)
+	closing = l > 1 and p_xs[-1] == p_xs[0] and p_ys[-1] == p_ys[0]
+	if closing:
+		p_xs = p_xs[:-1]
+		p_ys = p_ys[:-1]
+	# points equal to previous one are skipped
+	keep = np.ones(len(p_xs), dtype=bool)
+	keep[1:] = (np.diff(p_xs) != 0) | (np.diff(p_ys) != 0)
+	kxs = p_xs[keep]
+	kys = p_ys[keep]
+	xs = kxs[1:]
+	ys = kys[1:]
+	dxs = np.diff(kxs)
+	dys = np.diff(kys)
+	isv = dxs == 0
+	ish = ~isv & (dys == 0)
+	isl = ~isv & ~ish & (np.abs(dxs) < np.abs(xs)) & (np.abs(dys) < np.abs(ys))
+	codes = np.full(len(dxs), ord('L'), dtype=np.uint8)
+	codes[isv] = ord('v')
+	codes[ish] = ord('h')
+	codes[isl] = ord('l')
+	pairs = np.stack((np.where(isv, dys, np.where(isv | ish | isl, dxs, xs)), np.where(isl, dys, ys)), axis=1)
+	used = np.stack((np.ones(len(dxs), dtype=bool), ~(isv | ish)), axis=1)
+	vals = np.concatenate((kxs[:1], kys[:1], pairs[used]))
+	if not p_places is None:
+		vals = np.round(vals, p_places)
+	letters = 'M' + codes.tobytes().decode('ascii')
+	if closing:
+		letters += 'z'
+	return letters, array('d', vals.tobytes())
+
+def _nearPointsKeepArr(p_xs, p_ys, p_mindelta: float):
+	"""Mask of points kept, dropping those closer than mindelta to last kept one, as 'addPArray' loop.
+	   Vectorized where previous point is kept, point by point only after dropped ones."""
+	np = _numpy()
+	n = len(p_xs)
+	close = np.zeros(n, dtype=bool)
+	close[1:] = (np.abs(np.diff(p_xs)) < p_mindelta) & (np.abs(np.diff(p_ys)) < p_mindelta)
+	keep = ~close
+	cands = np.flatnonzero(close).tolist()
+	if len(cands) == 0:
+		return keep
+	xs = p_xs.tolist()
+	ys = p_ys.tolist()
+	ci = 0
+	i = cands[0]
+	last = i - 1
+	while i < n:
+		if last == i - 1 and not close[i]:
+			# previous point kept: following points up to next close one are kept
+			while ci < len(cands) and cands[ci] <= i:
+				ci += 1
+			if ci == len(cands):
+				break
+			i = cands[ci]
+			last = i - 1
+			continue
+		kept = abs(xs[i] - xs[last]) >= p_mindelta or abs(ys[i] - ys[last]) >= p_mindelta
+		keep[i] = kept
+		if kept:
+			last = i
+		i += 1
+	return keep
+
 class AnalyticalPath(Path):
+	"""Path built from path commands, kept in a compact PathCmdBuffer.
+	   'd' attribute is rebuilt lazily: on 'refresh', on struct read or before serialization."""
 
 	def __init__(self, marker_props: Optional[MrkProps] = None) -> None:
 		super().__init__("", marker_props=marker_props)
-		self.cmds = []
+		self.cmdbuf = PathCmdBuffer()
+		self._dirty = False
+
+	def _setDirty(self):
+		self._dirty = True
+		self._spatialChanged()
+		self._structChanged()
+
+	def _localBounds(self):
+		return pathBounds(self.cmdbuf)
 
 	def refresh(self):
-		prevcmd = None
-		buf = []
-		for cmd in self.cmds:
-			do_omit = False
-			lett = cmd.getLetter()
-			if prevcmd is None:
-				assert lett.lower() == 'm', cmd.getLetter()	
-				cmd.setRelative(False)			
-			else:
-				prevlett = prevcmd.getLetter()
-				if lett.lower() == 'l':
-					if prevlett.lower() in ('m', 'l') and prevcmd.isRelative() == cmd.isRelative():
-						do_omit = True
-				elif lett.lower() != 'm':
-					if lett == prevlett:
-						do_omit = True
-			buf.append(cmd.get(omitletter=do_omit))
-			prevcmd = cmd
-		if len(buf) > 0:
-			self.getStruct().setall("".join(buf))
+		if self._dirty:
+			self._dirty = False
+			self._struct.setall(self.cmdbuf.toD())
 			self.updateStructAttrs()
+		return self
+
+	def getStruct(self):
+		self.refresh()
+		return super().getStruct()
+
+	def onBeforeSerialize(self):
+		self.refresh()
+
+	def _appendCmd(self, p_cmd: path_command, p_idx: Optional[int] = None):
+		lett = p_cmd.getLetter()
+		args = [p_cmd.getNum(f) for f in p_cmd._fields]
+		ctx = self._docRoundContext()
+		if not ctx is None:
+			# command may have been created under other rounding context
+			rd = ctx.rd
+			args = [rd(a) for a in args]
+		if p_idx is None:
+			self.cmdbuf.append(lett, args)
+		else:
+			self.cmdbuf.insert(p_idx, lett, args)
+		self._setDirty()
+
+	def getCmd(self, p_idx: int) -> path_command:
+		return self.cmdbuf.getCmd(p_idx)
+
+	def cmdCount(self) -> int:
+		return len(self.cmdbuf)
 
 	def addCmd(self, p_cmd: path_command, tostart=False, refresh=False):
 		if hasattr(p_cmd, 'yinvert'):
 			if not self._noyinvert and not self._yinvertdelta is None:
 				p_cmd.yinvert(self._yinvertdelta)
 		if tostart:
-			self.cmds.insert(0,p_cmd)
+			self._appendCmd(p_cmd, p_idx=0)
 		else:
-			self.cmds.append(p_cmd)
-		if isinstance(p_cmd, pClose) or refresh:
+			self._appendCmd(p_cmd)
+		if refresh:
 			self.refresh()
 		return self
 
 	def delCmd(self, p_idx: int):
-		del self.cmds[p_idx]
-		self.refresh()
+		self.cmdbuf.delete(p_idx)
+		self._setDirty()
 
 	def clear(self, refresh=True):
-		del self.cmds[:]
+		self.cmdbuf.clear()
+		self._setDirty()
 		if refresh:
 			self.refresh()
 
 	def insCmd(self, p_idx: int, p_cmd: path_command):
-		self.cmds.insert(p_idx, p_cmd)
-		self.refresh()
-
-	def addPolylinePList(self, p_list: List[Pt]):
+		self._appendCmd(p_cmd, p_idx=p_idx)
+
+	def addPolylinePList(self, p_list: List[Pt], simplify: Optional[float] = None, simplify_method="dp", keep=None):
+		"""simplify - optional simplification tolerance, in output pixels
+		   simplify_method - 'dp' (Douglas-Peucker) or 'vw' (Visvalingam-Whyatt)
+		   keep - indexes of points never removed by simplification (see Geometry.sharedVertices)"""
+		if not simplify is None:
+			idxs = self._simplifyIdxs(*coordsFromBuffer(p_list), simplify, method=simplify_method, keep=keep)
+			p_list = [p_list[i] for i in idxs]
 		l = len(p_list)
 		new_list = []
+		buf = self.cmdbuf
+		rd = self.getRoundContext().rd
 		for pi, pt in enumerate(p_list):
 			wkpt = [strictToNumber(pt.x), strictToNumber(pt.y)]
 			if not self._noyinvert and not self._yinvertdelta is None:
@@ -1053,14 +2100,14 @@ class AnalyticalPath(Path):
 			new_list.append(wkpt)
 			cmd_added = False
 			if pi == 0: # first point
-				self.cmds.append(pM(*wkpt))
+				buf.append('M', [rd(wkpt[0]), rd(wkpt[1])])
 				cmd_added = True
 			elif pi == l-1: # last point
 				frstpt = new_list[0]
 				diffX = frstpt[0] - wkpt[0]
 				diffY = frstpt[1] - wkpt[1]
 				if diffX == 0 and diffY == 0:
-					self.cmds.append(pClose())
+					buf.append('z', ())
 					cmd_added = True
 			if not cmd_added:
 				prevpt = new_list[pi -1]
@@ -1070,15 +2117,85 @@ class AnalyticalPath(Path):
 					# skip this point
 					continue
 				if diffX == 0:
-					self.cmds.append(pV(removeDecsep(diffY), relative=True))
+					buf.append('v', [rd(diffY)])
 				elif diffY == 0:
-					self.cmds.append(pH(removeDecsep(diffX), relative=True))
+					buf.append('h', [rd(diffX)])
 				else:
 					if abs(diffX) < abs(wkpt[0]) and abs(diffY) < abs(wkpt[1]):
-						self.cmds.append(pL(removeDecsep(diffX), removeDecsep(diffY), relative=True))
+						buf.append('l', [rd(diffX), rd(diffY)])
 					else:
-						self.cmds.append(pL(*wkpt))
-		self.refresh()
+						buf.append('L', [rd(wkpt[0]), rd(wkpt[1])])
+		self._setDirty()
+
+	def addPolylineArray(self, p_arr, simplify: Optional[float] = None, simplify_method="dp", keep=None):
+		"""Same as addPolylinePList, points taken from (N,2) array of floats or any buffer-protocol
+		   object holding x,y pairs (see 'coordsFromBuffer'). Vectorized if numpy is available."""
+		arrs = coordArraysFromBuffer(p_arr)
+		if arrs is None:
+			xs, ys = coordsFromBuffer(p_arr)
+		else:
+			xs, ys = arrs
+		if not simplify is None:
+			# arrays simplified vectorized
+			idxs = self._simplifyIdxs(xs, ys, simplify, method=simplify_method, keep=keep)
+			if arrs is None:
+				xs = [xs[i] for i in idxs]
+				ys = [ys[i] for i in idxs]
+			else:
+				xs = xs[idxs]
+				ys = ys[idxs]
+		l = len(xs)
+		if l == 0:
+			return
+		if not self._noyinvert and not self._yinvertdelta is None:
+			yd = self._yinvertdelta
+			if arrs is None:
+				ys = [yd - y for y in ys]
+			else:
+				ys = yd - ys
+		places = self.getRoundContext().places
+		if not arrs is None:
+			self.cmdbuf.extend(*_polylineCmdsArr(xs, ys, places))
+			self._setDirty()
+			return
+		letters = ['M']
+		vals = [xs[0], ys[0]]
+		lapp = letters.append
+		vapp = vals.append
+		x0 = px = xs[0]
+		y0 = py = ys[0]
+		last = l - 1
+		for pi in range(1, l):
+			x = xs[pi]
+			y = ys[pi]
+			if pi == last and x == x0 and y == y0:
+				lapp('z')
+				break
+			diffX = x - px
+			diffY = y - py
+			if diffX == 0:
+				if diffY == 0:
+					# skip this point
+					continue
+				lapp('v')
+				vapp(diffY)
+			elif diffY == 0:
+				lapp('h')
+				vapp(diffX)
+			elif abs(diffX) < abs(x) and abs(diffY) < abs(y):
+				lapp('l')
+				vapp(diffX)
+				vapp(diffY)
+			else:
+				lapp('L')
+				vapp(x)
+				vapp(y)
+			px = x
+			py = y
+		if not places is None:
+			vals = [round(v, places) for v in vals]
+		self.cmdbuf.extend(''.join(letters), vals)
+		self._setDirty()
 
 	def yinvert(self, p_height: Union[float, int]):
 		if not self._noyinvert:
@@ -1097,7 +2214,13 @@ class _pointsElement(MarkeableSVGElem):
 		self.omitclosingpoint = False
 	def hasPoints(self):
 		return self.getStruct().hasPoints()
-	def addPList(self, p_list: List[Pt], mindelta=MINDELTA):
+	def addPList(self, p_list: List[Pt], mindelta=MINDELTA, simplify: Optional[float] = None, simplify_method="dp", keep=None):
+		"""simplify - optional simplification tolerance, in output pixels
+		   simplify_method - 'dp' (Douglas-Peucker) or 'vw' (Visvalingam-Whyatt)
+		   keep - indexes of points never removed by simplification (see Geometry.sharedVertices)"""
+		if not simplify is None:
+			idxs = self._simplifyIdxs(*coordsFromBuffer(p_list), simplify, method=simplify_method, keep=keep)
+			p_list = [p_list[i] for i in idxs]
 		l = len(p_list)
 		buf = []
 		for pi, pt in enumerate(p_list):
@@ -1113,6 +2236,53 @@ class _pointsElement(MarkeableSVGElem):
 		self.getStruct().setall(" ".join(buf))
 		self.updateStructAttrs()
 		return self
+	def addPArray(self, p_arr, mindelta=MINDELTA, simplify: Optional[float] = None, simplify_method="dp", keep=None):
+		"""Same as addPList, points taken from (N,2) array of floats or any buffer-protocol
+		   object holding x,y pairs (see 'coordsFromBuffer'). 
+		   Consecutive points closer than mindelta are also removed. Vectorized if numpy is available."""
+		arrs = coordArraysFromBuffer(p_arr)
+		if arrs is None:
+			xs, ys = coordsFromBuffer(p_arr)
+		else:
+			xs, ys = arrs
+		if not simplify is None:
+			# arrays simplified vectorized
+			idxs = self._simplifyIdxs(xs, ys, simplify, method=simplify_method, keep=keep)
+			if arrs is None:
+				xs = [xs[i] for i in idxs]
+				ys = [ys[i] for i in idxs]
+			else:
+				xs = xs[idxs]
+				ys = ys[idxs]
+		l = len(xs)
+		if l == 0:
+			return self
+		if self.initialpoint is None:
+			self.initialpoint = Pt(float(xs[0]), float(ys[0]))
+		if l > 1 and self.omitclosingpoint and ptCoincidence(Pt(xs[-1], ys[-1]), self.initialpoint, mindelta=mindelta):
+			xs = xs[:-1]
+			ys = ys[:-1]
+		if arrs is None:
+			kxs = xs[:1]
+			kys = ys[:1]
+			for x, y in zip(xs, ys):
+				if abs(x - kxs[-1]) < mindelta and abs(y - kys[-1]) < mindelta:
+					continue
+				kxs.append(x)
+				kys.append(y)
+		else:
+			kept = _nearPointsKeepArr(xs, ys, mindelta)
+			kxs = xs[kept]
+			kys = ys[kept]
+		if not self._noyinvert and not self._yinvertdelta is None:
+			yd = self._yinvertdelta
+			if arrs is None:
+				kys = [yd - y for y in kys]
+			else:
+				kys = yd - kys
+		self.getStruct().setall(" ".join(map("{0},{1}".format, _numsToText(kxs), _numsToText(kys))))
+		self.updateStructAttrs()
+		return self
 	def yinvert(self, p_height: Union[float, int]):
 		if not self._noyinvert:
 			self._yinvertdelta = p_height
@@ -1130,14 +2300,17 @@ class Polygon(_pointsElement):
 		self.omitclosingpoint = True
 
 class GradientStop(BaseSVGElem):
+	_FATTR_spatialIndexable = False
 	def __init__(self, *args) -> None:
 		super().__init__("stop", struct=GraSt(*args))
 
 class LinearGradient(GenericSVGElem):
+	_FATTR_spatialIndexable = False
 	def __init__(self, *args) -> None:
 		super().__init__("linearGradient", struct=LiGra(*args))
 
 class RadialGradient(GenericSVGElem):
+	_FATTR_spatialIndexable = False
 	def __init__(self, *args) -> None:
 		super().__init__("radialGradient", struct=RaGra(*args))
 
@@ -1146,14 +2319,17 @@ class Text(GenericSVGElem):
 		super().__init__("text", struct=Tx(*args))
 
 class TSpan(GenericSVGElem):
+	_FATTR_spatialIndexable = False
 	def __init__(self, *args) -> None:
 		super().__init__("tspan", struct=Tx(*args))
 
 class TRef(GenericSVGElem):
+	_FATTR_spatialIndexable = False
 	def __init__(self, p_text: str) -> None:
 		super().__init__("tref", struct=TxRf(p_text))
 
 class TextPath(GenericSVGElem):
+	_FATTR_spatialIndexable = False
 	def __init__(self, *args) -> None:
 		super().__init__("textPath", struct=TxPth(*args))
 
@@ -1167,9 +2343,10 @@ class Pattern(GenericSVGElem):
 
 class TextParagraph(Group):
 
-	def __init__(self, x, y, textrows: Optional[Union[str, List[str]]] = None, vsep="1.2em", justify="left"):
+	def __init__(self, x, y, textrows: Optional[Union[str, List[str]]] = None, vsep="1.2em", justify="left", fontsize=None):
 		"""anchor - anchor point of box encolsing all text lines:
-					 'lt' left-top - upper left corner"""
+					 'lt' left-top - upper left corner
+			fontsize - if given, set in text style"""
 		super().__init__()
 		if isinstance(textrows, List):
 			self._textrows = textrows
@@ -1179,6 +2356,7 @@ class TextParagraph(Group):
 			self._textrows = []
 		self._vsep = vsep
 		self._justify = justify
+		self._fontsize = fontsize
 		self._txtanchorpt = (glRd(x), glRd(y))
 		self.tx = None
 
@@ -1204,6 +2382,22 @@ class TextParagraph(Group):
 			self._textrows = textrows.split('\n')
 		self._build()
 
+	def setFontSize(self, p_fontsize):
+		self._fontsize = p_fontsize
+		if not self.tx is None:
+			self._setTextStyle()
+		return self
+
+	def _setTextStyle(self):
+		anchor = { "left": "start", "center": "middle", "right": "end" }.get(self._justify)
+		args = []
+		if not anchor is None:
+			args.extend(('text-anchor', anchor))
+		if not self._fontsize is None:
+			args.extend(('font-size', self._fontsize))
+		if len(args) > 0:
+			self.tx.setStyle(Sty('fill', 'inherit', *args))
+
 	def _build(self):
 		assert not self.tx is None
 		self.tx.clearChildren()
@@ -1221,12 +2415,7 @@ class TextParagraph(Group):
 			return
 		self.addTransform(Trans(*self._txtanchorpt))
 		self.tx = self.addChild(Text())
-		if self._justify == "left":
-			self.tx.setStyle(Sty('fill', 'inherit', 'text-anchor', 'start'))
-		elif self._justify == "center":
-			self.tx.setStyle(Sty('fill', 'inherit', 'text-anchor', 'middle'))
-		elif self._justify == "right":
-			self.tx.setStyle(Sty('fill', 'inherit', 'text-anchor', 'end'))
+		self._setTextStyle()
 		self._build()
 
 
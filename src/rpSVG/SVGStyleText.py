@@ -1,6 +1,7 @@
 #import json
 
 from typing import Optional, Union
+from weakref import WeakValueDictionary
 
 STYLE_ATTRIBS = set([ 
 	'font', 
@@ -82,45 +83,162 @@ def toCSSRule(indict, outbuf, depth=-1):
 		else:
 			outbuf.append('{0}{1}: {2};'.format(indent, k, indict[k]))
 
+_STY_INTERN = WeakValueDictionary()
+
+def minifiedCSS(p_rules) -> str:
+	"""Compact CSS text for CSSSty rules, in order. A rule with declarations identical to a previous one
+	   is merged into its selector list, unless a rule in between sets any of the same attributes
+	   (merging would change cascade order)."""
+	groups = []
+	for sty in p_rules:
+		attrs = set(sty._getSortedAttrs())
+		for grp in reversed(groups):
+			if grp[1].isSimilarTo(sty):
+				grp[0].append(sty.getSelector())
+				break
+			if not attrs.isdisjoint(grp[2]):
+				groups.append(([sty.getSelector()], sty, attrs))
+				break
+		else:
+			groups.append(([sty.getSelector()], sty, attrs))
+	out = []
+	for selectors, sty, _attrs in groups:
+		decls = ';'.join(f"{k}:{v}" for k, v in sty.toDict().items())
+		out.append(f"{','.join(selectors)}{{{decls}}}")
+	return ''.join(out)
+
 class Sty(object):
+	"""Style attributes, kept as a mapping of attribute name to value (text).
+	   Attributes can also be read and written as Python attributes: getattr(sty, 'stroke-width').
+	   Hash is content based, styles used as dict keys or interned must not be mutated."""
+
+	__slots__ = ("_attrs", "_sortedattrs", "_key", "_hash", "__weakref__")
 
 	def __init__(self, *args) -> None:
+		object.__setattr__(self, '_attrs', {})
+		self._invalidate(attrset=True)
 		self.add(args)
 
+	def _invalidate(self, attrset=False) -> None:
+		object.__setattr__(self, '_key', None)
+		object.__setattr__(self, '_hash', None)
+		if attrset:
+			object.__setattr__(self, '_sortedattrs', None)
+
+	def _put(self, attrib: str, value) -> None:
+		attrs = self._attrs
+		value = str(value)
+		if not attrib in attrs:
+			attrs[attrib] = value
+			self._invalidate(attrset=True)
+		elif attrs[attrib] != value:
+			attrs[attrib] = value
+			self._invalidate()
+
+	def __getattr__(self, name):
+		# only reached if not found as slot or class attribute
+		if name in STYLE_ATTRIBS:
+			try:
+				return self._attrs[name]
+			except KeyError:
+				pass
+		raise AttributeError(name)
+
+	def __setattr__(self, name, value):
+		if name in STYLE_ATTRIBS:
+			self._put(name, value)
+		else:
+			object.__setattr__(self, name, value)
+			self._invalidate()
+
+	def __delattr__(self, name):
+		if name in STYLE_ATTRIBS:
+			try:
+				del self._attrs[name]
+			except KeyError:
+				raise AttributeError(name)
+			self._invalidate(attrset=True)
+		else:
+			object.__delattr__(self, name)
+			self._invalidate()
+
+	def _getSortedAttrs(self) -> tuple:
+		ret = self._sortedattrs
+		if ret is None:
+			ret = tuple(sorted(self._attrs.keys()))
+			object.__setattr__(self, '_sortedattrs', ret)
+		return ret
+
 	def getStyleAttrs(self):
-		return [attr for attr in dir(self) if not attr.startswith('__') and attr in STYLE_ATTRIBS]
+		return list(self._getSortedAttrs())
+
+	def _getSelectorKey(self):
+		return (False, None)
+
+	def getKey(self) -> tuple:
+		"Immutable snapshot of style contents"
+		ret = self._key
+		if ret is None:
+			attrs = self._attrs
+			ret = self._getSelectorKey() + tuple((attr, attrs[attr]) for attr in self._getSortedAttrs())
+			object.__setattr__(self, '_key', ret)
+		return ret
 
-	def diffDict(self, o: object) -> dict:
+	def __hash__(self):
+		ret = self._hash
+		if ret is None:
+			ret = hash(self.getKey())
+			object.__setattr__(self, '_hash', ret)
+		return ret
+
+	def intern(self):
+		"Shared instance of identical style contents, first interned wins. Interned styles must not be mutated."
+		return _STY_INTERN.setdefault(self.getKey(), self)
+
+	def _diffAttrs(self, o: object) -> dict:
 		ret = {}
+		attrs = self._getSortedAttrs()
+		oattrs = o._getSortedAttrs()
+		if attrs == oattrs:
+			mine = self._attrs
+			other = o._attrs
+			for attr in attrs:
+				a = mine[attr]
+				b = other[attr]
+				if a != b:
+					ret[attr] = (a, b)
+		else:
+			ret = { "attrs": (list(attrs), list(oattrs))  }
+		return ret
+
+	def diffDict(self, o: object) -> dict:
 		if not hasattr(o, 'selector'):
-			attrs = self.getStyleAttrs()
-			oattrs = o.getStyleAttrs()
-			if set(attrs) == set(oattrs):
-				for attr in attrs:
-					a = getattr(self, attr)
-					b = getattr(o, attr)
-					if a != b:
-						ret[attr] = (a, b)
-			else:
-				ret = { "attrs": (attrs, oattrs)  }
+			ret = self._diffAttrs(o)
 		else:
 			ret = { "selector": (None, o.selector)  }
 		return ret
 
 	def __eq__(self, o: object) -> bool:
-		dd = self.diffDict(o)
-		return len(dd) == 0
+		if not isinstance(o, Sty):
+			return NotImplemented
+		if self is o:
+			return True
+		return self.__hash__() == o.__hash__() and self.getKey() == o.getKey()
 
 	def __ne__(self, o: object) -> bool:
-		return not self.__eq__(o)
+		ret = self.__eq__(o)
+		if ret is NotImplemented:
+			return ret
+		return not ret
 
 	def toString(self, prefix=None):
 		if not prefix is None:
 			out = [prefix]
 		else:
 			out = []
-		for x in self.getStyleAttrs():
-			out.append(f"{x}={getattr(self, x)}")
+		attrs = self._attrs
+		for x in self._getSortedAttrs():
+			out.append(f"{x}={attrs[x]}")
 		return ' '.join(out)
 
 	def __repr__(self):
@@ -133,14 +251,20 @@ class Sty(object):
 				continue
 			attrib, value = val
 			if attrib in STYLE_ATTRIBS:
-				setattr(self, attrib, str(value))
-		if not hasattr(self, 'fill'):
-			setattr(self, 'fill', 'none')
+				self._put(attrib, value)
+		if not 'fill' in self._attrs:
+			self._put('fill', 'none')
 		return self
 
 	def set(self, attrib: str, value):
 		if attrib in STYLE_ATTRIBS:
-			setattr(self, attrib, str(value))
+			self._put(attrib, value)
+
+	def _addFromUsableDict(self, usable_dict) -> None:
+		if isinstance(usable_dict, dict):
+			for sa in usable_dict.keys():
+				if sa in STYLE_ATTRIBS:
+					self._put(sa, usable_dict[sa])
 
 	def addFromDict(self, in_dict):
 		ld = len(in_dict)
@@ -158,39 +282,35 @@ class Sty(object):
 		assert usable_dict is not None, f"no usable dict from {in_dict}"
 				
 		if ld > 0:
-			if isinstance(usable_dict, dict):
-				isec = set(usable_dict.keys()).intersection(STYLE_ATTRIBS)
-				if len (isec) > 0:
-					for sa in isec:
-						setattr(self, sa, usable_dict[sa])
+			self._addFromUsableDict(usable_dict)
 
 		return self
 
 	def toDict(self) -> dict:
-		ret = {}
-		for f in self.getStyleAttrs():
-			ret[f] = str(getattr(self, f))
-		return ret
+		attrs = self._attrs
+		return {f: attrs[f] for f in self._getSortedAttrs()}
 
 	def setXmlAttrs(self, xmlel) -> None:  
-		for f in self.getStyleAttrs():
-			if hasattr(self, f):
-				xmlel.set(f, str(getattr(self, f)))
+		attrs = self._attrs
+		for f in self._getSortedAttrs():
+			xmlel.set(f, attrs[f])
 		return self
 
 	def fromXmlAttrs(self, xmlel):
 		for attr in xmlel.keys():
 			if attr in STYLE_ATTRIBS:
-				setattr(self, attr, xmlel.get(attr))
+				self._put(attr, xmlel.get(attr))
 		return self
 
 
 class CSSSty(Sty):
 
+	__slots__ = ("selector",)
+
 	def __init__(self, *args, selector) -> None:
 		if selector is None:
 			raise TypeError("CSSSty() needs keyword-only argument 'selector'")
-		self.selector = selector
+		object.__setattr__(self, 'selector', selector)
 		super().__init__(*args)
 
 	def setSelector(self, p_selector):
@@ -200,26 +320,18 @@ class CSSSty(Sty):
 	def getSelector(self):
 		return self.selector
 
+	def _getSelectorKey(self):
+		return (True, self.selector)
+
 	def diffDict(self, o: object, exclude_selector: Optional[bool] = False) -> dict:
-		ret = {}
 		if exclude_selector or self.selector == o.selector:
-			attrs = self.getStyleAttrs()
-			oattrs = o.getStyleAttrs()
-			if set(attrs) == set(oattrs):
-				for attr in attrs:
-					a = getattr(self, attr)
-					b = getattr(o, attr)
-					if a != b:
-						ret[attr] = (a, b)
-			else:
-				ret = { "attrs": (attrs, oattrs)  }
+			ret = self._diffAttrs(o)
 		else:
 			ret = { "selector": (self.selector, o.selector)  }
 		return ret
 
 	def isSimilarTo(self, o: object) -> bool:
-		dd = self.diffDict(o, exclude_selector=True)
-		return len(dd) == 0
+		return self.getKey()[2:] == o.getKey()[2:]
 
 	def __repr__(self):
 		return self.toString(prefix=f"sel={str(self.selector)}")
@@ -241,11 +353,7 @@ class CSSSty(Sty):
 		assert usable_dict is not None, f"no usable dict from {in_dict}"
 				
 		if ld > 0:
-			if isinstance(usable_dict, dict):
-				isec = set(usable_dict.keys()).intersection(STYLE_ATTRIBS)
-				if len (isec) > 0:
-					for sa in isec:
-						setattr(self, sa, usable_dict[sa])
+			self._addFromUsableDict(usable_dict)
 
 		return self
 
@@ -256,11 +364,9 @@ class CSSSty(Sty):
 		return self
 
 	def toCSSRule(self, outbuf, depth=-1):
-		attrs = self.getStyleAttrs()
-		if self.selector is None:
-			the_dict = {attr: getattr(self, attr) for attr in attrs}
-		else:
-			the_dict = {self.selector: {attr: getattr(self, attr) for attr in attrs}}
+		the_dict = self.toDict()
+		if not self.selector is None:
+			the_dict = {self.selector: the_dict}
 		toCSSRule(the_dict, outbuf,  depth=-1)
 		return self
 
@@ -268,5 +374,3 @@ class CSSSty(Sty):
 		outbuf = []		
 		self.toCSSRule(outbuf, depth=depth)
 		return '\n'.join(outbuf)
-
-
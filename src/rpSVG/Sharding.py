@@ -0,0 +1,198 @@
+"""Parallel construction of one document: independent shards built in worker processes and merged.
+
+   Each shard is a Group built by a shard function, in a worker, inside a scratch SVGContent with same
+   rect, viewbox and y inversion as target document. Generated ids get a per shard namespace (see
+   SVGContent.setIdNamespace), so ids never collide. Shards are sent back serialized and merged
+   in shard order:
+
+	- shard group XML is appended to target document (or to given parent), as a ShardGroup
+	- shard defs elements are added to target defs, structurally identical ones (same symbols,
+	  gradients, ...) are coalesced and references to dropped ids, nested ones included, redirected.
+	  Defs are compared after their references to other defs are resolved, so that defs referencing
+	  coalesced ones are coalesced too
+	- shard style rules are added to target stylesheet, identical rules once
+
+   Merged content is carried as XML only: no element objects are built for it.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from hashlib import blake2b
+from typing import Callable, Dict, Iterable, List, Optional
+
+from lxml import etree
+
+from rpSVG.SVGLib import HREF_ATTRS, IDREF_RE, Group, SVGContainer, SVGContent, _collectIdRefs
+from rpSVG.Structs import Re, VBox
+from rpSVG.SVGStyleText import CSSSty
+
+class ShardGroup(Group):
+	"Group merged from a shard, its content is only XML"
+	def __init__(self) -> None:
+		self._FATTR_doIdAutoGeneration = False
+		super().__init__()
+
+	def _feedStructuralHash(self, p_hash, transforms=True) -> None:
+		super()._feedStructuralHash(p_hash, transforms=transforms)
+		for chld in self.getEl():
+			p_hash.update(etree.tostring(chld, with_tail=False))
+
+def _toXml(p_el) -> bytes:
+	return etree.tostring(p_el, with_tail=False)
+
+def _buildShard(p_func: Callable, p_data, p_namespace: str, p_rect: Re, p_viewbox: VBox, p_yinvert: bool) -> tuple:
+	"Runs in worker, returns (group XML, [defs element XML, ...], style rules)"
+	sc = SVGContent(p_rect, viewbox=p_viewbox, yinvert=p_yinvert)
+	sc.setIdNamespace(p_namespace)
+	grp = sc.addChild(Group())
+	p_func(sc, grp, p_data)
+	assert len(sc.content) == 2, "shard elements must be added to shard group (or defs)"
+	sc.onBeforeSerialize()
+	defs = []
+	for chld in sc._defs.content:
+		if chld is sc._styleel or not chld.hasEl():
+			continue
+		defs.append(_toXml(chld.getEl()))
+	return (_toXml(grp.getEl()), defs, list(sc._styleel.stylerules.values()))
+
+def _redirectRefs(p_el, p_remap: Dict[str, str]) -> None:
+	"Replace references (hrefs, url()) to remapped ids"
+	def sub(p_match):
+		newid = p_remap.get(p_match.group(1))
+		if newid is None:
+			return p_match.group(0)
+		return p_match.group(0).replace(p_match.group(1), newid)
+	for el in p_el.iter():
+		if not isinstance(el.tag, str):
+			continue
+		for attr, val in el.attrib.items():
+			if attr in HREF_ATTRS:
+				if val.startswith('#') and val[1:] in p_remap:
+					el.set(attr, f"#{p_remap[val[1:]]}")
+			elif 'url(' in val:
+				el.set(attr, IDREF_RE.sub(sub, val))
+
+def _elementIds(p_el) -> List[Optional[str]]:
+	"Ids of element and descendants, in document order"
+	return [el.get('id') for el in p_el.iter() if isinstance(el.tag, str)]
+
+def _defHash(p_el) -> bytes:
+	"""Defs element (lxml) structural hash: tags, attributes and text, with own ids (nested ones included)
+	   replaced by their position, references to other elements ids kept. Namespace prefixes are ignored."""
+	wkel = deepcopy(p_el)
+	local = {}
+	for i, el in enumerate(el for el in wkel.iter() if isinstance(el.tag, str)):
+		idval = el.attrib.pop('id', None)
+		if not idval is None:
+			local[idval] = f"_{i}"
+	_redirectRefs(wkel, local)
+	ret = blake2b(digest_size=16)
+	for el in wkel.iter():
+		ret.update(repr((el.tag if isinstance(el.tag, str) else "#comment", el.items(), el.text, el.tail if not el is wkel else None)).encode('utf-8'))
+	return ret.digest()
+
+class ShardedBuilder(object):
+	"""Builds document content in parallel shards, over a pool of worker processes. See module doc.
+
+	   Shard function, called as func(content, group, data) in a worker, adds elements to group, and possibly
+	   to content defs (ex: Symbols) and style rules. It must be picklable (ex: module level function), data too.
+
+	   workers - number of worker processes, if None or 1 shards are built in this process"""
+
+	def __init__(self, workers: Optional[int] = None) -> None:
+		self.workers = workers
+
+	def _results(self, p_content: SVGContent, p_func: Callable, p_datalist: list):
+		rect = deepcopy(p_content.getStruct())
+		viewbox = p_content.getViewbox()
+		args = []
+		for data in p_datalist:
+			# shard namespace taken from target serial: unique in target, never equal to a generated id prefix
+			args.append((p_func, data, f"s{p_content.nextIDSerial()}_", rect, viewbox, p_content.getYInvertFlag()))
+		if self.workers is None or self.workers <= 1:
+			for arg in args:
+				yield _buildShard(*arg)
+			return
+		with ProcessPoolExecutor(max_workers=self.workers) as executor:
+			# in shard order, merging overlaps with building of following shards
+			yield from executor.map(_buildShard, *zip(*args))
+
+	def _knownDefs(self, p_content: SVGContent) -> Dict[bytes, List[Optional[str]]]:
+		"Defs hash -> ids of element and descendants"
+		ret = {}
+		for chld in p_content._defs.content:
+			if chld is p_content._styleel or not chld.hasEl() or not chld.hasId():
+				continue
+			el = chld.getEl()
+			ret.setdefault(_defHash(el), _elementIds(el))
+		return ret
+
+	def _mergeDefs(self, p_defsel, p_known: dict, p_defs: List[bytes]) -> Dict[str, str]:
+		"""Adds shard defs not known yet to target defs, returns remap of ids of dropped ones (nested too).
+		   Defs referencing other shard defs are compared once these are merged or dropped."""
+		pending = []
+		for defxml in p_defs:
+			el = etree.fromstring(defxml)
+			ownids = set(_elementIds(el))
+			refs = set()
+			_collectIdRefs(el, refs)
+			pending.append((el, refs - ownids))
+		shardids = set()
+		for el, _refs in pending:
+			shardids.update(idval for idval in _elementIds(el) if not idval is None)
+		remap = {}
+		done = set()
+		while len(pending) > 0:
+			# first def whose references to shard defs are all resolved, in order if there are cycles
+			idx = next((i for i, (_el, refs) in enumerate(pending) if (refs & shardids) <= done), 0)
+			el, _refs = pending.pop(idx)
+			_redirectRefs(el, remap)
+			ids = _elementIds(el)
+			hashval = _defHash(el)
+			knownids = p_known.get(hashval)
+			if ids[0] is None or knownids is None:
+				if not ids[0] is None:
+					p_known[hashval] = ids
+				p_defsel.append(el)
+			else:
+				# same structure, nested ids paired by position
+				for idval, knownid in zip(ids, knownids):
+					if not idval is None and not knownid is None:
+						remap[idval] = knownid
+			done.update(idval for idval in ids if not idval is None)
+		return remap
+
+	def _mergeRules(self, p_content: SVGContent, p_rules: List[CSSSty]) -> None:
+		style = p_content._styleel
+		for rule in p_rules:
+			prev = style.getRule(rule.getSelector())
+			if prev is None:
+				p_content.addStyleRule(rule)
+			elif prev != rule:
+				raise ValueError(f"conflicting style rules for selector '{rule.getSelector()}'")
+
+	def build(self, p_content: SVGContent, p_func: Callable, p_datalist: Iterable, parent: Optional[SVGContainer] = None) -> List[ShardGroup]:
+		"""Build one shard per data item, merged in order, returns merged shard groups.
+			parent - container receiving shard groups, defaults to content"""
+		assert isinstance(p_content, SVGContent)
+		if parent is None:
+			parent = p_content
+		datalist = list(p_datalist)
+		known = self._knownDefs(p_content)
+		defsel = p_content._defs.getEl()
+		ret = []
+		for groupxml, defs, rules in self._results(p_content, p_func, datalist):
+			self._mergeRules(p_content, rules)
+			remap = self._mergeDefs(defsel, known, defs)
+			srcel = etree.fromstring(groupxml)
+			_redirectRefs(srcel, remap)
+			grp = parent.addChild(ShardGroup(), noyinvert=True)
+			el = grp.getEl()
+			for k, v in srcel.attrib.items():
+				el.set(k, v)
+			el.text = srcel.text
+			for chld in list(srcel):
+				el.append(chld)
+			grp._structChanged()
+			ret.append(grp)
+		return ret
@@ -0,0 +1,526 @@
+
+from math import atan2, cos, floor, inf, pi, radians, sin, sqrt
+from typing import List, Optional, Union
+
+from rpSVG.Basics import PATH_CMD_NARGS, Env, PathCmdBuffer, Pt, toNumberAndUnit, toNumbersAndUnits
+from rpSVG.Geometry import ellipticalArcCenterAndRadii, polygonWinding, segmentDistance
+from rpSVG.Structs import Cir, Elli, Img, Li, Pl, Pth, Re, Tx, Us
+
+def _structNum(p_struct, p_field: str):
+	"Numeric value of struct field, None if not set or not in user units"
+	if not p_struct.isSet(p_field):
+		return None
+	try:
+		num, un = p_struct.getNumAndUnit(p_field)
+	except (TypeError, ValueError):
+		return None
+	if not un in (None, 'px'):
+		return None
+	return num
+
+def _ptsBounds(p_xs: List[float], p_ys: List[float]):
+	if len(p_xs) == 0:
+		return None
+	return (min(p_xs), min(p_ys), max(p_xs), max(p_ys))
+
+def pathBounds(p_buf: PathCmdBuffer):
+	"""Bounds (minx, miny, maxx, maxy) of path commands in buffer.
+	   Conservative for curves: Bézier control points and whole arc ellipses are included."""
+	xs = []
+	ys = []
+	cx = cy = 0
+	sx = sy = 0
+	vals = p_buf.vals
+	offsets = p_buf.offsets
+	for idx, code in enumerate(p_buf.letters):
+		lett = chr(code)
+		up = lett.upper()
+		if up == 'Z':
+			cx = sx
+			cy = sy
+			continue
+		off = offsets[idx]
+		args = vals[off:off+PATH_CMD_NARGS[up]]
+		if lett != up:
+			ox = cx
+			oy = cy
+		else:
+			ox = oy = 0
+		if up == 'H':
+			cx = ox + args[0]
+		elif up == 'V':
+			cy = oy + args[0]
+		elif up == 'A':
+			x = ox + args[5]
+			y = oy + args[6]
+			rx, ry = abs(args[0]), abs(args[1])
+			if rx > 0 and ry > 0 and (x != cx or y != cy):
+				center, rx, ry = ellipticalArcCenterAndRadii(Pt(cx, cy), Pt(x, y), rx, ry,
+					largearcflag=args[3], sweepflag=args[4], angle=args[2])
+				r = max(rx, ry)
+				xs.extend((center.x - r, center.x + r))
+				ys.extend((center.y - r, center.y + r))
+			cx = x
+			cy = y
+		else:
+			for k in range(0, len(args)-1, 2):
+				xs.append(ox + args[k])
+				ys.append(oy + args[k+1])
+			cx = xs[-1]
+			cy = ys[-1]
+			if up == 'M':
+				sx = cx
+				sy = cy
+		xs.append(cx)
+		ys.append(cy)
+	return _ptsBounds(xs, ys)
+
+def structBounds(p_struct):
+	"Bounds (minx, miny, maxx, maxy) of geometry described by struct, None if not computable"
+	ret = None
+	if isinstance(p_struct, (Re, Img, Us, Tx)):
+		x = _structNum(p_struct, "x")
+		y = _structNum(p_struct, "y")
+		if isinstance(p_struct, Tx):
+			w = h = 0
+		else:
+			w = _structNum(p_struct, "width")
+			h = _structNum(p_struct, "height")
+		if x is None:
+			x = 0
+		if y is None:
+			y = 0
+		if not w is None and not h is None:
+			ret = (x, y, x + w, y + h)
+		elif not isinstance(p_struct, Us):
+			ret = (x, y, x, y)
+		# else 'use' extent depends on referenced content, unknown
+	elif isinstance(p_struct, Cir):
+		vals = [_structNum(p_struct, f) for f in ("cx", "cy", "r")]
+		if not None in vals:
+			cx, cy, r = vals
+			ret = (cx - r, cy - r, cx + r, cy + r)
+	elif isinstance(p_struct, Elli):
+		vals = [_structNum(p_struct, f) for f in ("cx", "cy", "rx", "ry")]
+		if not None in vals:
+			cx, cy, rx, ry = vals
+			ret = (cx - rx, cy - ry, cx + rx, cy + ry)
+	elif isinstance(p_struct, Li):
+		vals = [_structNum(p_struct, f) for f in ("x1", "y1", "x2", "y2")]
+		if not None in vals:
+			ret = _ptsBounds(vals[0::2], vals[1::2])
+	elif isinstance(p_struct, Pl):
+		if p_struct.hasPoints():
+			nums = [num for num, _un in toNumbersAndUnits(p_struct.points)]
+			ret = _ptsBounds(nums[0::2], nums[1::2])
+	elif isinstance(p_struct, Pth):
+		if p_struct.hasPoints():
+			ret = pathBounds(PathCmdBuffer.fromD(p_struct.d))
+	return ret
+
+# flattening of outlines, segments per curve, arc or whole ellipse
+CURVE_SEGMENTS = 16
+ELLIPSE_SEGMENTS = 64
+
+def _arcPoints(p_x0, p_y0, p_args, p_x, p_y):
+	"Flattened arc points, start point excluded"
+	rx, ry = abs(p_args[0]), abs(p_args[1])
+	if rx == 0 or ry == 0 or (p_x == p_x0 and p_y == p_y0):
+		return [(p_x, p_y)]
+	center, rx, ry = ellipticalArcCenterAndRadii(Pt(p_x0, p_y0), Pt(p_x, p_y), rx, ry,
+		largearcflag=p_args[3], sweepflag=p_args[4], angle=p_args[2])
+	cosphi = cos(radians(p_args[2]))
+	sinphi = sin(radians(p_args[2]))
+	def angle(p_px, p_py):
+		dx = p_px - center.x
+		dy = p_py - center.y
+		return atan2((-sinphi * dx + cosphi * dy) / ry, (cosphi * dx + sinphi * dy) / rx)
+	t0 = angle(p_x0, p_y0)
+	dt = angle(p_x, p_y) - t0
+	if p_args[4] and dt < 0:
+		dt += 2 * pi
+	elif not p_args[4] and dt > 0:
+		dt -= 2 * pi
+	ret = []
+	for k in range(1, CURVE_SEGMENTS):
+		t = t0 + dt * k / CURVE_SEGMENTS
+		ex = rx * cos(t)
+		ey = ry * sin(t)
+		ret.append((center.x + cosphi * ex - sinphi * ey, center.y + sinphi * ex + cosphi * ey))
+	ret.append((p_x, p_y))
+	return ret
+
+def _bezierPoints(p_ctrls):
+	"Flattened quadratic or cubic Bézier points, start point (first control point) excluded"
+	ret = []
+	n = len(p_ctrls) - 1
+	for k in range(1, CURVE_SEGMENTS + 1):
+		t = k / CURVE_SEGMENTS
+		u = 1 - t
+		if n == 2:
+			coefs = (u * u, 2 * u * t, t * t)
+		else:
+			coefs = (u * u * u, 3 * u * u * t, 3 * u * t * t, t * t * t)
+		ret.append((sum(cf * pt[0] for cf, pt in zip(coefs, p_ctrls)), sum(cf * pt[1] for cf, pt in zip(coefs, p_ctrls))))
+	return ret
+
+def pathOutline(p_buf: PathCmdBuffer) -> List[tuple]:
+	"Subpaths of path commands in buffer, as (xs, ys, closed), curves and arcs flattened"
+	ret = []
+	pts = None
+	cx = cy = 0
+	sx = sy = 0
+	prevup = None
+	lastctrl = None
+	vals = p_buf.vals
+	offsets = p_buf.offsets
+	for idx, code in enumerate(p_buf.letters):
+		lett = chr(code)
+		up = lett.upper()
+		if up == 'Z':
+			if not pts is None:
+				ret.append(([p[0] for p in pts], [p[1] for p in pts], True))
+				pts = None
+			cx = sx
+			cy = sy
+			prevup = up
+			continue
+		off = offsets[idx]
+		args = vals[off:off+PATH_CMD_NARGS[up]]
+		if lett != up:
+			ox = cx
+			oy = cy
+		else:
+			ox = oy = 0
+		if up == 'M':
+			if not pts is None:
+				ret.append(([p[0] for p in pts], [p[1] for p in pts], False))
+			cx = sx = ox + args[0]
+			cy = sy = oy + args[1]
+			pts = [(cx, cy)]
+			prevup = up
+			continue
+		if pts is None:
+			pts = [(cx, cy)]
+		ctrl = None
+		if up == 'H':
+			newpts = [(ox + args[0], cy)]
+		elif up == 'V':
+			newpts = [(cx, oy + args[0])]
+		elif up == 'L':
+			newpts = [(ox + args[0], oy + args[1])]
+		elif up == 'A':
+			newpts = _arcPoints(cx, cy, args, ox + args[5], oy + args[6])
+		else:
+			# Bézier curves, smooth ones with first control point reflected from previous curve
+			absargs = [ox + v if i % 2 == 0 else oy + v for i, v in enumerate(args)]
+			if up in ('S', 'T'):
+				if not lastctrl is None and prevup in (('C', 'S') if up == 'S' else ('Q', 'T')):
+					refl = (2 * cx - lastctrl[0], 2 * cy - lastctrl[1])
+				else:
+					refl = (cx, cy)
+				absargs = list(refl) + absargs
+			ctrls = [(cx, cy)] + [(absargs[k], absargs[k+1]) for k in range(0, len(absargs), 2)]
+			ctrl = ctrls[-2]
+			newpts = _bezierPoints(ctrls)
+		pts.extend(newpts)
+		cx, cy = newpts[-1]
+		prevup = up
+		lastctrl = ctrl
+	if not pts is None:
+		ret.append(([p[0] for p in pts], [p[1] for p in pts], False))
+	return ret
+
+def structOutline(p_struct, closed=False):
+	"""Outline of geometry described by struct, in own user space, as (subpaths, areal), None if not
+	   computable. Subpaths are (xs, ys, closed) tuples, curves flattened, rect corners not rounded.
+		closed - points struct (Pl) outline is closed (polygon)"""
+	ret = None
+	if isinstance(p_struct, (Re, Img)):
+		vals = [_structNum(p_struct, f) for f in ("x", "y", "width", "height")]
+		if not vals[2] is None and not vals[3] is None:
+			x, y, w, h = [0 if v is None else v for v in vals]
+			ret = ([([x, x + w, x + w, x], [y, y, y + h, y + h], True)], True)
+	elif isinstance(p_struct, (Cir, Elli)):
+		if isinstance(p_struct, Cir):
+			vals = [_structNum(p_struct, f) for f in ("cx", "cy", "r", "r")]
+		else:
+			vals = [_structNum(p_struct, f) for f in ("cx", "cy", "rx", "ry")]
+		if not None in vals:
+			cx, cy, rx, ry = vals
+			angs = [2 * pi * k / ELLIPSE_SEGMENTS for k in range(ELLIPSE_SEGMENTS)]
+			ret = ([([cx + rx * cos(a) for a in angs], [cy + ry * sin(a) for a in angs], True)], True)
+	elif isinstance(p_struct, Li):
+		vals = [_structNum(p_struct, f) for f in ("x1", "y1", "x2", "y2")]
+		if not None in vals:
+			ret = ([(vals[0::2], vals[1::2], False)], False)
+	elif isinstance(p_struct, Pl):
+		if p_struct.hasPoints():
+			nums = [num for num, _un in toNumbersAndUnits(p_struct.points)]
+			ret = ([(nums[0::2], nums[1::2], closed)], True)
+	elif isinstance(p_struct, Pth):
+		if p_struct.hasPoints():
+			ret = (pathOutline(PathCmdBuffer.fromD(p_struct.d)), True)
+	return ret
+
+def _inheritedStyleValue(p_elem, p_name: str, p_default: str) -> str:
+	"Style property from element or ancestors style attributes (stylesheet rules not considered)"
+	elem = p_elem
+	while not elem is None:
+		sty = getattr(elem, '_style', None)
+		if not sty is None:
+			val = sty._attrs.get(p_name)
+			if not val is None and val != "inherit":
+				return val
+		elem = getattr(elem, '_parentelem', None)
+	return p_default
+
+def geometryHit(p_elem, p_x: float, p_y: float, tolerance: float = 0) -> bool:
+	"""Exact hit test of element geometry by point, in document user units: stroke (or outline, if
+	   not stroked) within tolerance, or point inside filled area. Paint and stroke width taken from
+	   style attributes (see _inheritedStyleValue). Containers and elements without computable outline
+	   (text, use) are taken as hit, their bounds being the only geometry known."""
+	if len(getattr(p_elem, 'content', ())) > 0 or p_elem._struct is None:
+		return True
+	outline = structOutline(p_elem.getStruct(), closed=(p_elem.tag == "polygon"))
+	if outline is None:
+		return True
+	subpaths, areal = outline
+	a, b, c, d, e, f = p_elem.getCTM()
+	reach = tolerance
+	if _inheritedStyleValue(p_elem, "stroke", "none") != "none":
+		try:
+			sw, un = toNumberAndUnit(_inheritedStyleValue(p_elem, "stroke-width", "1"))
+		except (TypeError, ValueError):
+			sw, un = 1, None
+		if not un in (None, 'px'):
+			sw = 1
+		reach += sw * sqrt(abs(a * d - b * c)) / 2
+	winding = 0
+	for xs, ys, closed in subpaths:
+		txs = [a * x + c * y + e for x, y in zip(xs, ys)]
+		tys = [b * x + d * y + f for x, y in zip(xs, ys)]
+		if len(txs) == 1 and segmentDistance(p_x, p_y, txs[0], tys[0], txs[0], tys[0]) <= reach:
+			return True
+		for i in range(0 if closed else 1, len(txs)):
+			if segmentDistance(p_x, p_y, txs[i-1], tys[i-1], txs[i], tys[i]) <= reach:
+				return True
+		winding += polygonWinding(txs, tys, p_x, p_y)
+	if not areal or _inheritedStyleValue(p_elem, "fill", "black") == "none":
+		return False
+	if _inheritedStyleValue(p_elem, "fill-rule", "nonzero") == "evenodd":
+		return winding % 2 != 0
+	return winding != 0
+
+def boundsIntersect(p_a, p_b) -> bool:
+	return p_a[0] <= p_b[2] and p_a[2] >= p_b[0] and p_a[1] <= p_b[3] and p_a[3] >= p_b[1]
+
+def boundsContain(p_outer, p_inner) -> bool:
+	return p_outer[0] <= p_inner[0] and p_outer[1] <= p_inner[1] and p_outer[2] >= p_inner[2] and p_outer[3] >= p_inner[3]
+
+def toBounds(p_env: Union[Env, tuple]):
+	if isinstance(p_env, Env):
+		return tuple(p_env.getNum(f) for f in p_env._fields)
+	return tuple(p_env)
+
+class SpatialIndex(object):
+	"""Uniform grid spatial index over document elements, keyed by their bounds in document user units.
+	   Elements are marked dirty on struct or transform changes, their bounds are recalculated on next query.
+	   Results come in insertion order (hit: topmost first)."""
+
+	MAX_CELLS_PER_ENTRY = 1024
+	# nearest: rings of cells searched before scanning all entries
+	NEAREST_MAX_RINGS = 64
+
+	def __init__(self, cellsize: float) -> None:
+		assert cellsize > 0
+		self.cellsize = float(cellsize)
+		self._cells = {}
+		self._large = {}
+		self._entries = {}
+		self._order = {}
+		self._dirty = {}
+		self._serial = 0
+		self._extent = None
+
+	def __len__(self):
+		self._flush()
+		return len(self._entries)
+
+	def markDirty(self, p_elem) -> None:
+		if getattr(p_elem, '_FATTR_spatialIndexable', True):
+			if not p_elem in self._order:
+				self._order[p_elem] = self._serial
+				self._serial += 1
+			self._dirty[p_elem] = None
+		# container changes (ex: transforms) move all its descendants
+		for chld in getattr(p_elem, 'content', ()):
+			if chld._spatialindex is self:
+				self.markDirty(chld)
+
+	def remove(self, p_elem) -> None:
+		self._unplace(p_elem)
+		self._dirty.pop(p_elem, None)
+		self._order.pop(p_elem, None)
+
+	def _cellRange(self, p_bounds):
+		cs = self.cellsize
+		minx, miny, maxx, maxy = p_bounds
+		return (floor(minx / cs), floor(miny / cs), floor(maxx / cs), floor(maxy / cs))
+
+	def _unplace(self, p_elem) -> None:
+		entry = self._entries.pop(p_elem, None)
+		if entry is None:
+			return
+		bounds, crange = entry
+		if crange is None:
+			del self._large[p_elem]
+		else:
+			c0, r0, c1, r1 = crange
+			for c in range(c0, c1+1):
+				for r in range(r0, r1+1):
+					cell = self._cells[(c, r)]
+					del cell[p_elem]
+					if len(cell) == 0:
+						del self._cells[(c, r)]
+
+	def _place(self, p_elem, p_bounds) -> None:
+		crange = self._cellRange(p_bounds)
+		c0, r0, c1, r1 = crange
+		if (c1 - c0 + 1) * (r1 - r0 + 1) > self.MAX_CELLS_PER_ENTRY:
+			self._large[p_elem] = None
+			crange = None
+		else:
+			cells = self._cells
+			for c in range(c0, c1+1):
+				for r in range(r0, r1+1):
+					cell = cells.get((c, r))
+					if cell is None:
+						cells[(c, r)] = { p_elem: None }
+					else:
+						cell[p_elem] = None
+			if self._extent is None:
+				self._extent = list(crange)
+			else:
+				ext = self._extent
+				ext[0] = min(ext[0], c0)
+				ext[1] = min(ext[1], r0)
+				ext[2] = max(ext[2], c1)
+				ext[3] = max(ext[3], r1)
+		self._entries[p_elem] = (p_bounds, crange)
+
+	def _flush(self) -> None:
+		if len(self._dirty) == 0:
+			return
+		dirty = list(self._dirty.keys())
+		self._dirty.clear()
+		for elem in dirty:
+			self._unplace(elem)
+			bounds = elem.getDocBounds()
+			if not bounds is None:
+				self._place(elem, bounds)
+
+	def getBounds(self, p_elem):
+		"Indexed bounds of element, None if not indexed or not computable"
+		self._flush()
+		entry = self._entries.get(p_elem)
+		if entry is None:
+			return None
+		return entry[0]
+
+	def _sorted(self, p_elems, reverse=False):
+		order = self._order
+		return sorted(p_elems, key=lambda el: order[el], reverse=reverse)
+
+	def query(self, p_env: Union[Env, tuple]) -> list:
+		"Elements whose bounds intersect envelope (Env or (minx, miny, maxx, maxy) tuple)"
+		self._flush()
+		qminx, qminy, qmaxx, qmaxy = toBounds(p_env)
+		c0, r0, c1, r1 = self._cellRange((qminx, qminy, qmaxx, qmaxy))
+		if not self._extent is None:
+			ext = self._extent
+			c0 = max(c0, ext[0])
+			r0 = max(r0, ext[1])
+			c1 = min(c1, ext[2])
+			r1 = min(r1, ext[3])
+		cands = set(self._large.keys())
+		cells = self._cells
+		if (c1 - c0 + 1) * (r1 - r0 + 1) > len(cells):
+			for (c, r), cell in cells.items():
+				if c0 <= c <= c1 and r0 <= r <= r1:
+					cands.update(cell.keys())
+		else:
+			for c in range(c0, c1+1):
+				for r in range(r0, r1+1):
+					cell = cells.get((c, r))
+					if not cell is None:
+						cands.update(cell.keys())
+		ret = []
+		entries = self._entries
+		for elem in cands:
+			minx, miny, maxx, maxy = entries[elem][0]
+			if minx <= qmaxx and maxx >= qminx and miny <= qmaxy and maxy >= qminy:
+				ret.append(elem)
+		return self._sorted(ret)
+
+	def hit(self, p_pt: Pt, tolerance: float = 0) -> list:
+		"Elements hit by point, topmost first: bounds filtered by index, then geometry tested (see geometryHit)"
+		x, y = p_pt[0], p_pt[1]
+		cands = self.query((x - tolerance, y - tolerance, x + tolerance, y + tolerance))
+		return self._sorted([elem for elem in cands if geometryHit(elem, x, y, tolerance=tolerance)], reverse=True)
+
+	def _dist(self, p_elem, x, y) -> float:
+		minx, miny, maxx, maxy = self._entries[p_elem][0]
+		dx = max(minx - x, 0, x - maxx)
+		dy = max(miny - y, 0, y - maxy)
+		return sqrt(dx * dx + dy * dy)
+
+	def nearest(self, p_pt: Pt, maxdist: Optional[float] = None):
+		"""Element whose bounds are nearest to point (distance 0 if inside), None if index empty or none within maxdist.
+		   Grid cells are searched in rings around point cell, clamped to grid extent. Points outside extent,
+		   or searches going past NEAREST_MAX_RINGS rings, scan all entries."""
+		self._flush()
+		x, y = p_pt[0], p_pt[1]
+		best = None
+		bestdist = inf
+		order = self._order
+		def consider(p_elems):
+			nonlocal best, bestdist
+			for elem in p_elems:
+				d = self._dist(elem, x, y)
+				if d < bestdist or (d == bestdist and order[elem] > order[best]):
+					best, bestdist = elem, d
+		consider(self._large.keys())
+		if not self._extent is None:
+			cs = self.cellsize
+			pc = floor(x / cs)
+			pr = floor(y / cs)
+			c0, r0, c1, r1 = self._extent
+			if not (c0 <= pc <= c1 and r0 <= pr <= r1):
+				consider(self._entries.keys())
+			else:
+				maxring = max(pc - c0, c1 - pc, pr - r0, r1 - pr)
+				seen = set()
+				ring = 0
+				while ring <= maxring:
+					# cells beyond this ring are at least this far
+					if bestdist <= (ring - 1) * cs:
+						break
+					if ring > self.NEAREST_MAX_RINGS:
+						consider(self._entries.keys())
+						break
+					for c in range(max(pc - ring, c0), min(pc + ring, c1) + 1):
+						if c == pc - ring or c == pc + ring:
+							rows = range(max(pr - ring, r0), min(pr + ring, r1) + 1)
+						else:
+							rows = [r for r in (pr - ring, pr + ring) if r0 <= r <= r1]
+						for r in rows:
+							cell = self._cells.get((c, r))
+							if cell is None:
+								continue
+							consider([elem for elem in cell.keys() if not elem in seen])
+							seen.update(cell.keys())
+					ring += 1
+		if not maxdist is None and bestdist > maxdist:
+			best = None
+		return best
@@ -1,9 +1,8 @@
 
 from typing import Optional, Union
 from math import atan, degrees
-from re import split as re_split
 
-from rpSVG.Basics import MINDELTA, Pt, Env, XLINK_NAMESPACE, _attrs_struct, _withunits_struct, _kwarg_attrs_struct, glRd, hashed_href, isNumeric, removeDecsep, strictToNumber, toNumberAndUnit
+from rpSVG.Basics import MINDELTA, Pt, Env, XLINK_NAMESPACE, _attrs_struct, _withunits_struct, _kwarg_attrs_struct, glRd, hashed_href, isNumeric, removeDecsep, strictToNumber, toNumberAndUnit, toNumbersAndUnits
 
 
 class Re(_withunits_struct):
@@ -22,12 +21,12 @@ class Re(_withunits_struct):
 		self.setUnits('%')
 		return self
 	def getValues(self):
-		return [glRd(x[0]) for x in [toNumberAndUnit(v) for v in self.getall()]]
+		return [glRd(self.getNumAndUnit(f)[0]) for f in self._fields]
 	def isEmpty(self):
-		return [x[0] for x in [toNumberAndUnit(v) for v in self.getall()]] == [0,0,0,0]
+		return [self.getNumAndUnit(f)[0] for f in self._fields] == [0,0,0,0]
 	def yinvert(self, p_contentheight: Union[float, int]):
-		h = strictToNumber(self.height)
-		self.y = p_contentheight - strictToNumber(self.y) - h
+		h = self.getNum("height")
+		self.y = p_contentheight - self.getNum("y") - h
 		return self
 
 class VBox(_attrs_struct):
@@ -53,10 +52,10 @@ class VBox(_attrs_struct):
 		ret = []
 		val = getattr(self, 'viewBox')
 		if len(val) > 0:
-			ret = [x[0] for x in [toNumberAndUnit(v) for v in re_split(r"[\s]+", val)]]
+			ret = [x[0] for x in toNumbersAndUnits(val)]
 		return ret
 	def isEmpty(self):
-		return [x[0] for x in [toNumberAndUnit(v) for v in self.getValues()]] == [0,0,0,0]
+		return self.getValues() == [0,0,0,0]
 
 class VBox600x800(VBox):
 	def __init__(self) -> None:
@@ -82,7 +81,7 @@ class Cir(_withunits_struct):
 	def __init__(self, *args) -> None:
 		super().__init__(*args, defaults=["0"])
 	def yinvert(self, p_contentheight: Union[float, int]):
-		self.cy = p_contentheight - strictToNumber(self.cy)
+		self.cy = p_contentheight - self.getNum("cy")
 		return self
 
 class Elli(_withunits_struct):
@@ -90,7 +89,7 @@ class Elli(_withunits_struct):
 	def __init__(self, *args) -> None:
 		super().__init__(*args, defaults=["0"])
 	def yinvert(self, p_contentheight: Union[float, int]):
-		self.cy = p_contentheight - strictToNumber(self.cy)
+		self.cy = p_contentheight - self.getNum("cy")
 		return self
 
 class Li(_withunits_struct):
@@ -104,8 +103,8 @@ class Li(_withunits_struct):
 		super().__init__(*argslist, defaults=["0"])
 	def getAngle(self):
 		ret = None
-		dx = strictToNumber(getattr(self, "x2")) - strictToNumber(getattr(self, "x1"))
-		dy = strictToNumber(getattr(self, "y2")) - strictToNumber(getattr(self, "y1"))
+		dx = self.getNum("x2") - self.getNum("x1")
+		dy = self.getNum("y2") - self.getNum("y1")
 		if dx < MINDELTA:
 			if dy > MINDELTA:
 				ret = 90
@@ -115,8 +114,8 @@ class Li(_withunits_struct):
 			ret = degrees(atan(dy/dx))
 		return ret
 	def yinvert(self, p_contentheight: Union[float, int]):
-		self.y1 = p_contentheight - strictToNumber(self.y1)
-		self.y2 = p_contentheight - strictToNumber(self.y2)
+		self.y1 = p_contentheight - self.getNum("y1")
+		self.y2 = p_contentheight - self.getNum("y2")
 		return self
 
 class Us(_withunits_struct):
@@ -147,7 +146,7 @@ class Us(_withunits_struct):
 		super().__init__(*argslist, defaults=None)
 	def yinvert(self, p_contentheight: Union[float, int]):
 		if hasattr(self, 'y'):
-			prevval = strictToNumber(self.y)
+			prevval = self.getNum("y")
 			self.y = p_contentheight - prevval
 		return self
 
@@ -212,8 +211,8 @@ class LiGra(_withunits_struct):
 			assert argslist[6] in ("pad", "reflect", "repeat")
 		super().__init__(*argslist)
 	def yinvert(self, p_contentheight: Union[float, int]):
-		self.y1 = p_contentheight - strictToNumber(self.y1)
-		self.y2 = p_contentheight - strictToNumber(self.y2)
+		self.y1 = p_contentheight - self.getNum("y1")
+		self.y2 = p_contentheight - self.getNum("y2")
 		return self
 
 class RaGra(_withunits_struct):
@@ -227,8 +226,8 @@ class RaGra(_withunits_struct):
 			assert args[7] in ("pad", "reflect", "repeat")
 		super().__init__(*args)
 	def yinvert(self, p_contentheight: Union[float, int]):
-		self.cy = p_contentheight - strictToNumber(self.cy)
-		self.fy = p_contentheight - strictToNumber(self.fy)
+		self.cy = p_contentheight - self.getNum("cy")
+		self.fy = p_contentheight - self.getNum("fy")
 		return self
 
 class Tx(_withunits_struct):
@@ -240,9 +239,9 @@ class Tx(_withunits_struct):
 		super().__init__(*args)
 	def yinvert(self, p_contentheight: Union[float, int]):
 		if hasattr(self, "y"):
-			self.y = p_contentheight - strictToNumber(self.y)
+			self.y = p_contentheight - self.getNum("y")
 		if hasattr(self, "dy"):
-			dyv, _u = toNumberAndUnit(self.dy)
+			dyv, _u = self.getNumAndUnit("dy")
 			if dyv > 0:
 				self.dy =  "-" + str(self.dy)
 			else:
@@ -284,8 +283,8 @@ class Img(_withunits_struct):
 			argslist = args
 		super().__init__(*argslist, defaults=None)
 	def yinvert(self, p_contentheight: Union[float, int]):
-		h = strictToNumber(self.height)
-		self.y = p_contentheight - strictToNumber(self.y) - h
+		h = self.getNum("height")
+		self.y = p_contentheight - self.getNum("y") - h
 		return self
 
 class Patt(_withunits_struct):
@@ -304,8 +303,8 @@ class Patt(_withunits_struct):
 				argslist[6] = hashed_href(argslist[6])
 		super().__init__(*argslist, defaults=None)
 	def yinvert(self, p_contentheight: Union[float, int]):
-		h = strictToNumber(self.height)
-		self.y = p_contentheight - strictToNumber(self.y) - h
+		h = self.getNum("height")
+		self.y = p_contentheight - self.getNum("y") - h
 		return self
 
 class Symb(VBox):
@@ -0,0 +1,135 @@
+from typing import Optional
+from uuid import uuid4
+from xml.sax.saxutils import escape
+
+from rpSVG.Basics import _numToText, glRd
+from rpSVG.SVGLib import BaseSVGElem, SVGContent
+from rpSVG.SVGStyleText import STYLE_ATTRIBS, Sty
+
+ATTR_ESCAPES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}
+
+def _slotValueText(p_value) -> str:
+	if isinstance(p_value, (int, float)):
+		return _numToText(glRd(p_value))
+	return str(p_value)
+
+class SVGTemplate(object):
+	"""Document built once, with named slots for element texts, attribute values and styles, then frozen
+	   in precompiled byte segments. Instances are produced by splicing slot values between segments.
+
+		tpl = SVGTemplate(sc)
+		tpl.addTextSlot("label", txt)
+		tpl.addAttrSlot("h", bar, "height")
+		tpl.freeze()
+		tpl.render(label="abc", h=12)
+
+	   Document is left unchanged by freezing, current values are slot defaults. A slot name can be used in
+	   several places. Style slot values are Sty objects, replacing the element's style attributes."""
+
+	def __init__(self, p_content: SVGContent, inc_declaration=False, inc_doctype=False, pretty_print=False) -> None:
+		self._content = p_content
+		self._serparams = (inc_declaration, inc_doctype, pretty_print)
+		self._slots = []
+		self._defaults = {}
+		self._segments = None
+		self._order = None
+
+	def _addSlot(self, p_name: str, p_elem: BaseSVGElem, p_kind: str, p_attr: Optional[str] = None):
+		assert not self.isFrozen(), "template already frozen"
+		assert p_elem.hasEl(), p_elem.NO_XML_EL
+		self._slots.append((p_name, p_elem, p_kind, p_attr))
+		return self
+
+	def addTextSlot(self, p_name: str, p_elem: BaseSVGElem):
+		self._defaults.setdefault(p_name, p_elem.getText() or "")
+		return self._addSlot(p_name, p_elem, 'text')
+
+	def addAttrSlot(self, p_name: str, p_elem: BaseSVGElem, p_attr: str):
+		assert not p_attr in STYLE_ATTRIBS, "for style attributes use a style slot"
+		self._defaults.setdefault(p_name, p_elem.getEl().get(p_attr, ""))
+		return self._addSlot(p_name, p_elem, 'attr', p_attr)
+
+	def addStyleSlot(self, p_name: str, p_elem: BaseSVGElem):
+		default = Sty()
+		if p_elem.getEl().get('fill') is None:
+			# added by default on Sty creation
+			del default.fill
+		default.fromXmlAttrs(p_elem.getEl())
+		self._defaults.setdefault(p_name, default)
+		return self._addSlot(p_name, p_elem, 'style')
+
+	def isFrozen(self) -> bool:
+		return not self._segments is None
+
+	def freeze(self):
+		"Serialize document with slot markers and split it in byte segments"
+		assert not self.isFrozen(), "template already frozen"
+		content = self._content
+		content.onBeforeSerialize()
+		tag = uuid4().hex
+		undo = []
+		markers = {}
+		for i, (name, elem, kind, attr) in enumerate(self._slots):
+			el = elem.getEl()
+			marker = f"rpsvgslot{i}x{tag}"
+			undo.append((el, el.text, list(el.attrib.items())))
+			if kind == 'text':
+				el.text = marker
+				markers[marker.encode('utf-8')] = (name, kind)
+			elif kind == 'attr':
+				el.set(attr, marker)
+				markers[marker.encode('utf-8')] = (name, kind)
+			else:
+				for k in list(el.attrib.keys()):
+					if k in STYLE_ATTRIBS:
+						del el.attrib[k]
+				el.set(marker, "")
+				markers[f' {marker}=""'.encode('utf-8')] = (name, kind)
+		try:
+			inc_declaration, inc_doctype, pretty_print = self._serparams
+			data = content.toBytes(inc_declaration=inc_declaration, inc_doctype=inc_doctype, pretty_print=pretty_print)
+		finally:
+			for el, text, items in reversed(undo):
+				el.text = text
+				el.attrib.clear()
+				for k, v in items:
+					el.set(k, v)
+
+		found = []
+		for marker, slot in markers.items():
+			pos = data.find(marker)
+			assert pos >= 0, f"slot '{slot[0]}' not found in output"
+			found.append((pos, marker, slot))
+		found.sort(key=lambda f: f[0])
+		segments = []
+		order = []
+		start = 0
+		for pos, marker, slot in found:
+			segments.append(data[start:pos])
+			order.append(slot)
+			start = pos + len(marker)
+		segments.append(data[start:])
+		self._segments = segments
+		self._order = order
+		return self
+
+	def getSlotNames(self) -> list:
+		return list(self._defaults.keys())
+
+	def render(self, **values) -> bytes:
+		"Instance bytes, slots not given take their default values"
+		if not self.isFrozen():
+			self.freeze()
+		segments = self._segments
+		defaults = self._defaults
+		out = [segments[0]]
+		for i, (name, kind) in enumerate(self._order):
+			val = values.get(name, defaults[name])
+			if kind == 'text':
+				out.append(escape(_slotValueText(val)).encode('utf-8'))
+			elif kind == 'attr':
+				out.append(escape(_slotValueText(val), ATTR_ESCAPES).encode('utf-8'))
+			else:
+				out.append(''.join(f' {k}="{escape(v, ATTR_ESCAPES)}"' for k, v in val.toDict().items()).encode('utf-8'))
+			out.append(segments[i+1])
+		return b''.join(out)
@@ -0,0 +1,160 @@
+"""Text layout: line breaking to a width and shrink to fit font size search, measured by TextMetrics.
+
+   Explicit line breaks ('\\n') are kept, each paragraph is broken at whitespace:
+	- 'greedy' fills each line with as many words as fit
+	- 'optimal' (Knuth-Plass style) minimizes the sum of squared line slacks, last line excepted,
+	  giving more even lines
+   Words wider than the line are left overflowing, on their own line.
+
+   Widths scale with font size, so layouts are computed and cached (LRU) at unit font size, per
+   font (TextMetrics.fontkey), text, available width and method: re-laying out unchanged boxes is a lookup.
+   Caches hold font keys only, never the caller's TextMetrics objects.
+"""
+
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from rpSVG.Basics import fontSizeToVPUnits
+from rpSVG.TextMetrics import TextMetrics
+
+WRAP_METHODS = ("greedy", "optimal")
+LAYOUT_CACHE_SIZE = 65536
+# font size search precision
+FIT_SIZE_STEP = 0.5
+
+_OVERFLOW_COST = 1e12
+
+def _breakGreedy(p_widths: List[float], p_spacew: float, p_maxwidth: float) -> List[int]:
+	"Line end word indexes"
+	ret = []
+	linew = None
+	for i, w in enumerate(p_widths):
+		if linew is None:
+			linew = w
+		elif linew + p_spacew + w <= p_maxwidth:
+			linew += p_spacew + w
+		else:
+			ret.append(i)
+			linew = w
+	ret.append(len(p_widths))
+	return ret
+
+def _breakOptimal(p_widths: List[float], p_spacew: float, p_maxwidth: float) -> List[int]:
+	"Line end word indexes, minimizing sum of squared slacks of all lines but last"
+	n = len(p_widths)
+	prefix = [0.0]
+	for w in p_widths:
+		prefix.append(prefix[-1] + w)
+	best = [0.0] + [None] * n
+	brk = [0] * (n + 1)
+	for j in range(1, n + 1):
+		for i in range(j - 1, -1, -1):
+			linew = prefix[j] - prefix[i] + (j - i - 1) * p_spacew
+			slack = p_maxwidth - linew
+			if slack < 0 and j - i > 1:
+				break
+			if slack < 0:
+				cost = _OVERFLOW_COST
+			elif j == n:
+				cost = 0
+			else:
+				cost = slack * slack
+			cost += best[i]
+			if best[j] is None or cost < best[j]:
+				best[j] = cost
+				brk[j] = i
+	ret = []
+	j = n
+	while j > 0:
+		ret.append(j)
+		j = brk[j]
+	ret.reverse()
+	return ret
+
+@lru_cache(maxsize=None)
+def _fontMetrics(p_fontkey: tuple) -> TextMetrics:
+	"Measuring instance for font, no cache file: unit size widths only depend on font, measurements are shared per font"
+	family, weight, style = p_fontkey
+	return TextMetrics(family, weight=weight, style=style)
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _paraWords(p_fontkey: tuple, p_para: str) -> Tuple[List[str], List[float]]:
+	"Words of paragraph and their widths at unit font size"
+	metrics = _fontMetrics(p_fontkey)
+	words = p_para.split()
+	return words, [metrics.width(w, size=1) for w in words]
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _maxUnitWidth(p_fontkey: tuple, p_text: str, p_method: Optional[str]) -> float:
+	"Widest line at unit font size, for any max width: only single words overflow wrapped lines"
+	if p_method is None:
+		metrics = _fontMetrics(p_fontkey)
+		return max(metrics.width(para, size=1) for para in p_text.split('\n'))
+	return max([0] + [max(_paraWords(p_fontkey, para)[1], default=0) for para in p_text.split('\n')])
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _wrapUnit(p_fontkey: tuple, p_text: str, p_maxwidth: float, p_method: Optional[str]) -> Tuple[str, ...]:
+	"Lines at unit font size"
+	paras = p_text.split('\n')
+	if p_method is None:
+		return tuple(paras)
+	assert p_method in WRAP_METHODS, f"invalid wrap method '{p_method}', not in {WRAP_METHODS}"
+	breaker = _breakGreedy if p_method == "greedy" else _breakOptimal
+	spacew = _fontMetrics(p_fontkey).width(" ", size=1)
+	ret = []
+	for para in paras:
+		words, widths = _paraWords(p_fontkey, para)
+		if len(words) == 0:
+			ret.append("")
+			continue
+		start = 0
+		for end in breaker(widths, spacew, p_maxwidth):
+			ret.append(" ".join(words[start:end]))
+			start = end
+	return tuple(ret)
+
+def wrapText(p_text: str, p_maxwidth: float, p_metrics: TextMetrics, size: Optional[float] = None, method: Optional[str] = "greedy") -> Tuple[str, ...]:
+	"""Text broken in lines fitting max width, in user units, at font size (defaults to metrics size).
+		method - from WRAP_METHODS, None keeps explicit lines only"""
+	if size is None:
+		size = p_metrics.size
+	return _wrapUnit(p_metrics.fontkey, p_text, p_maxwidth / size, method)
+
+def textBlockHeight(p_linecount: int, p_size: float, vsep="1.2em") -> float:
+	"Height of lines, each advancing vsep, as TextParagraph rows"
+	return p_linecount * fontSizeToVPUnits(fontsize=p_size, possibleEmModifier=vsep)
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _fitText(p_fontkey: tuple, p_text: str, p_maxwidth: float, p_maxheight: float, p_size: float, p_minsize: float,
+		p_vsep, p_method: Optional[str], p_step: float) -> Tuple[float, Tuple[str, ...]]:
+	maxunitw = _maxUnitWidth(p_fontkey, p_text, p_method)
+	def layout(p_k):
+		sz = p_size - p_k * p_step
+		lines = _wrapUnit(p_fontkey, p_text, p_maxwidth / sz, p_method)
+		fits = maxunitw * sz <= p_maxwidth and textBlockHeight(len(lines), sz, vsep=p_vsep) <= p_maxheight
+		return fits, sz, lines
+	# smallest number of steps down that fits, binary search
+	lo = 0
+	hi = max(0, int((p_size - p_minsize) / p_step))
+	fits, sz, lines = layout(lo)
+	if fits:
+		return sz, lines
+	fits, sz, lines = layout(hi)
+	if not fits:
+		return sz, lines
+	while hi - lo > 1:
+		mid = (lo + hi) // 2
+		if layout(mid)[0]:
+			hi = mid
+		else:
+			lo = mid
+	_fits, sz, lines = layout(hi)
+	return sz, lines
+
+def fitText(p_text: str, p_maxwidth: float, p_maxheight: float, p_metrics: TextMetrics, size: Optional[float] = None,
+		minsize: float = 1, vsep="1.2em", method: Optional[str] = "greedy", step: float = FIT_SIZE_STEP) -> Tuple[float, Tuple[str, ...]]:
+	"""Largest font size, from size (defaults to metrics size) down to minsize by step, at which wrapped
+	   text fits max width and height. Returns (font size, lines), minsize layout if nothing fits."""
+	if size is None:
+		size = p_metrics.size
+	return _fitText(p_metrics.fontkey, p_text, p_maxwidth, p_maxheight, size, minsize, vsep, method, step)
@@ -0,0 +1,197 @@
+"""Text measurement: string advance widths from cached per font glyph advances.
+
+   Glyph advances and kerning pair adjustments are measured once by cairo (cairocffi, or pycairo), at a
+   reference size with metrics hinting off so they scale linearly, and kept per font (family, weight,
+   style) in a process wide cache, optionally persisted in a SQLite file. A string width is then the sum
+   of its glyph advances plus pair adjustments, cairo being called only for glyphs and pairs not yet seen.
+   Cairo contexts are reused, one per thread and font.
+
+   Without cairo, widths are estimated from FALLBACK_ADVANCE (not cached on disk).
+"""
+
+from sqlite3 import connect as sqlite_connect
+from threading import Lock, local
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# measuring font size, advances are kept per 1 unit font size
+REFERENCE_SIZE = 100
+# estimated advance, in font size units, when no cairo is available
+FALLBACK_ADVANCE = 0.6
+
+# font key -> (glyph advances, pair kerning adjustments, log of (glyphs, advance) measured or loaded)
+_FONT_CACHES: Dict[tuple, Tuple[Dict[str, float], Dict[str, float], List[tuple]]] = {}
+# (font key, cache file) -> number of font log entries persisted in file
+_PERSISTED: Dict[tuple, int] = {}
+# guards font caches (advances, kerning and logs) updates and persisted counts, reads are lock free
+_CACHE_LOCK = Lock()
+_THREAD_LOCAL = local()
+_backend = None
+
+def _cairo():
+	"cairo module, cairocffi preferred, False if none is available"
+	global _backend
+	if _backend is None:
+		_backend = False
+		for modname in ("cairocffi", "cairo"):
+			try:
+				_backend = __import__(modname)
+				break
+			except (ImportError, OSError):
+				pass
+	return _backend
+
+def _fontKey(p_family: str, p_weight: Union[str, int], p_style: str) -> tuple:
+	if isinstance(p_weight, str):
+		weight = p_weight.lower()
+		if weight.isdigit():
+			weight = int(weight)
+	else:
+		weight = p_weight
+	if isinstance(weight, int):
+		weight = "bold" if weight >= 600 else "normal"
+	elif weight in ("bolder", "bold"):
+		weight = "bold"
+	else:
+		weight = "normal"
+	style = p_style.lower()
+	if not style in ("italic", "oblique"):
+		style = "normal"
+	return (p_family, weight, style)
+
+def _measuringContext(p_fontkey: tuple):
+	"This thread's cairo context set for font, at reference size"
+	contexts = getattr(_THREAD_LOCAL, "contexts", None)
+	if contexts is None:
+		contexts = _THREAD_LOCAL.contexts = {}
+	ctx = contexts.get(p_fontkey)
+	if ctx is None:
+		cairo = _cairo()
+		family, weight, style = p_fontkey
+		ctx = cairo.Context(cairo.ImageSurface(cairo.FORMAT_ARGB32, 1, 1))
+		slant = { "normal": cairo.FONT_SLANT_NORMAL, "italic": cairo.FONT_SLANT_ITALIC, "oblique": cairo.FONT_SLANT_OBLIQUE }[style]
+		ctx.select_font_face(family, slant, cairo.FONT_WEIGHT_BOLD if weight == "bold" else cairo.FONT_WEIGHT_NORMAL)
+		ctx.set_font_size(REFERENCE_SIZE)
+		opts = cairo.FontOptions()
+		opts.set_hint_metrics(cairo.HINT_METRICS_OFF)
+		opts.set_hint_style(cairo.HINT_STYLE_NONE)
+		ctx.set_font_options(opts)
+		contexts[p_fontkey] = ctx
+	return ctx
+
+class TextMetrics(object):
+	"""Text measurement service for one font, see module doc.
+
+	   family, weight, style - as CSS font properties, weight 'bold' (or >= 600) or 'normal'
+	   size - default font size, in user units
+	   cachepath - SQLite file persisting measured advances, shared by fonts and processes"""
+
+	def __init__(self, family: str = "sans-serif", size: float = 14, weight: Union[str, int] = "normal",
+			style: str = "normal", cachepath: Optional[str] = None) -> None:
+		self.fontkey = _fontKey(family, weight, style)
+		self.size = size
+		self.cachepath = cachepath
+		with _CACHE_LOCK:
+			self._advances, self._kerning, self._log = _FONT_CACHES.setdefault(self.fontkey, ({}, {}, []))
+		if not cachepath is None and _cairo():
+			self._loadCache()
+
+	def _fontName(self) -> str:
+		return "|".join(self.fontkey)
+
+	def _loadCache(self) -> None:
+		"Loads advances persisted in cache file, logged for other cache files"
+		with _CACHE_LOCK:
+			key = (self.fontkey, self.cachepath)
+			uptodate = _PERSISTED.get(key, 0) == len(self._log)
+			conn = sqlite_connect(self.cachepath)
+			try:
+				conn.execute("CREATE TABLE IF NOT EXISTS advances (font text, glyphs text, advance real)")
+				conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS advances_index on advances (font, glyphs)")
+				for glyphs, adv in conn.execute("SELECT glyphs, advance FROM advances WHERE font = ?", (self._fontName(),)):
+					cache = self._advances if len(glyphs) == 1 else self._kerning
+					if not glyphs in cache:
+						cache[glyphs] = adv
+						self._log.append((glyphs, adv))
+				conn.commit()
+			finally:
+				conn.close()
+			if uptodate:
+				_PERSISTED[key] = len(self._log)
+
+	def _measureNew(self, p_text: str) -> None:
+		"""Measures glyphs and pairs of text not yet cached. Measured outside of lock, added to font
+		   caches and log under it, unless another thread did it meanwhile"""
+		advances = self._advances
+		kerning = self._kerning
+		if not _cairo():
+			with _CACHE_LOCK:
+				for ch in p_text:
+					advances.setdefault(ch, FALLBACK_ADVANCE)
+				for i in range(len(p_text) - 1):
+					kerning.setdefault(p_text[i:i+2], 0)
+			return
+		ctx = _measuringContext(self.fontkey)
+		newadvances = {}
+		for ch in p_text:
+			if not ch in advances and not ch in newadvances:
+				newadvances[ch] = ctx.text_extents(ch)[4] / REFERENCE_SIZE
+		def advance(p_ch):
+			ret = newadvances.get(p_ch)
+			return advances[p_ch] if ret is None else ret
+		newkerning = {}
+		for i in range(len(p_text) - 1):
+			pair = p_text[i:i+2]
+			if not pair in kerning and not pair in newkerning:
+				adj = ctx.text_extents(pair)[4] / REFERENCE_SIZE - advance(pair[0]) - advance(pair[1])
+				if abs(adj) < 1e-9:
+					adj = 0
+				newkerning[pair] = adj
+		with _CACHE_LOCK:
+			for cache, measured in ((advances, newadvances), (kerning, newkerning)):
+				for glyphs, val in measured.items():
+					if not glyphs in cache:
+						cache[glyphs] = val
+						self._log.append((glyphs, val))
+
+	def width(self, p_text: str, size: Optional[float] = None) -> float:
+		"Advance width of text, in user units, at given or default font size"
+		if size is None:
+			size = self.size
+		advances = self._advances
+		kerning = self._kerning
+		try:
+			total = sum(advances[ch] for ch in p_text)
+			if len(p_text) > 1:
+				total += sum(kerning[p_text[i:i+2]] for i in range(len(p_text) - 1))
+		except KeyError:
+			self._measureNew(p_text)
+			return self.width(p_text, size=size)
+		return total * size
+
+	def measure(self, p_strings: Iterable[str], size: Optional[float] = None) -> List[float]:
+		"Advance widths of strings, new measurements persisted at end (see flush)"
+		ret = [self.width(s, size=size) for s in p_strings]
+		self.flush()
+		return ret
+
+	def flush(self) -> None:
+		"Writes font measurements not yet persisted to cache file, by any instance, if any"
+		if self.cachepath is None:
+			return
+		with _CACHE_LOCK:
+			key = (self.fontkey, self.cachepath)
+			start = _PERSISTED.get(key, 0)
+			if start == len(self._log):
+				return
+			pending = self._log[start:]
+			conn = sqlite_connect(self.cachepath)
+			try:
+				conn.execute("CREATE TABLE IF NOT EXISTS advances (font text, glyphs text, advance real)")
+				conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS advances_index on advances (font, glyphs)")
+				fontname = self._fontName()
+				conn.executemany("INSERT OR REPLACE INTO advances (font, glyphs, advance) VALUES (?, ?, ?)",
+					[(fontname, glyphs, adv) for glyphs, adv in pending])
+				conn.commit()
+			finally:
+				conn.close()
+			_PERSISTED[key] = start + len(pending)
@@ -0,0 +1,150 @@
+
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil
+from os import makedirs
+from os.path import join as path_join
+from sqlite3 import connect as sqlite_connect
+from typing import Iterable, List, Optional, Tuple, Union
+
+from lxml import etree
+
+from rpSVG.Basics import Env
+from rpSVG.SpatialIndex import toBounds
+from rpSVG.SVGLib import SVGContent, SVGCuller
+
+TILE_CHUNK_SIZE = 32
+
+def tileBounds(p_extent, z: int, x: int, y: int):
+	"""Bounds of tile z/x/y: zoom level z splits extent larger dimension in 2^z square tiles,
+	   starting at extent top-left corner (y grows downwards, as in SVG)"""
+	minx, miny, maxx, maxy = p_extent
+	size = max(maxx - minx, maxy - miny) / (2 ** z)
+	return (minx + x * size, miny + y * size, minx + (x + 1) * size, miny + (y + 1) * size)
+
+def _tileBytes(p_culler: SVGCuller, p_params: tuple, z: int, x: int, y: int) -> Optional[bytes]:
+	extent, tilesize, margin, clip, simplify, simplify_method, skip_empty = p_params
+	bounds = tileBounds(extent, z, x, y)
+	# user units per tile pixel, at this zoom level
+	upp = (bounds[2] - bounds[0]) / tilesize
+	if simplify is None:
+		tol = None
+	else:
+		tol = simplify * upp
+	rootel = p_culler.cull(bounds, margin=margin * upp, clip=clip, simplify=tol, simplify_method=simplify_method, empty_as_none=skip_empty)
+	if rootel is None:
+		return None
+	rootel.set("width", str(tilesize))
+	rootel.set("height", str(tilesize))
+	return etree.tostring(rootel, encoding='utf-8')
+
+# Process pool workers state
+
+_worker_culler = None
+_worker_params = None
+
+def _initTileWorker(p_bytes: bytes, p_planlist: list, p_params: tuple) -> None:
+	global _worker_culler, _worker_params
+	_worker_culler = SVGCuller.fromSerialized(p_bytes, p_planlist)
+	_worker_params = p_params
+
+def _renderTileChunk(p_tiles: List[Tuple[int, int, int]]):
+	return [(z, x, y, _tileBytes(_worker_culler, _worker_params, z, x, y)) for z, x, y in p_tiles]
+
+class SVGTiler(object):
+	"""Splits SVGContent in a z/x/y pyramid of square tile documents (see tileBounds), each with 
+	   its own viewBox, only the intersecting elements and the defs and style rules they need (see SVGCuller).
+
+	   extent - area to split, Env or (minx, miny, maxx, maxy), defaults to content viewbox (or rect)
+	   tilesize - tile width and height, in pixels
+	   margin, simplify - in tile pixels, margin around tiles and polyline / polygon simplification tolerance
+	   skip_empty - tiles left with no elements are not output
+
+	   Tiles can be rendered in a pool of worker processes, which receive the serialized document and 
+	   culling plan once, at startup."""
+
+	def __init__(self, p_content: SVGContent, minzoom: int = 0, maxzoom: int = 4, tilesize: int = 256,
+			extent: Optional[Union[Env, tuple]] = None, margin: float = 0, clip=True,
+			simplify: Optional[float] = None, simplify_method="dp", skip_empty=True) -> None:
+		assert 0 <= minzoom <= maxzoom
+		self.minzoom = minzoom
+		self.maxzoom = maxzoom
+		if extent is None:
+			vbvals = p_content.getViewbox().getValues()
+			if len(vbvals) < 4:
+				vbvals = p_content.getStruct().getValues()
+			extent = (vbvals[0], vbvals[1], vbvals[0] + vbvals[2], vbvals[1] + vbvals[3])
+		self.extent = toBounds(extent)
+		self._culler = SVGCuller(p_content)
+		self._params = (self.extent, tilesize, margin, clip, simplify, simplify_method, skip_empty)
+
+	def tileCounts(self, z: int):
+		"Number of tile columns and rows at zoom level z"
+		minx, miny, maxx, maxy = self.extent
+		size = max(maxx - minx, maxy - miny) / (2 ** z)
+		return max(1, ceil((maxx - minx) / size)), max(1, ceil((maxy - miny) / size))
+
+	def iterTiles(self) -> Iterable[Tuple[int, int, int]]:
+		for z in range(self.minzoom, self.maxzoom + 1):
+			cols, rows = self.tileCounts(z)
+			for x in range(cols):
+				for y in range(rows):
+					yield z, x, y
+
+	def renderTile(self, z: int, x: int, y: int) -> Optional[bytes]:
+		"Tile document bytes, None if empty and skip_empty is set"
+		return _tileBytes(self._culler, self._params, z, x, y)
+
+	def iterRendered(self, workers: Optional[int] = None, chunksize: int = TILE_CHUNK_SIZE):
+		"""Yields (z, x, y, bytes) for all non skipped tiles.
+			workers - number of worker processes, if None or 1 tiles are rendered in this process"""
+		if workers is None or workers <= 1:
+			for z, x, y in self.iterTiles():
+				data = self.renderTile(z, x, y)
+				if not data is None:
+					yield z, x, y, data
+		else:
+			tiles = list(self.iterTiles())
+			chunks = [tiles[i:i+chunksize] for i in range(0, len(tiles), chunksize)]
+			docbytes, planlist = self._culler.serialize()
+			with ProcessPoolExecutor(max_workers=workers, initializer=_initTileWorker, initargs=(docbytes, planlist, self._params)) as executor:
+				for results in executor.map(_renderTileChunk, chunks):
+					for z, x, y, data in results:
+						if not data is None:
+							yield z, x, y, data
+
+	def writeDir(self, p_path: str, workers: Optional[int] = None) -> int:
+		"Writes tiles as p_path/z/x/y.svg files, returns number of tiles written"
+		count = 0
+		for z, x, y, data in self.iterRendered(workers=workers):
+			tiledir = path_join(p_path, str(z), str(x))
+			makedirs(tiledir, exist_ok=True)
+			with open(path_join(tiledir, f"{y}.svg"), "wb") as fl:
+				fl.write(data)
+			count += 1
+		return count
+
+	def writeMBTiles(self, p_path: str, workers: Optional[int] = None, name: str = "rpSVG tiles") -> int:
+		"""Writes tiles in SQLite file following MBTiles layout (metadata and tiles tables, 
+		   tile_row numbered from bottom, as TMS), format 'svg'. Returns number of tiles written"""
+		count = 0
+		conn = sqlite_connect(p_path)
+		try:
+			conn.execute("CREATE TABLE IF NOT EXISTS metadata (name text, value text)")
+			conn.execute("CREATE TABLE IF NOT EXISTS tiles (zoom_level integer, tile_column integer, tile_row integer, tile_data blob)")
+			conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS tile_index on tiles (zoom_level, tile_column, tile_row)")
+			conn.execute("DELETE FROM metadata")
+			conn.executemany("INSERT INTO metadata (name, value) VALUES (?, ?)", [
+				("name", name),
+				("format", "svg"),
+				("minzoom", str(self.minzoom)),
+				("maxzoom", str(self.maxzoom)),
+				("bounds", " ".join(str(v) for v in self.extent))
+			])
+			for z, x, y, data in self.iterRendered(workers=workers):
+				conn.execute("INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)",
+					(z, x, (2 ** z) - 1 - y, data))
+				count += 1
+			conn.commit()
+		finally:
+			conn.close()
+		return count
@@ -1,13 +1,10 @@
+from rpSVG.TextMetrics import TextMetrics
 
+_metrics = None
 
 def textwidth(text, fontsize=14):
-    try:
-        import cairo
-    except Exception as e:
-        return len(str) * fontsize
-    surface = cairo.SVGSurface('undefined.svg', 1280, 200)
-    cr = cairo.Context(surface)
-    cr.select_font_face('Arial', cairo.FONT_SLANT_NORMAL, cairo.FONT_WEIGHT_BOLD)
-    cr.set_font_size(fontsize)
-    xbearing, ybearing, width, height, xadvance, yadvance = cr.text_extents(text)
-    return width
\ No newline at end of file
+    "Advance width of text in Arial Bold, see TextMetrics"
+    global _metrics
+    if _metrics is None:
+        _metrics = TextMetrics("Arial", weight="bold")
+    return _metrics.width(text, size=fontsize)
@@ -0,0 +1,55 @@
+
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, Iterable
+
+EXPORT_FORMATS = ("svg", "png", "pdf", "ps")
+
+def pngScaleKey(p_scale: float) -> str:
+	"Output key of extra PNG scale, ex: 'png@2x'"
+	return f"png@{p_scale:g}x"
+
+def exportSVGBytes(p_svgbytes: bytes, formats: Iterable[str] = ("svg",), pngscales: Iterable[float] = (), dpi: float = 96,
+		scale: float = 1, unsafe=False, **surfopts) -> Dict[str, bytes]:
+	"""SVG bytes, serialized once, rendered to several formats. Each cairosvg surface is drawn from its own
+	   parsed Tree: drawing alters the tree (patterns, masks, use elements), a tree is not reused.
+	   Returns output key -> bytes, keys are formats plus one per extra PNG scale (see pngScaleKey).
+		pngscales - extra PNG outputs scales (ex: thumbnails, retina)
+		surfopts - other cairosvg surface arguments (ex: background_color, output_width)"""
+	formats = tuple(formats)
+	for fmt in formats:
+		assert fmt in EXPORT_FORMATS, f"invalid format '{fmt}', not in {EXPORT_FORMATS}"
+	ret = {}
+	if "svg" in formats:
+		ret["svg"] = p_svgbytes
+	jobs = [(fmt, fmt, scale) for fmt in formats if fmt != "svg"]
+	jobs.extend((pngScaleKey(sc), "png", sc) for sc in pngscales)
+	if len(jobs) == 0:
+		return ret
+	from cairosvg import surface
+	from cairosvg.parser import Tree
+	classes = { "png": surface.PNGSurface, "pdf": surface.PDFSurface, "ps": surface.PSSurface }
+	for key, fmt, sc in jobs:
+		out = BytesIO()
+		classes[fmt](Tree(bytestring=p_svgbytes, unsafe=unsafe), out, dpi, scale=sc, **surfopts).finish()
+		ret[key] = out.getvalue()
+	return ret
+
+def _writeOutput(p_dest, p_data: bytes) -> None:
+	if hasattr(p_dest, 'write'):
+		p_dest.write(p_data)
+	else:
+		with open(p_dest, 'wb') as fl:
+			fl.write(p_data)
+
+def writeOutputs(p_outputs: Dict[str, bytes], p_writeto: dict) -> None:
+	"Write outputs (as from exportSVGBytes) to destinations, key -> file name or object, in parallel"
+	missing = [key for key in p_writeto.keys() if not key in p_outputs]
+	assert len(missing) == 0, f"no output for {missing}"
+	if len(p_writeto) < 2:
+		for key, dest in p_writeto.items():
+			_writeOutput(dest, p_outputs[key])
+		return
+	with ThreadPoolExecutor(max_workers=len(p_writeto)) as executor:
+		for fut in [executor.submit(_writeOutput, dest, p_outputs[key]) for key, dest in p_writeto.items()]:
+			fut.result()
@@ -0,0 +1,1011 @@
+import pytest
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+import gc
+from io import BytesIO
+import sqlite3
+from time import sleep
+import weakref
+
+from lxml import etree
+
+from rpSVG.Basics import GLOBAL_ENV, Env, Mat, PathCmdBuffer, Pt, RoundContext, Rotate, Trans, ValueWithUnitsError, getRoundContext, glRd, pA, pClose, pH, pL, pM, getUnit, roundingContext, strictToNumber, strictToNumbers, toNumberAndUnit, toNumbersAndUnits
+from rpSVG.Constructs import TextBox
+from rpSVG.Batch import BatchJobTimeout, BatchRenderer
+from rpSVG.CairoRender import CairoRenderer, parseTransform
+from rpSVG.MultipagePDF import MultipagePDFWriter, writeMultipagePDF
+from rpSVG.Geometry import polylineSimplify, polylineSimplifyDP, polylineSimplifyVW, sharedVertices
+from rpSVG.Structs import Cir, Re, VBox
+from rpSVG.SVGLib import AnalyticalPath, Circle, GradientStop, Group, LinearGradient, Pattern, Polygon, Polyline, Rect, SVGContent, Symbol, Text, Use
+from rpSVG.Patching import applyPatch, diff, snapshot
+from rpSVG.Sharding import ShardGroup, ShardedBuilder
+from rpSVG.SVGStyleText import CSSSty, Sty
+from rpSVG.Templates import SVGTemplate
+from rpSVG.TextLayout import fitText, textBlockHeight, wrapText
+from rpSVG.TextMetrics import TextMetrics
+from rpSVG.Tiling import SVGTiler, tileBounds
+
+def buildSimpleContent(sc):
+	sc.addStyleRule(CSSSty('fill', 'red', selector='.a'))
+	for i in range(3):
+		g = sc.addChild(Group()).setClass('a')
+		g.addChild(Rect(i, i, 10, 10)).setStyle(Sty('stroke', 'blue'))
+		g.addChild(Circle(i, i, 5))
+	sc.addChild(Text(1, 2)).setText("ola")
+	return sc
+
+def test_08Streaming():
+
+	sc = buildSimpleContent(SVGContent(Re(0,0,100,100)).setIdentityViewbox())
+	ref = sc.toBytes(pretty_print=False, inc_declaration=True)
+
+	sc2 = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	outb = BytesIO()
+	with sc2.streamTo(outb, pretty_print=False, inc_declaration=True):
+		buildSimpleContent(sc2)
+		# only last top-level child (and defs) still in memory
+		assert len(sc2.content) == 2
+	assert not sc2.isStreaming()
+	assert [c.tag for c in sc2.content] == ['defs']
+	assert outb.getvalue() == ref
+
+	sc3 = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	outb = BytesIO()
+	with sc3.streamTo(outb, pretty_print=False):
+		g = sc3.addChild(Group())
+		g.addChild(Circle(1, 1, 5))
+		# style rules added after first flush go to a new 'defs' element, written ahead of pending children
+		sc3.addStyleRule(CSSSty('stroke', 'green', selector='circle'))
+		sc3.addChild(Circle(2, 2, 5))
+	assert outb.getvalue() == b'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" x="0" y="0" width="100" height="100" viewBox="0 0 100 100"><defs><style type="text/css"><![CDATA[circle {\n\tfill: none;\n\tstroke: green;\n}]]></style></defs><g id="G0"><circle cx="1" cy="1" r="5" id="Cir1"/></g><circle cx="2" cy="2" r="5" id="Cir2"/></svg>'
+
+def test_08TypedStructValues():
+
+	reo = Re(1, 2.5, "200", "1.50")
+	assert reo.getNum("x") == 1 and reo.getNum("y") == 2.5
+	assert reo.getNumAndUnit("width") == (200, None)
+	# string parsed once, replaced by typed value as it formats back to the same text
+	assert reo.isSet("width") and not isinstance(reo._vals["width"], str)
+	# not formatting back to same text, text is kept
+	assert reo.getNum("height") == 1.5
+	assert reo.height == "1.50"
+	assert str(reo) == "Re x=1 y=2.5 width=200 height=1.50"
+
+	reo.setUnits('px')
+	assert reo.getNumAndUnit("x") == (1, "px")
+	assert reo.x == "1px"
+	with pytest.raises(ValueWithUnitsError):
+		reo.getNum("x")
+
+	cir = Cir(10, 20, 5)
+	cir.yinvert(100)
+	assert cir.getNum("cy") == 80
+	assert cir.cy == "80"
+
+def test_08NumberParsing():
+
+	assert toNumberAndUnit("14px") == (14, "px")
+	assert toNumberAndUnit("1.2em") == (1.2, "em")
+	assert toNumberAndUnit("-.5") == (-0.5, None)
+	assert toNumberAndUnit("50%") == (50, "%")
+	# exponent notation
+	assert toNumberAndUnit("1e3") == (1000, None)
+	assert toNumberAndUnit("2.5E-2mm") == (0.025, "mm")
+	assert toNumberAndUnit(1e-05) == (1e-05, None)
+	assert strictToNumber("-3.0") == -3
+	with pytest.raises(ValueWithUnitsError):
+		strictToNumber("12pt")
+	with pytest.raises(ValueError):
+		toNumberAndUnit("1.2.3")
+	assert getUnit("12pt") == "pt"
+	# not validated, all non numeric characters
+	assert getUnit("12") is None and getUnit(12) is None and getUnit("") is None
+	assert getUnit("1e3") == "e" and getUnit("1.5 px") == " px" and getUnit("abc") == "abc"
+	assert toNumbersAndUnits("0 0,600 800.5") == [(0, None), (0, None), (600, None), (800.5, None)]
+	assert strictToNumbers(["1", 2.0, "3e1"]) == [1, 2, 30]
+
+def test_08PathCmdBuffer():
+
+	buf = PathCmdBuffer()
+	buf.append('m', [1, 2])
+	buf.append('l', [3, -4])
+	buf.append('l', [5.5, 6])
+	buf.append('H', [10])
+	buf.insert(1, 'L', [0, 0])
+	assert buf.toD() == "M1 2 0 0l3-4 5.5 6H10"
+	# written absolute, buffer command kept relative
+	assert buf.getCmd(0).get() == "m1 2"
+	buf.delete(1)
+	assert buf.toD() == "M1 2l3-4 5.5 6H10"
+	assert buf.getArgs(-1) == [10]
+	assert buf.getCmd(2).get() == "l5.5 6"
+	buf.extend("", [])
+	buf.extend("lv", [1, 2, float("nan")])
+	assert buf.toD() == "M1 2l3-4 5.5 6H10l1 2vnan"
+	assert len(buf.offsets) == len(buf) == 6
+
+	sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	ap = sc.addChild(AnalyticalPath())
+	for i in range(3):
+		ap.addCmd(pM(i*10, 0))
+		ap.addCmd(pL(5, 5, relative=True))
+		ap.addCmd(pH(-5, relative=True))
+		ap.addCmd(pClose())
+	# 'd' only rebuilt when needed
+	assert ap.getEl().get('d') == ""
+	assert ap.getStruct().d == "M0 0l5 5h-5zM10 0l5 5h-5zM20 0l5 5h-5z"
+	ap.delCmd(0)
+	ap.insCmd(0, pM(1, 1))
+	assert b'd="M1 1l5 5h-5z' in sc.toBytes()
+
+	ap2 = sc.addChild(AnalyticalPath())
+	ap2.addPolylinePList([Pt(0,0), Pt(10,0), Pt(10,10), Pt(0,0)])
+	assert ap2.getStruct().d == "M0 0h10v10z"
+
+def test_08ArrayIngest():
+
+	pts = [Pt(0,0), Pt(10,0), Pt(10,0), Pt(10,10.5), Pt(2,3), Pt(0,0)]
+	flat = array('d', [c for pt in pts for c in pt])
+
+	ap = AnalyticalPath()
+	ap.addPolylinePList(pts)
+	ap2 = AnalyticalPath()
+	ap2.addPolylineArray(flat)
+	assert ap2.getStruct().d == ap.getStruct().d == "M0 0h10v10.5L2 3z"
+
+	# 2-dimensional buffers are accepted too
+	mv2d = memoryview(flat).cast('B').cast('d', shape=[len(pts), 2])
+	ap3 = AnalyticalPath()
+	ap3.addPolylineArray(mv2d)
+	assert ap3.getStruct().d == ap.getStruct().d
+
+	sc = SVGContent(Re(0,0,100,100), yinvert=True).setIdentityViewbox()
+	pg = sc.addChild(Polygon())
+	pg.addPArray(flat)
+	assert pg.getStruct().points == "0,100 10,100 10,89.5 2,97"
+	pl = sc.addChild(Polyline())
+	pl.addPList(pts)
+	pl2 = sc.addChild(Polyline())
+	pl2.addPArray(array('f', flat))
+	# besides closing point, repeated consecutive points are also removed
+	assert pl2.getStruct().points == "0,100 10,100 10,89.5 2,97 0,100"
+	assert pl.getStruct().points == "0,100 10,100 10,100 10,89.5 2,97 0,100"
+
+	# numpy fast path, same output as point by point path
+	np = pytest.importorskip("numpy")
+	import rpSVG.Basics
+	walk = np.round(np.cumsum(np.sin(np.arange(400.0)).reshape(200, 2), axis=0), 1)
+	walk[1::9] = walk[0:-1:9]
+	walk[-1] = walk[0]
+	outs = []
+	for numpymod in (None, False):
+		rpSVG.Basics._numpy_mod = numpymod
+		ap = AnalyticalPath()
+		ap.addPolylineArray(walk)
+		pg = Polygon()
+		pg.addPArray(walk, mindelta=0.15)
+		outs.append((ap.getStruct().d, pg.getStruct().points))
+	rpSVG.Basics._numpy_mod = None
+	assert outs[0] == outs[1]
+
+def test_08Simplification():
+
+	# zigzag, amplitude 0.2, around a straight line
+	xs = [float(i) for i in range(101)]
+	ys = [0.2 * (i % 2) for i in range(101)]
+	assert polylineSimplifyDP(xs, ys, 0.5) == [0, 100]
+	# triangle area threshold is tolerance squared
+	assert polylineSimplifyVW(xs, ys, 4) == [0, 100]
+	assert len(polylineSimplifyDP(xs, ys, 0.1)) == 101
+	assert polylineSimplifyDP(xs, ys, 0.5, keep={50}) == [0, 50, 100]
+	assert polylineSimplifyVW(xs, ys, 4, keep={50}) == [0, 50, 100]
+
+	rings = [[Pt(0,0), Pt(1,0), Pt(1,1), Pt(0,0)], [Pt(1,0), Pt(2,0), Pt(1,1), Pt(1,0)]]
+	assert sharedVertices(rings) == [{1, 2}, {0, 2, 3}]
+
+	pts = [Pt(x, y) for x, y in zip(xs, ys)]
+	# viewbox 10 times larger than output size: 1 pixel is 10 user units
+	sc = SVGContent(Re(0,0,20,20), viewbox=VBox(0,0,200,200))
+	g = sc.addChild(Group())
+	pl = g.addChild(Polyline())
+	assert pl.getUnitsPerPixel() == 10
+	pl.addPList(pts, simplify=0.05)
+	assert pl.getStruct().points == "0,0 100,0"
+	pl2 = g.addChild(Polyline())
+	pl2.addPArray(array('d', [c for pt in pts for c in pt]), simplify=0.01)
+	assert len(pl2.getStruct().points.split()) == 101
+	ap = g.addChild(AnalyticalPath())
+	ap.addPolylinePList(pts, simplify=0.4, simplify_method="vw", keep={50})
+	assert ap.getStruct().d == "M0 0h50 50"
+
+	# numpy arrays simplified vectorized, same kept vertices
+	np = pytest.importorskip("numpy")
+	import rpSVG.Basics
+	walk = np.cumsum(np.sin(np.arange(2000.0)).reshape(1000, 2), axis=0)
+	for method in ("dp", "vw"):
+		assert polylineSimplify(walk[:,0], walk[:,1], 0.8, method=method, keep=[500]) == polylineSimplify(walk[:,0].tolist(), walk[:,1].tolist(), 0.8, method=method, keep=[500])
+		outs = []
+		for numpymod in (None, False):
+			rpSVG.Basics._numpy_mod = numpymod
+			pl3 = g.addChild(Polyline())
+			pl3.addPArray(walk, simplify=0.3, simplify_method=method)
+			outs.append(pl3.getStruct().points)
+		rpSVG.Basics._numpy_mod = None
+		assert outs[0] == outs[1] and len(outs[0].split()) < 1000
+
+def test_08SpatialIndex():
+
+	sc = SVGContent(Re(0,0,1000,1000)).setIdentityViewbox()
+	idx = sc.enableSpatialIndex()
+	# defs content is not indexed
+	sc.addChild(Circle(50, 50, 10), todefs=True)
+	circles = []
+	for i in range(10):
+		for j in range(10):
+			circles.append(sc.addChild(Circle(i*100+50, j*100+50, 10)))
+	g = sc.addChild(Group())
+	g.addTransform(Trans(500, 0))
+	r = g.addChild(Rect(0, 0, 20, 20))
+	ap = g.addChild(AnalyticalPath())
+	ap.addCmd(pM(100, 100))
+	ap.addCmd(pL(50, 50, relative=True))
+	assert len(idx) == 102
+
+	assert idx.getBounds(r) == (500, 0, 520, 20)
+	assert r.getEnvelope().getWidth() == 20
+	assert idx.query(Env(0, 0, 100, 100)) == [circles[0]]
+	assert idx.query((40, 40, 160, 160)) == [circles[0], circles[1], circles[10], circles[11]]
+	assert idx.hit(Pt(555, 55)) == [circles[50]]
+	assert idx.hit(Pt(510, 10)) == [r]
+	assert idx.hit(Pt(625, 125)) == [ap]
+	assert idx.hit(Pt(1, 1)) == []
+	assert idx.nearest(Pt(5, 5)) is circles[0]
+	assert idx.nearest(Pt(5, 5), maxdist=10) is None
+	# far from grid extent: no walk through empty rings
+	far = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	faridx = far.enableSpatialIndex()
+	farcircs = [far.addChild(Circle(10*i+5, 10*i+5, 2)) for i in range(10)]
+	assert faridx.nearest(Pt(20000, 20000)) is farcircs[-1]
+	assert faridx.nearest(Pt(-3000, -3000)) is farcircs[0]
+	assert faridx.nearest(Pt(20000, 20000), maxdist=100) is None
+	# sparse grid, many empty rings around point
+	farcircs.append(far.addChild(Circle(50000, 50000, 2)))
+	assert faridx.nearest(Pt(30000, 30000)) is farcircs[-1]
+	assert faridx.nearest(Pt(20000, 20000)) is farcircs[-2]
+
+	# changes are tracked
+	g.clearTransforms()
+	assert idx.hit(Pt(510, 10)) == []
+	assert idx.hit(Pt(10, 10)) == [r]
+	ap.addCmd(pL(300, 300))
+	assert ap in idx.query((290, 290, 300, 300))
+	circles[0].setStructAttr('r', 50)
+	assert idx.hit(Pt(80, 80)) == [circles[0]]
+	# inside bounds, outside circle
+	assert idx.hit(Pt(95, 95)) == []
+	circles[0].delEl()
+	assert idx.hit(Pt(50, 50)) == []
+	assert len(idx) == 101
+
+	# exact geometry: strokes within tolerance (plus half stroke width), filled areas
+	sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	idx = sc.enableSpatialIndex()
+	ring = sc.addChild(Circle(50, 50, 20)).setStyle(Sty('fill', 'none', 'stroke', 'black', 'stroke-width', 4))
+	pl = sc.addChild(Polyline()).setStyle(Sty('fill', 'none'))
+	pl.addPList([Pt(0, 0), Pt(100, 0), Pt(100, 100)])
+	pg = sc.addChild(Polygon())
+	pg.addPList([Pt(0, 100), Pt(40, 100), Pt(0, 60)])
+	arc = sc.addChild(AnalyticalPath())
+	arc.addCmd(pM(60, 90))
+	arc.addCmd(pA(10, 10, 0, 0, 1, 80, 90))
+	arc.setStyle(Sty('fill', 'none', 'stroke', 'red'))
+	assert idx.hit(Pt(50, 50)) == []
+	assert idx.hit(Pt(50, 31)) == [ring]
+	assert idx.hit(Pt(50, 33.5)) == []
+	assert idx.hit(Pt(50, 33.5), tolerance=2) == [ring]
+	assert idx.hit(Pt(60, 1)) == []
+	assert idx.hit(Pt(60, 1), tolerance=1) == [pl]
+	assert idx.hit(Pt(10, 95)) == [pg]
+	assert idx.hit(Pt(35, 70)) == []
+	assert idx.hit(Pt(70, 80)) == [arc]
+	assert idx.hit(Pt(70, 99)) == []
+
+def test_08Culling():
+
+	def build(sc):
+		sc.addStyleRule(CSSSty('stroke', 'blue', selector='.a'))
+		grad = sc.addChild(LinearGradient(0, 0, 1, 0), todefs=True).setId('gr')
+		grad.addChild(GradientStop(0, 'red'))
+		sc.addChild(Circle(0, 0, 5), todefs=True).setId('unused')
+		for i in range(10):
+			sc.addChild(Circle(i*100+50, 50, 10)).setStyle(Sty('fill', 'url(#gr)'))
+		g = sc.addChild(Group())
+		g.addTransform(Trans(0, 500))
+		g.addChild(Rect(900, 0, 20, 20))
+		pl = sc.addChild(Polyline())
+		pl.addPList([Pt(0, 200), Pt(300, 200), Pt(300, 300), Pt(0, 300)])
+		pg = sc.addChild(Polygon())
+		pg.addPList([Pt(150, 400), Pt(250, 400), Pt(250, 450), Pt(150, 450)])
+		return sc
+
+	sc = build(SVGContent(Re(0,0,1000,1000)).setIdentityViewbox())
+	before = sc.toBytes()
+	out = sc.toBytesCulled((0, 0, 200, 200), pretty_print=False)
+	assert sc.toBytes() == before
+	assert b'viewBox="0 0 200 200"' in out
+	assert out.count(b'<circle') == 2
+	assert b'id="gr"' in out and b'id="unused"' not in out
+	assert b'<rect' not in out
+	assert b'<polyline' in out and b'<polygon' not in out
+
+	out = sc.toBytesCulled(Env(100, 150, 260, 420), clip=True, pretty_print=False)
+	assert b'<circle' not in out and b'<linearGradient' not in out
+	assert b'points="100,200 260,200"' in out
+	assert b'<polyline points="260,300 100,300"/>' in out
+	assert b'points="150,420 150,400 250,400 250,420"' in out
+
+	# group transform is taken into account
+	out = sc.toBytesCulled((800, 400, 1000, 600), pretty_print=False)
+	assert b'<g id="G12" transform="translate(0,500)"><rect x="900"' in out
+
+	# matrix transform
+	scm = SVGContent(Re(0,0,1000,1000)).setIdentityViewbox()
+	gm = scm.addChild(Group())
+	gm.addTransform(Mat(2, 0, 0, 2, 600, 0))
+	gm.addChild(Rect(0, 0, 10, 10))
+	gm.addChild(Circle(10, 300, 5))
+	assert Mat(1, 2, 3, 4, 5, 6).getMatrix() == (1, 2, 3, 4, 5, 6)
+	out = scm.toBytesCulled((550, 0, 650, 100), pretty_print=False)
+	assert b'<rect' in out and b'<circle' not in out
+	assert scm.toBytesCulled((0, 0, 500, 500), pretty_print=False).count(b'<rect') == 0
+
+	# same output using spatial index
+	sc2 = build(SVGContent(Re(0,0,1000,1000)).setIdentityViewbox())
+	sc2.enableSpatialIndex()
+	assert sc2.toBytesCulled(Env(100, 150, 260, 420), clip=True) == sc.toBytesCulled(Env(100, 150, 260, 420), clip=True)
+
+def test_08Tiling(tmp_path):
+
+	sc = SVGContent(Re(0,0,1000,1000)).setIdentityViewbox()
+	sc.addStyleRule(CSSSty('stroke', 'blue', selector='circle'))
+	for i in range(4):
+		sc.addChild(Circle(i*250+125, 125, 10))
+	pl = sc.addChild(Polyline())
+	pl.addPList([Pt(x, 600 + (x % 2)) for x in range(0, 1001, 5)])
+
+	tiler = SVGTiler(sc, maxzoom=2, tilesize=100, simplify=1)
+	assert tileBounds(tiler.extent, 1, 1, 0) == (500, 0, 1000, 500)
+	assert len(list(tiler.iterTiles())) == 1 + 4 + 16
+	tile = tiler.renderTile(2, 1, 0)
+	assert b'viewBox="250 0 250 250"' in tile and b'width="100"' in tile
+	assert tile.count(b'<circle') == 1 and b'circle {' in tile
+	assert tiler.renderTile(2, 0, 3) is None
+	# polyline clipped and simplified: 1 unit zigzag below tolerance at zoom 0 (10 units per pixel)
+	assert b'points="0,600 1000,600"' in tiler.renderTile(0, 0, 0)
+
+	assert tiler.writeDir(str(tmp_path / "tiles")) == 1 + 4 + 8
+	assert (tmp_path / "tiles" / "2" / "1" / "0.svg").read_bytes() == tile
+
+	dbpath = str(tmp_path / "tiles.mbtiles")
+	assert tiler.writeMBTiles(dbpath, workers=2) == 13
+	conn = sqlite3.connect(dbpath)
+	assert conn.execute("SELECT tile_data FROM tiles WHERE zoom_level=2 AND tile_column=1 AND tile_row=3").fetchone()[0] == tile
+	conn.close()
+
+def test_08StyleDedup(monkeypatch):
+
+	def build():
+		sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+		sc.addStyleRule(CSSSty('stroke-width', '2', selector='.a'))
+		for i in range(10):
+			sc.addChild(Circle(i, i, 5)).setStyle(Sty('fill', 'red', 'stroke', 'blue'))
+		sc.addChild(Rect(0, 0, 5, 5)).setStyle(Sty('stroke', 'green')).setClass('a')
+		sc.addChild(Rect(5, 5, 5, 5)).setStyle(Sty('stroke', 'green')).setClass('a')
+		sc.addChild(Rect(10, 10, 5, 5)).setStyle(Sty('fill', 'black'))
+		return sc
+
+	sc = build()
+	ref = sc.toBytes()
+	sc.setStyleDedup(threshold=2)
+	out = sc.toBytes()
+	assert len(out) < len(ref)
+	txt = out.decode('utf-8')
+	assert txt.count('class="sty0"') == 10
+	assert txt.count('class="a sty1"') == 2
+	assert txt.count('stroke="blue"') == 0
+	assert 'fill="black"' in txt
+	# generated rules first, user rules last
+	assert txt.index('.sty0 {') < txt.index('.sty1 {') < txt.index('.a {')
+	assert 'fill: none;' in txt and txt.count('fill: red;') == 1
+
+	# document itself is unchanged, even while serializing or if serialization fails
+	live = sc.content[-2].getEl()
+	tostring = etree.tostring
+	def failingToString(*args, **kwargs):
+		assert live.get('stroke') == 'green' and live.get('class') == 'a'
+		raise RuntimeError("write failed")
+	monkeypatch.setattr(etree, "tostring", failingToString)
+	with pytest.raises(RuntimeError):
+		sc.toBytes()
+	monkeypatch.setattr(etree, "tostring", tostring)
+	sc.setStyleDedup(None)
+	assert sc.toBytes() == ref
+
+	scd = build()
+	scd.setStyleDedup(threshold=20)
+	assert scd.toBytes() == ref
+
+def test_08StyHashing():
+	a = Sty('stroke', 'red', 'stroke-width', 2)
+	b = Sty('stroke-width', '2', 'stroke', 'red')
+	assert a == b and hash(a) == hash(b)
+	assert getattr(a, 'stroke-width') == '2' and a.fill == 'none'
+	assert a.getStyleAttrs() == ['fill', 'stroke', 'stroke-width']
+	assert { a: 1 }[b] == 1
+
+	c = CSSSty('stroke', 'red', 'stroke-width', 2, selector='.c')
+	assert c != a and a != c
+	assert c.isSimilarTo(CSSSty('stroke', 'red', 'stroke-width', 2, selector='.d'))
+	assert hash(c) != hash(CSSSty('stroke', 'red', 'stroke-width', 2, selector='.d'))
+
+	# mutation changes hash and equality
+	h = hash(a)
+	a.set('stroke', 'blue')
+	assert hash(a) != h and a != b
+	del a.fill
+	assert a.toDict() == {'stroke': 'blue', 'stroke-width': '2'}
+	with pytest.raises(AttributeError):
+		a.foo = 1
+
+	i1 = Sty('fill', 'red').intern()
+	i2 = Sty('fill', 'red').intern()
+	assert i1 is i2
+	assert not Sty('fill', 'green').intern() is i1
+
+def test_08StyleCache():
+	sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	sc.addChild(Rect(0, 0, 5, 5)).setClass('a')
+	styleel = sc._styleel
+
+	# no rules, no style element in output
+	assert b'<style' not in sc.toBytes()
+	sc.addStyleRule(CSSSty('stroke', 'red', selector='.a'))
+	out = sc.toBytes()
+	assert b'.a {' in out
+	assert styleel.getEl().getparent() is sc._defs.getEl()
+
+	# unchanged stylesheet: CSS text not rebuilt
+	cached = styleel.getCSSText()
+	assert sc.toBytes() == out
+	assert styleel.getCSSText() is cached
+
+	# rules changed in place are detected
+	styleel.getRule('.a').set('stroke', 'blue')
+	assert b'stroke: blue;' in sc.toBytes()
+
+	sc.addStyleRule(CSSSty('stroke', 'green', selector='.b'))
+	sc.addStyleRule(CSSSty('stroke', 'blue', selector='.c'))
+	sc.addStyleRule(CSSSty('fill', 'red', selector='.d'))
+	sc.addStyleRule(CSSSty('fill', 'red', selector='.e'))
+	sc.setStyleMinify()
+	# '.c' can't be merged with '.a', '.b' in between sets same attributes
+	assert styleel.getCSSText() == ".a{fill:none;stroke:blue}.b{fill:none;stroke:green}.c{fill:none;stroke:blue}.d,.e{fill:red}"
+	assert sc.delStyleRule('.b')
+	assert styleel.getCSSText() == ".a,.c{fill:none;stroke:blue}.d,.e{fill:red}"
+	assert b'<![CDATA[.a,.c{fill:none;stroke:blue}.d,.e{fill:red}]]>' in sc.toBytes()
+
+	for sel in ('.a', '.c', '.d', '.e'):
+		sc.delStyleRule(sel)
+	assert b'<style' not in sc.toBytes()
+
+def test_08StructuralHash():
+	sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	groups = []
+	for i in range(3):
+		g = sc.addChild(Group())
+		g.addChild(Circle(10, 10, 5)).setStyle(Sty('fill', 'red'))
+		g.addChild(Text(1, 2)).setText("ola")
+		groups.append(g)
+	assert groups[0].getId() != groups[1].getId()
+	assert groups[0].getStructuralHash() == groups[1].getStructuralHash() == groups[2].getStructuralHash()
+	h = groups[0].getStructuralHash()
+	assert len(h) == 16
+
+	# numbers compared at output precision
+	c1 = sc.addChild(Circle(1, 2, 3.000001))
+	c2 = sc.addChild(Circle(1, 2, 3))
+	assert c1.isStructurallyEqual(c2)
+	assert not c1.isStructurallyEqual(sc.addChild(Circle(1, 2, 3.1)))
+
+	# mutations invalidate element and ancestors
+	groups[1].content[0].setStructAttr('r', 6)
+	assert groups[1].getStructuralHash() != h
+	groups[2].content[1].setText("adeus")
+	assert groups[2].getStructuralHash() != h
+	groups[0].addTransform(Trans(5, 0))
+	assert groups[0].getStructuralHash() != h
+	groups[0].clearTransforms()
+	assert groups[0].getStructuralHash() == h
+	groups[0].content[0].setStyle(Sty('fill', 'blue'))
+	assert groups[0].getStructuralHash() != h
+	# invalidation reaches ancestors even past a child not cached (ex: skipped while it had no element)
+	h = groups[2].getStructuralHash()
+	groups[2].content[0]._structhash = None
+	groups[2].content[0].setStructAttr('r', 7)
+	assert groups[2].getStructuralHash() != h
+
+	p1 = sc.addChild(AnalyticalPath())
+	p2 = sc.addChild(AnalyticalPath())
+	for p in (p1, p2):
+		p.addCmd(pM(0, 0))
+		p.addCmd(pL(10, 0))
+	assert p1.isStructurallyEqual(p2)
+	p2.addCmd(pClose())
+	assert not p1.isStructurallyEqual(p2)
+
+	# dedup as dict lookups
+	bydigest = {}
+	for g in groups:
+		bydigest.setdefault(g.getStructuralHash(), []).append(g)
+	assert len(bydigest) == 3
+
+def test_08Instancing():
+	shape = [pM(0, -5)] + [pL(0.5 * i, 5 - 0.25 * i) for i in range(12)] + [pClose()]
+	sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	g = sc.addChild(Group())
+	stars = []
+	for i in range(4):
+		st = g.addChild(AnalyticalPath()).setStyle(Sty('fill', 'red'))
+		for cmd in shape:
+			st.addCmd(cmd)
+		st.addTransform(Trans(10*i, 20))
+		stars.append(st)
+	boxes = [st.getDocBounds() for st in stars]
+	# referenced by id, left alone
+	ref = sc.addChild(AnalyticalPath())
+	for cmd in shape:
+		ref.addCmd(cmd)
+	ref.addTransform(Trans(50, 50))
+	sc.addStyleRule(CSSSty('stroke', 'blue', selector=ref.getSel()))
+	sc.addChild(Circle(1, 1, 1))
+
+	ids = [st.getId() for st in stars]
+	before = sc.toBytes()
+	assert sc.instanceRepeated() == 4
+	out = sc.toBytes()
+	assert len(out) < len(before)
+	assert out.count(b'<use') == 4 and out.count(b'<symbol') == 1
+	assert [u.tag for u in g.content] == ['use'] * 4
+	assert [u.getId() for u in g.content] == ids
+	# uses cover same area as replaced elements
+	assert [u.getDocBounds() for u in g.content] == boxes
+	assert ref.getId() in out.decode('utf-8')
+	assert ref.hasEl() and ref.tag == 'path'
+	# already instanced, nothing left to do
+	assert sc.instanceRepeated() == 0
+
+	# combinator selectors would stop matching instanced elements, moved to defs
+	for selector in ("g path", "g > path", "path + path", "path ~ path", "path:first-child"):
+		sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+		g = sc.addChild(Group())
+		for i in range(3):
+			st = g.addChild(AnalyticalPath())
+			for cmd in shape:
+				st.addCmd(cmd)
+			st.addTransform(Trans(10*i, 20))
+		sc.addStyleRule(CSSSty('fill', 'red', selector=selector))
+		before = sc.toBytes()
+		assert sc.instanceRepeated() == 0
+		assert sc.toBytes() == before
+
+def test_08DiffPatch():
+	import json
+
+	def build(values, extra=False, swap=False):
+		sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+		sc.addStyleRule(CSSSty('fill', 'red', selector='.a'))
+		bars = []
+		for i, v in enumerate(values):
+			g = sc.addChild(Group())
+			g.addChild(Rect(10 * i, 0, 8, v)).setClass('a')
+			g.addChild(Text(10 * i, 90)).setText(str(v))
+			bars.append(g)
+		if extra:
+			sc.addChild(Circle(50, 50, 3))
+		if swap:
+			# same ids, other order
+			for g in bars:
+				sc.getEl().remove(g.getEl())
+			for g in reversed(bars):
+				sc.getEl().append(g.getEl())
+		return sc
+
+	def canon(root):
+		return etree.tostring(root, method='c14n')
+
+	old = snapshot(build([10, 20, 30]))
+	new = build([10, 25, 30])
+	patch = diff(old, new)
+	assert sorted(op[0] for op in patch) == ['attr', 'text']
+	assert json.loads(json.dumps(patch)) == patch
+	assert canon(applyPatch(deepcopy(old), patch)) == canon(snapshot(new))
+
+	# insert, remove and reorder
+	for new in (build([10, 20, 30], extra=True), build([10, 20]), build([10, 20, 30], swap=True), build([5, 6, 7, 8], extra=True, swap=True)):
+		patch = diff(old, new)
+		assert canon(applyPatch(deepcopy(old), patch)) == canon(snapshot(new))
+	assert [op[0] for op in diff(old, build([10, 20, 30], swap=True))] == ['reorder']
+	assert diff(old, build([10, 20, 30])) == []
+
+	# mixed content: inserted elements keep their tail text
+	oldtxt = etree.fromstring('<svg xmlns="http://www.w3.org/2000/svg"><text id="t">a<tspan>x</tspan>c</text></svg>')
+	newtxt = etree.fromstring('<svg xmlns="http://www.w3.org/2000/svg"><text id="t">a<tspan>x</tspan>c<tspan>y</tspan>b</text></svg>')
+	patch = json.loads(json.dumps(diff(oldtxt, newtxt)))
+	assert canon(applyPatch(deepcopy(oldtxt), patch)) == canon(newtxt)
+	assert canon(applyPatch(deepcopy(newtxt), diff(newtxt, oldtxt))) == canon(oldtxt)
+
+def test_08Templates():
+	def build(label, h, sty):
+		sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+		sc.addStyleRule(CSSSty('fill', 'red', selector='.a'))
+		g = sc.addChild(Group())
+		bar = g.addChild(Rect(10, 0, 8, h)).setClass('a')
+		tx = g.addChild(Text(10, 90)).setText(label)
+		circ = sc.addChild(Circle(50, 50, 3)).setStyle(sty)
+		return sc, bar, tx, circ
+
+	sc, bar, tx, circ = build("zero", 5, Sty('stroke', 'blue'))
+	before = sc.toBytes(pretty_print=False)
+	tpl = SVGTemplate(sc)
+	tpl.addTextSlot("label", tx).addAttrSlot("h", bar, "height").addStyleSlot("circsty", circ)
+	tpl.freeze()
+	assert sc.toBytes(pretty_print=False) == before
+	assert tpl.render() == before
+	assert sorted(tpl.getSlotNames()) == ['circsty', 'h', 'label']
+
+	for label, h, sty in (("a < b & \"c\"", 12.5, Sty('stroke', 'green', 'stroke-width', 2)), ("x", 7, Sty('fill', 'red'))):
+		ref = build(label, h, sty)[0].toBytes(pretty_print=False)
+		assert tpl.render(label=label, h=h, circsty=sty) == ref
+
+def buildBatchDoc(p_n):
+	if p_n == "fail":
+		raise ValueError("bad job")
+	if p_n == "slow":
+		while True:
+			pass
+	if p_n == "late":
+		sleep(0.5)
+	sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	sc.addChild(Text(1, 2)).setText(str(p_n))
+	return sc
+
+def test_08BatchRender():
+	jobs = [(buildBatchDoc, i) for i in range(20)]
+	refs = [buildBatchDoc(i).toBytes(inc_declaration=True) for i in range(20)]
+
+	serial = list(BatchRenderer().run(jobs))
+	assert [idx for idx, _res in serial] == list(range(20))
+	assert [res["svg"] for _idx, res in serial] == refs
+
+	br = BatchRenderer(workers=2, chunksize=3, maxpending=2)
+	assert [res["svg"] for _idx, res in br.run(iter(jobs))] == refs
+	unordered = dict(br.run(jobs, ordered=False))
+	assert [unordered[i]["svg"] for i in range(20)] == refs
+
+	# slow first job: later results buffered, count against maxpending
+	consumed = []
+	def slowFirst():
+		for job in [(buildBatchDoc, "late")] + jobs:
+			consumed.append(job)
+			yield job
+	results = br.run(slowFirst())
+	next(results)
+	assert len(consumed) <= 2 * 3
+	assert len(list(results)) == 20
+	with pytest.raises(AssertionError):
+		BatchRenderer(workers=2, maxpending=0)
+
+	with pytest.raises(ValueError):
+		list(br.run([(buildBatchDoc, 1), (buildBatchDoc, "fail")]))
+	br = BatchRenderer(workers=2, chunksize=1, timeout=0.5)
+	res = dict(br.run([(buildBatchDoc, 1), (buildBatchDoc, "slow"), (buildBatchDoc, "fail")], raise_errors=False))
+	assert isinstance(res[1], BatchJobTimeout) and isinstance(res[2], ValueError)
+	assert res[0]["svg"] == refs[1]
+
+def buildShard(p_content, p_group, p_n):
+	if p_n == "conflict":
+		p_content.addStyleRule(CSSSty('fill', 'blue', selector='.a'))
+		return
+	p_content.addStyleRule(CSSSty('fill', 'red', selector='.a'))
+	sym = p_content.addChild(Symbol())
+	sym.addChild(Circle(5, 5, 5))
+	for i in range(p_n):
+		p_group.addChild(Rect(i, p_n, 10, 10)).setClass('a')
+		p_group.addChild(Use(i, p_n, 10, 10, sym.getSel()))
+
+def buildShardRefs(p_content, p_group, p_n):
+	sym = p_content.addChild(Symbol())
+	circ = sym.addChild(Circle(5, 5, 5))
+	circ.setId(p_content.nextId(circ.idprefix))
+	# def referencing another def
+	patt = p_content.addChild(Pattern(0, 0, 10, 10, "userSpaceOnUse"), todefs=True)
+	patt.addChild(Use(0, 0, 10, 10, sym.getSel()))
+	p_group.addChild(Rect(0, p_n, 10, 10)).setStyle(Sty('fill', patt.getSelector(funciri=True)))
+	# reference to id nested in a def
+	p_group.addChild(Use(p_n, 0, 10, 10, circ.getSel()))
+
+def test_08Sharding():
+	sc = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	sc.addChild(Rect(0, 0, 5, 5))
+	grps = ShardedBuilder().build(sc, buildShard, [2, 3, 1])
+	assert [isinstance(g, ShardGroup) for g in sc.content[2:]] == [True] * 3 and sc.content[2:] == grps
+	ref = sc.toBytes(pretty_print=False)
+
+	root = etree.fromstring(ref)
+	ids = [el.get('id') for el in root.iter() if not el.get('id') is None]
+	assert len(ids) == len(set(ids))
+	# one symbol kept, every 'use' refers to it
+	syms = root.findall('.//{http://www.w3.org/2000/svg}symbol')
+	assert len(syms) == 1
+	uses = root.findall('.//{http://www.w3.org/2000/svg}use')
+	assert len(uses) == 6 and set(u.get('{http://www.w3.org/1999/xlink}href') for u in uses) == {f"#{syms[0].get('id')}"}
+	assert len(sc._styleel.stylerules) == 1
+
+	sc2 = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	sc2.addChild(Rect(0, 0, 5, 5))
+	ShardedBuilder(workers=2).build(sc2, buildShard, iter([2, 3, 1]))
+	assert sc2.toBytes(pretty_print=False) == ref
+
+	with pytest.raises(ValueError):
+		ShardedBuilder().build(sc, buildShard, ["conflict"])
+
+	sc4 = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	ShardedBuilder().build(sc4, buildShardRefs, [1, 2, 3])
+	root = etree.fromstring(sc4.toBytes(pretty_print=False))
+	ids = set(el.get('id') for el in root.iter() if not el.get('id') is None)
+	assert len(root.findall('.//{http://www.w3.org/2000/svg}symbol')) == 1
+	assert len(root.findall('.//{http://www.w3.org/2000/svg}pattern')) == 1
+	hrefs = [u.get('{http://www.w3.org/1999/xlink}href')[1:] for u in root.iter('{http://www.w3.org/2000/svg}use')]
+	assert len(hrefs) == 4 and set(hrefs) <= ids
+	fills = set(r.get('style') for r in root.iter('{http://www.w3.org/2000/svg}rect'))
+	assert len(fills) == 1
+
+def buildRoundingDoc(p_places, rounding=None):
+	sc = SVGContent(Re(0,0,100,100), rounding=rounding).setIdentityViewbox()
+	with sc.rounding():
+		sc.addChild(Circle(1.23456, 2.34567, 10))
+		ap = sc.addChild(AnalyticalPath())
+		ap.addPolylinePList([Pt(1.23456, 1), Pt(5.55555, 2.22222), Pt(9.87654, 3)])
+		ap.addCmd(pL(1.23456, 1))
+		sc.addChild(Polyline()).addPList([Pt(0.12345, 1), Pt(2.34567, 3.45678)])
+	return sc.toBytes(pretty_print=False)
+
+def test_08RoundingContext():
+	prev = GLOBAL_ENV["ROUND"]["places"]
+	refs = {}
+	try:
+		for places in (1, 2, 3):
+			GLOBAL_ENV["ROUND"]["places"] = places
+			assert getRoundContext().places == places
+			refs[places] = buildRoundingDoc(places)
+	finally:
+		GLOBAL_ENV["ROUND"]["places"] = prev
+	assert refs[1] != refs[2] != refs[3]
+
+	with roundingContext(RoundContext(2)) as ctx:
+		assert glRd(1.23456) == 1.23 and getRoundContext() is ctx
+		with roundingContext(RoundContext(None)):
+			assert glRd(1.23456) == 1.23456
+		assert glRd(2.0001) == 2 and isinstance(glRd(2.0001), int)
+	assert glRd(1.23456) == round(1.23456, prev)
+
+	for places in (1, 2, 3):
+		assert buildRoundingDoc(places, rounding=RoundContext(places)) == refs[places]
+
+	# path command created under ambient rounding, appended to document with its own
+	sc = SVGContent(Re(0,0,100,100), rounding=RoundContext(1)).setIdentityViewbox()
+	ap = sc.addChild(AnalyticalPath())
+	ap.addCmd(pM(1.23456, 2)).addCmd(pL(3.45678, 4))
+	assert ap.getStruct().d == "M1.2 2 3.5 4"
+
+	# mixed precision documents built concurrently
+	jobs = [1, 2, 3] * 8
+	with ThreadPoolExecutor(max_workers=4) as executor:
+		res = list(executor.map(lambda p: buildRoundingDoc(p, rounding=RoundContext(p)), jobs))
+	assert res == [refs[p] for p in jobs]
+
+def buildCairoDoc():
+	sc = SVGContent(Re(0,0,200,120)).setIdentityViewbox()
+	sc.addStyleRule(CSSSty('fill', 'green', 'stroke', 'black', selector='.a, rect.b'))
+	grad = sc.addChild(LinearGradient(0, 0, 1, 0), todefs=True).setId('gr')
+	grad.addChild(GradientStop(0, 'red'))
+	grad.addChild(GradientStop(1, 'blue'))
+	g = sc.addChild(Group()).setClass('a')
+	g.addTransform(Trans(10, 5))
+	g.addChild(Rect(0, 0, 40, 20))
+	g.addChild(Circle(70, 30, 20)).setStyle(Sty('fill', 'url(#gr)', 'opacity', '0.5'))
+	ap = g.addChild(AnalyticalPath())
+	ap.addCmd(pM(100, 10)).addCmd(pL(140, 10)).addCmd(pL(140, 50)).addCmd(pClose())
+	sc.addChild(Polygon()).addPList([Pt(10, 60), Pt(60, 60), Pt(35, 100)])
+	sc.addChild(Polyline()).addPList([Pt(70, 60), Pt(90, 100), Pt(110, 60)])
+	sc.addChild(Rect(120, 60, 30, 30)).setClass('b').addTransform(Rotate(10, 135, 75))
+	sym = sc.addChild(Symbol())
+	sym.setViewbox(VBox(0, 0, 10, 10))
+	sym.addChild(Circle(5, 5, 5)).setStyle(Sty('fill', 'orange'))
+	sc.addChild(Use(160, 60, 30, 30, sym.getSel()))
+	return sc
+
+def test_08CairoRender():
+
+	assert parseTransform("translate(10 5) scale(2)") == (2, 0, 0, 2, 10, 5)
+	assert parseTransform(None) == (1, 0, 0, 1, 0, 0)
+	try:
+		import cairocffi
+		import cairosvg.colors
+	except (ImportError, OSError):
+		pytest.skip("cairo library not available")
+	import cairosvg
+
+	sc = buildCairoDoc()
+	direct = cairocffi.ImageSurface.create_from_png(BytesIO(CairoRenderer(sc).toPNG()))
+	ref = cairocffi.ImageSurface.create_from_png(BytesIO(cairosvg.svg2png(bytestring=sc.toBytes())))
+	assert (direct.get_width(), direct.get_height()) == (ref.get_width(), ref.get_height()) == (200, 120)
+	# conformance: pixels differing by more than antialiasing noise
+	da = bytes(direct.get_data())
+	db = bytes(ref.get_data())
+	differing = sum(1 for i in range(0, len(da), 4) if max(abs(da[i+k] - db[i+k]) for k in range(4)) > 24)
+	assert differing <= 0.01 * (len(da) // 4)
+	assert CairoRenderer(sc).toPDF().startswith(b"%PDF")
+	assert CairoRenderer(sc, scale=2).toPNG()[:8] == b"\x89PNG\r\n\x1a\n"
+
+def test_08Export(tmp_path):
+
+	sc = buildSimpleContent(SVGContent(Re(0,0,100,100)).setIdentityViewbox())
+	ref = sc.toBytes(inc_declaration=True)
+	assert sc.export(formats=("svg",)) == { "svg": ref }
+	outb = BytesIO()
+	sc.export(formats=("svg",), write_to={ "svg": outb }, pretty_print=False)
+	assert outb.getvalue() == sc.toBytes(inc_declaration=True, pretty_print=False)
+	with pytest.raises(AssertionError):
+		sc.export(formats=("gif",))
+
+	try:
+		import cairocffi
+	except (ImportError, OSError):
+		pytest.skip("cairo library not available")
+	import cairosvg
+
+	paths = { key: tmp_path / f"out_{key}" for key in ("svg", "png", "pdf", "png@2x") }
+	res = sc.export(formats=("svg", "png", "pdf", "ps"), pngscales=(0.5, 2), write_to=paths)
+	assert sorted(res.keys()) == ['pdf', 'png', 'png@0.5x', 'png@2x', 'ps', 'svg']
+	assert res["png"] == cairosvg.svg2png(bytestring=ref)
+	assert res["pdf"].startswith(b"%PDF") and res["ps"].startswith(b"%!PS")
+	for scale, key in ((0.5, "png@0.5x"), (2, "png@2x")):
+		assert cairocffi.ImageSurface.create_from_png(BytesIO(res[key])).get_width() == 100 * scale
+	for key, path in paths.items():
+		assert path.read_bytes() == res[key]
+
+	# surfaces drawn after the first one keep patterns
+	scp = SVGContent(Re(0,0,100,100)).setIdentityViewbox()
+	patt = scp.addChild(Pattern(0,0,10,10, "userSpaceOnUse"), todefs=True)
+	patt.addChild(Rect(0,0,5,5)).setStyle(Sty('fill', 'blue'))
+	scp.addChild(Rect(0,0,100,100)).setStyle(Sty('fill', patt.getSelector(funciri=True)))
+	res = scp.export(formats=("png", "pdf"), pngscales=(1,))
+	assert res["png@1x"] == res["png"] == cairosvg.svg2png(bytestring=scp.toBytes(inc_declaration=True))
+
+def buildPDFPage(p_n):
+	sc = SVGContent(Re(0,0,100 + 50 * p_n,100)).setIdentityViewbox()
+	sc.addChild(Rect(10, 10, 20 + p_n, 20))
+	return sc
+
+def test_08MultipagePDF(tmp_path):
+	try:
+		import cairocffi
+	except (ImportError, OSError):
+		pytest.skip("cairo library not available")
+
+	pages = (buildPDFPage(i) if i % 2 == 0 else buildPDFPage(i).toBytes() for i in range(4))
+	out = BytesIO()
+	with MultipagePDFWriter(out) as wr:
+		for page in pages:
+			wr.addPage(page)
+		assert wr.getPageCount() == 4
+	assert out.getvalue().startswith(b"%PDF")
+
+	res = writeMultipagePDF([buildPDFPage(i) for i in range(3)])
+	assert res.startswith(b"%PDF")
+	path = tmp_path / "pages.pdf"
+	assert writeMultipagePDF([(buildPDFPage, i) for i in range(5)], str(path), workers=2, maxpending=1) is None
+	assert path.read_bytes().startswith(b"%PDF")
+
+	# compatibility wrapper, file names and URLs
+	from rpSVG._multipagePDF_support import convert_list
+	svgpaths = []
+	for i in range(2):
+		svgpath = tmp_path / f"page{i}.svg"
+		svgpath.write_bytes(buildPDFPage(i).toBytes())
+		svgpaths.append(svgpath)
+	path = tmp_path / "converted.pdf"
+	convert_list([str(svgpaths[0]), svgpaths[1].as_uri()], str(path))
+	assert path.read_bytes().startswith(b"%PDF")
+
+def test_08TextMetrics(tmp_path):
+	from rpSVG._cairo_textwidth import textwidth
+
+	tm = TextMetrics("DejaVu Sans", size=10)
+	w = tm.width("Hello")
+	assert w > 0 and tm.width("") == 0
+	assert tm.width("Hello", size=20) == pytest.approx(2 * w)
+	assert tm.width("HelloHello") > w
+	assert tm.measure(["Hello", "", "Hello"], size=20) == [tm.width("Hello", size=20), 0, tm.width("Hello", size=20)]
+	assert tm.width("Hello") == pytest.approx(sum(tm.width(ch) for ch in "Hello") + 
+		sum(tm.width(a + b) - tm.width(a) - tm.width(b) for a, b in zip("Hell", "ello")))
+	assert textwidth("abc", fontsize=12) > 0
+
+	path = str(tmp_path / "metrics.sqlite")
+	tmb = TextMetrics("DejaVu Sans", weight=700, cachepath=path)
+	ref = tmb.measure(["Bold text", "other"])
+	assert TextMetrics("DejaVu Sans", weight="bold", cachepath=path).measure(["Bold text", "other"]) == ref
+
+	# measured by an instance without cache file, persisted by a later one with it
+	from rpSVG.TextMetrics import _cairo
+	TextMetrics("DejaVu Sans", style="italic").width("xyz")
+	path = str(tmp_path / "metrics2.sqlite")
+	TextMetrics("DejaVu Sans", style="italic", cachepath=path).flush()
+	if _cairo():
+		conn = sqlite3.connect(path)
+		rows = conn.execute("SELECT glyphs FROM advances WHERE font = 'DejaVu Sans|normal|italic'").fetchall()
+		conn.close()
+		assert {"x", "y", "z", "xy", "yz"} <= set(glyphs for glyphs, in rows)
+
+	# concurrent measurement of a new font: each glyph and pair cached and logged once
+	texts = [f"{w} {i}" for i in range(40) for w in ("thread", "safe", "kerning")]
+	tmo = TextMetrics("DejaVu Sans", weight="bold", style="oblique")
+	with ThreadPoolExecutor(max_workers=8) as executor:
+		widths = list(executor.map(tmo.width, texts))
+	assert widths == [tmo.width(t) for t in texts]
+	if _cairo():
+		logged = [glyphs for glyphs, _adv in tmo._log]
+		assert len(logged) == len(set(logged)) == len(tmo._advances) + len(tmo._kerning)
+
+def test_08TextLayout():
+	tm = TextMetrics("DejaVu Sans", size=12)
+	text = "The quick brown fox jumps over the lazy dog and keeps running far away\n\nEnd"
+	maxw = 120
+	slacks = {}
+	for method in ("greedy", "optimal"):
+		lines = wrapText(text, maxw, tm, method=method)
+		assert " ".join(lines).split() == text.split() and lines[-2:] == ("", "End")
+		assert all(tm.width(ln) <= maxw for ln in lines)
+		body = [ln for ln in lines if len(ln) > 0][:-1]
+		slacks[method] = sum((maxw - tm.width(ln)) ** 2 for ln in body[:-1])
+	assert slacks["optimal"] <= slacks["greedy"]
+	assert wrapText(text, maxw, tm, method=None) == tuple(text.split('\n'))
+	assert wrapText(text, maxw, tm) is wrapText(text, maxw, tm)
+	assert wrapText("unbreakable", 1, tm) == ("unbreakable",)
+
+	size, lines = fitText(text, maxw, 60, tm, size=20, minsize=4)
+	assert 4 <= size < 20
+	assert textBlockHeight(len(lines), size) <= 60 and all(tm.width(ln, size=size) <= maxw for ln in lines)
+	bigger = wrapText(text, maxw, tm, size=size + 0.5)
+	assert textBlockHeight(len(bigger), size + 0.5) > 60 or any(tm.width(ln, size=size + 0.5) > maxw for ln in bigger)
+	assert fitText("ok", maxw, 60, tm, size=20) == (20, ("ok",))
+	# layouts cached per font: same lines for another instance, not kept alive by caches
+	tm2 = TextMetrics("DejaVu Sans", size=12)
+	assert wrapText(text, maxw, tm2) is wrapText(text, maxw, tm)
+	tm2ref = weakref.ref(tm2)
+	del tm2
+	gc.collect()
+	assert tm2ref() is None
+
+	sc = SVGContent(Re(0,0,400,400)).setIdentityViewbox()
+	tb = sc.addChild(TextBox(10, 10, 140, 80, text=text, vcenter_fontszpx=20, wrap="optimal", minfontsize=4, metrics=tm))
+	assert tb.getFontSize() == size
+	root = etree.fromstring(sc.toBytes())
+	assert root.find(".//{http://www.w3.org/2000/svg}text").get("font-size") == f"{size:g}"
+	rows = [ts.text or "" for ts in root.iter("{http://www.w3.org/2000/svg}tspan")]
+	assert tuple(rows) == wrapText(text, maxw, tm, size=size, method="optimal")
+	tb.setText("short")
+	assert tb.getFontSize() == 20 and tb.getParagraph()._textrows == ["short"]
@@ -1,6 +1,4 @@
 
-import cairosvg
-
 from os import makedirs
 from os.path import exists, join as path_join
 
@@ -26,11 +24,6 @@ def genFiles(p_test_name, p_svgcontent):
 
 	sfile, bmfile, pdffile = genTestFilenames(p_test_name)
 
-	with open(sfile, 'w') as fl:
-		fl.write(p_svgcontent.toString(pretty_print=True, inc_declaration=True))
-
-	outbs = p_svgcontent.toBytes(pretty_print=True, inc_declaration=True)
-
-	cairosvg.svg2png(bytestring=outbs, write_to=bmfile)
-	cairosvg.svg2pdf(bytestring=outbs, write_to=pdffile)
+	p_svgcontent.export(formats=("svg", "png", "pdf"), write_to={ "svg": sfile, "png": bmfile, "pdf": pdffile },
+		pretty_print=True, inc_declaration=True)
 